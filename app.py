@@ -1,4 +1,9 @@
 from flask import Flask
+import db
+import cli
+from utils import schema
+from utils.cache import all_stats as cache_stats
+from utils import outbox, realtime, ranking
 
 # IMPORTS CORRECTOS: 1 bp por archivo
 from blueprints.auth import bp as auth_bp          # <--- nuevo
@@ -22,6 +27,9 @@ from blueprints.trips import trips_bp
 
 def create_app():
     app = Flask(__name__)
+    db.init_app(app)      # 1 conexión + 1 transacción por request
+    schema.init_app(app)  # introspección del schema una sola vez
+    cli.init_app(app)     # flask availability-roll, ...
 
     # REGISTRO por prefijo correcto
     app.register_blueprint(auth_bp, url_prefix="/api/auth")           # /api/auth/...
@@ -48,6 +56,24 @@ def create_app():
     def health():
         return {"ok": True, "service": "carving-api"}
 
+    @app.get("/api/health/caches")
+    def health_caches():
+        return {"ok": True, "caches": cache_stats(), "db_pool": db.get_pool().stats()}
+
+    @app.get("/api/health/push")
+    def health_push():
+        # el envío corre en notify-worker: acá solo el estado de la cola (notification_jobs)
+        return {"ok": True, "outbox": outbox.stats()}
+
+    @app.get("/api/health/realtime")
+    def health_realtime():
+        return {"ok": True, "realtime": realtime.get_hub().stats()}
+
+    @app.get("/api/health/ranking")
+    def health_ranking():
+        # pesos y presupuesto de latencia del ranking del feed (?sort=recommended)
+        return {"ok": True, "ranking": ranking.stats()}
+
     return app
 
 app = create_app()
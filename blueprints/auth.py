@@ -2,24 +2,16 @@
 from flask import Blueprint, request
 from werkzeug.security import generate_password_hash, check_password_hash
 from utils.http import ok, created, error
-from db import get_cur
+from db import get_cur, after_commit
+from utils.auth import load_user_by_token, invalidate_token
+from utils.schema import registry as schema
 import secrets
 
 bp = Blueprint("auth", __name__)
 
-def _ensure_auth_tokens(cur):
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS auth_tokens (
-          token TEXT PRIMARY KEY,
-          user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-          created_at TIMESTAMP NOT NULL DEFAULT NOW()
-        );
-    """)
-
 def _issue_token(user_id: int) -> str:
     token = secrets.token_hex(32)
     with get_cur(True) as cur:
-        _ensure_auth_tokens(cur)  # asegura que exista
         cur.execute("""
             INSERT INTO auth_tokens (token, user_id, created_at)
             VALUES (%s, %s, NOW())
@@ -53,16 +45,7 @@ def register():
         uid = cur.fetchone()["id"]
 
         # user_sports (con o sin years_experience)
-        def has_years():
-            cur.execute("""
-                SELECT 1
-                FROM information_schema.columns
-                WHERE table_schema='public' AND table_name='user_sports' AND column_name='years_experience'
-                LIMIT 1
-            """)
-            return cur.fetchone() is not None
-
-        if has_years():
+        if schema.has_column("user_sports", "years_experience"):
             for item in current_sports:
                 sid = int(item.get("sport_id"))
                 years = int(item.get("years_experience", 0))
@@ -79,8 +62,7 @@ def register():
                 """, (uid, sid))
 
         # wishlist si existe
-        cur.execute("SELECT to_regclass('public.user_wishlist_sports')")
-        if cur.fetchone()[0]:
+        if schema.has_table("user_wishlist_sports"):
             for sid in wishlist_sports:
                 cur.execute("""
                     INSERT INTO user_wishlist_sports (user_id, sport_id)
@@ -116,18 +98,10 @@ def me():
         return error("Missing bearer token", 401)
     token = auth.split(" ", 1)[1]
 
-    with get_cur() as cur:
-        cur.execute("""
-            SELECT u.id, u.full_name, u.email, u.created_at
-            FROM auth_tokens t
-            JOIN users u ON u.id = t.user_id
-            WHERE t.token = %s
-        """, (token,))
-        row = cur.fetchone()
-
-    if not row:
+    user = load_user_by_token(token)
+    if not user:
         return error("Invalid token", 401)
-    return ok(row)
+    return ok({k: user.get(k) for k in ("id", "full_name", "email", "created_at")})
 
 @bp.post("/logout")
 def logout():
@@ -137,4 +111,5 @@ def logout():
     token = auth.split(" ", 1)[1]
     with get_cur(True) as cur:
         cur.execute("DELETE FROM auth_tokens WHERE token=%s", (token,))
+    after_commit(lambda: invalidate_token(token))
     return ok({"logout": True})
@@ -1,5 +1,5 @@
 # blueprints/auth_helpers.py
-from db import get_cur
+from utils.auth import load_user_by_token
 from utils.http import error
 
 def get_user_id_from_bearer(request):
@@ -7,14 +7,7 @@ def get_user_id_from_bearer(request):
     if not auth.lower().startswith("bearer "):
         return None, error("Missing bearer token", 401)
     token = auth.split(" ", 1)[1]
-    with get_cur() as cur:
-        cur.execute("""
-            SELECT u.id
-            FROM auth_tokens t
-            JOIN users u ON u.id = t.user_id
-            WHERE t.token = %s
-        """, (token,))
-        row = cur.fetchone()
-    if not row:
+    user = load_user_by_token(token)   # cacheado: 0 queries en cache hit
+    if not user:
         return None, error("Invalid token", 401)
-    return row["id"], None
+    return user["id"], None
@@ -1,19 +1,107 @@
 # blueprints/bookings.py
+from datetime import date
+import psycopg2
+import psycopg2.errors
 from flask import Blueprint, request, jsonify
 from utils.http import ok, created, error
+from psycopg2.extras import execute_values
 from db import get_cur
 from blueprints.auth_helpers import get_user_id_from_bearer
-from utils.notify import notify_user
+from utils.notify import notify_user, notify_many
+from utils.pagination import Keyset, InvalidCursor, decode_cursor
+from config import BOOKING_DECISIONS_MAX, OWNER_INBOX_LEGACY_MAX
+from blueprints.equipment import invalidate_calendar
 
 bp = Blueprint("bookings", __name__)
 
 # Estados que BLOQUEAN disponibilidad real (bloquean el calendario)
 BLOCKING_STATUSES = ('approved', 'handoff', 'in_use', 'returning')
 
+# Nombre del EXCLUDE de 0008_booking_overlap_constraint.sql
+OVERLAP_CONSTRAINT = "equipment_bookings_no_overlap"
+
+def is_overlap_violation(exc):
+    return (isinstance(exc, psycopg2.errors.ExclusionViolation)
+            and exc.diag.constraint_name == OVERLAP_CONSTRAINT)
+
+def retry_on_deadlock(fn, attempts=3):
+    """
+    Dos aprobaciones concurrentes que se solapan pueden trabarse chequeando el
+    exclusion constraint (cada una espera a la otra): Postgres aborta una con
+    deadlock. Reintentamos: en el segundo intento la otra ya commiteó y el
+    chequeo de solape responde 409 normalmente.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except psycopg2.errors.DeadlockDetected:
+            if attempt == attempts - 1:
+                raise
+
+def _decision_notification(bk, status):
+    """Aviso al renter de una aprobación/rechazo (kwargs de notify_user)."""
+    verb = "aprobada" if status == "approved" else "rechazada"
+    return {
+        "user_id": bk["renter_id"],
+        "ntype": f"booking_{status}",
+        "title": "✅ Solicitud aprobada" if status == "approved" else "❌ Solicitud rechazada",
+        "body": f"Tu solicitud para '{bk['title']}' del {bk['start_date']} al {bk['end_date']} fue {verb}.",
+        "data": {
+            "booking_id": bk["id"],
+            "equipment_id": bk["equipment_id"],
+            "title": bk["title"],
+            "start_date": str(bk["start_date"]),
+            "end_date": str(bk["end_date"]),
+            "status": status,
+        },
+        "dedupe_key": f"booking:{bk['id']}",   # re-aprobar/re-rechazar no repite el aviso
+    }
+
+# Validación + INSERT en una sola sentencia. El chequeo de solape acá es para
+# responder 409 temprano; la garantía la da el constraint al aprobar.
+CREATE_BOOKING_SQL = """
+    WITH eq AS (
+        SELECT id FROM equipment WHERE id = %(equipment_id)s
+    ),
+    covered AS (
+        SELECT 1
+        FROM equipment_availability a
+        WHERE a.equipment_id = %(equipment_id)s
+          AND COALESCE(a.kind, 'available') = 'available'
+          AND a.start_date <= %(start_date)s::date
+          AND a.end_date   >= %(end_date)s::date
+        LIMIT 1
+    ),
+    overlap AS (
+        SELECT 1
+        FROM equipment_bookings b
+        WHERE b.equipment_id = %(equipment_id)s
+          AND b.status = ANY(%(blocking)s)
+          AND %(start_date)s::date < b.end_date
+          AND %(end_date)s::date > b.start_date
+        LIMIT 1
+    ),
+    ins AS (
+        INSERT INTO equipment_bookings
+            (equipment_id, renter_id, start_date, end_date, status, deposit_amount)
+        SELECT %(equipment_id)s, %(renter_id)s, %(start_date)s::date, %(end_date)s::date,
+               'pending', %(deposit_amount)s
+        WHERE EXISTS (SELECT 1 FROM eq)
+          AND EXISTS (SELECT 1 FROM covered)
+          AND NOT EXISTS (SELECT 1 FROM overlap)
+        RETURNING id, status
+    )
+    SELECT EXISTS (SELECT 1 FROM eq)      AS equipment_ok,
+           EXISTS (SELECT 1 FROM covered) AS covered,
+           EXISTS (SELECT 1 FROM overlap) AS overlaps,
+           (SELECT id FROM ins)           AS id,
+           (SELECT status FROM ins)       AS status
+"""
+
 @bp.post("/bookings")
 def create_booking():
     """
-    Crea 'pending'.
+    Crea 'pending' (una sola sentencia).
     - Chequea que exista el equipo.
     - Chequea que el rango esté cubierto por availability declarada.
     - NO bloquea por otras 'pending'; solo falla si solapa con booking bloqueante.
@@ -30,59 +118,80 @@ def create_booking():
 
     if not equipment_id or not start_date or not end_date:
         return error("equipment_id, start_date, end_date are required", 400)
+    try:
+        equipment_id = int(equipment_id)
+        if date.fromisoformat(start_date) >= date.fromisoformat(end_date):
+            return error("start_date must be before end_date", 400)
+    except (TypeError, ValueError):
+        return error("Invalid equipment_id or dates (YYYY-MM-DD)", 400)
 
     with get_cur(True) as cur:
-        # validar equipo
-        cur.execute("SELECT 1 FROM equipment WHERE id=%s", (equipment_id,))
-        if not cur.fetchone():
+        cur.execute(CREATE_BOOKING_SQL, {
+            "equipment_id": equipment_id, "renter_id": renter_id,
+            "start_date": start_date, "end_date": end_date,
+            "deposit_amount": deposit_amount, "blocking": list(BLOCKING_STATUSES),
+        })
+        row = cur.fetchone()
+        if not row["equipment_ok"]:
             return error("Invalid equipment_id", 400)
-
-        # ✅ Rango CUBIERTO por availability declarada
-        cur.execute("""
-            SELECT 1
-            FROM equipment_availability a
-            WHERE a.equipment_id = %s
-              AND COALESCE(a.kind, 'available') = 'available'
-              AND a.start_date <= %s::date
-              AND a.end_date   >= %s::date
-            LIMIT 1
-        """, (equipment_id, start_date, end_date))
-        if not cur.fetchone():
+        if not row["covered"]:
             return error("Requested dates are outside declared availability", 409)
-
-        # ✅ Solape contra bookings bloqueantes
-        cur.execute("""
-            SELECT 1
-            FROM equipment_bookings b
-            WHERE b.equipment_id = %s
-              AND b.status IN ('approved','handoff','in_use','returning')
-              AND %s::date < b.end_date
-              AND %s::date > b.start_date
-            LIMIT 1
-        """, (equipment_id, start_date, end_date))
-        if cur.fetchone():
+        if row["overlaps"]:
             return error("Overlaps with an existing approved/active booking", 409)
-
-        # crear pending
-        cur.execute("""
-            INSERT INTO equipment_bookings
-                (equipment_id, renter_id, start_date, end_date, status, deposit_amount)
-            VALUES (%s, %s, %s::date, %s::date, 'pending', %s)
-            RETURNING id, status
-        """, (equipment_id, renter_id, start_date, end_date, deposit_amount))
-        row = cur.fetchone()
+        invalidate_calendar(equipment_id)  # pending_days
 
     return created({"booking_id": row["id"], "status": row["status"]})
 
 
+# Bandeja del owner: pendientes por (start_date, id)
+_INBOX_KEYSET = Keyset([
+    ("b.start_date", "ASC", "start_date", "date"),
+    ("b.id", "ASC", "booking_id", "int"),
+])
+
 @bp.get("/bookings/owner/requests")
 def owner_requests():
+    """
+    Solicitudes pendientes de los equipos del owner, por start_date.
+    Filtros: equipment_id, from/to (bookings que pisan [from, to)).
+    Pagina por keyset: {"items", "next_cursor"}; la siguiente con
+    ?cursor=<next_cursor>. ?legacy=1 devuelve la lista sola (formato viejo),
+    cortada en OWNER_INBOX_LEGACY_MAX.
+    """
     owner_id, err = get_user_id_from_bearer(request)
     if err:
         return err
 
+    q = request.args
+    cursor = q.get("cursor")
+    legacy = q.get("legacy") in ("1", "true", "yes") and cursor is None
+    limit = OWNER_INBOX_LEGACY_MAX if legacy else min(max(q.get("limit", type=int) or 50, 1), 200)
+    try:
+        equipment_id = int(q["equipment_id"]) if q.get("equipment_id") else None
+        date_from = date.fromisoformat(q["from"]) if q.get("from") else None
+        date_to = date.fromisoformat(q["to"]) if q.get("to") else None
+    except ValueError:
+        return error("Invalid equipment_id or dates (YYYY-MM-DD)", 400)
+
+    params = {"owner_id": owner_id, "equipment_id": equipment_id,
+              "date_from": date_from, "date_to": date_to}
+    wh = ["b.equipment_id = e.id", "b.status = 'pending'"]
+    if date_from:
+        wh.append("b.end_date > %(date_from)s")
+    if date_to:
+        wh.append("b.start_date < %(date_to)s")
+    if cursor:
+        try:
+            wh.append(_INBOX_KEYSET.where_sql(decode_cursor(cursor), params))
+        except InvalidCursor as e:
+            return error(str(e), 400)
+    params["limit"] = limit if legacy else limit + 1
+
+    # Un LATERAL por equipo sobre idx_equipment_bookings_pending_start_id: cada
+    # uno corta en limit+1 y el merge final también (el alias b es el mismo
+    # adentro y afuera, así el ORDER BY del keyset sirve en los dos niveles).
     with get_cur() as cur:
-        cur.execute("""
+        cur.execute(f"""
             SELECT
                 b.id          AS booking_id,
                 b.equipment_id,
@@ -92,16 +201,47 @@ def owner_requests():
                 b.status,
                 u.full_name   AS renter_name,
                 u.email       AS renter_email
-            FROM equipment_bookings b
-            JOIN equipment e ON e.id = b.equipment_id
+            FROM equipment e
+            CROSS JOIN LATERAL (
+                SELECT b.id, b.equipment_id, b.renter_id, b.start_date, b.end_date, b.status
+                FROM equipment_bookings b
+                WHERE {" AND ".join(wh)}
+                {_INBOX_KEYSET.order_sql()}
+                LIMIT %(limit)s
+            ) b
             LEFT JOIN users u ON u.id = b.renter_id
-            WHERE e.owner_id = %s
-              AND b.status = 'pending'
-            ORDER BY b.start_date ASC
+            WHERE e.owner_id = %(owner_id)s
+              {"AND e.id = %(equipment_id)s" if equipment_id else ""}
+            {_INBOX_KEYSET.order_sql()}
+            LIMIT %(limit)s
+        """, params)
+        rows = cur.fetchall()
+
+    return ok(rows if legacy else _INBOX_KEYSET.page(rows, limit))
+
+
+@bp.get("/bookings/owner/requests/summary")
+def owner_requests_summary():
+    """Pendientes por equipo (solo los que tienen alguna) + total. Index-only sobre el parcial."""
+    owner_id, err = get_user_id_from_bearer(request)
+    if err:
+        return err
+
+    with get_cur() as cur:
+        cur.execute("""
+            SELECT e.id AS equipment_id, e.title, c.pending, c.next_start_date
+            FROM equipment e
+            CROSS JOIN LATERAL (
+                SELECT count(*) AS pending, min(b.start_date) AS next_start_date
+                FROM equipment_bookings b
+                WHERE b.equipment_id = e.id AND b.status = 'pending'
+            ) c
+            WHERE e.owner_id = %s AND c.pending > 0
+            ORDER BY c.next_start_date, e.id
         """, (owner_id,))
         rows = cur.fetchall()
 
-    return ok(rows)
+    return ok({"total": sum(r["pending"] for r in rows), "equipment": rows})
 
 
 @bp.put("/bookings/<int:booking_id>/status")
@@ -115,68 +255,201 @@ def set_booking_status(booking_id):
     if new_status not in ("approved", "rejected"):
         return jsonify({"error": "status must be 'approved' or 'rejected'"}), 400
 
-    with get_cur(True) as cur:
-        # Traemos la booking y validamos ownership
-        cur.execute("""
-            SELECT b.id, b.equipment_id, b.renter_id, b.start_date, b.end_date, b.status,
-                   e.title, e.owner_id
-            FROM equipment_bookings b
-            JOIN equipment e ON e.id = b.equipment_id
-            WHERE b.id=%s
-            FOR UPDATE
-        """, (booking_id,))
-        bk = cur.fetchone()
-        if not bk:
-            return jsonify({"error": "booking not found"}), 404
-        if bk["owner_id"] != owner_id:
-            return jsonify({"error": "forbidden"}), 403
-
-        # Si vamos a aprobar, validamos que no se solape con otra aprobada/bloqueante
-        if new_status == "approved":
+    # Lock + ownership + solape + UPDATE en una sentencia. Dos aprobaciones
+    # concurrentes pueden pasar las dos el chequeo: ahí decide el constraint.
+    def _update():
+        with get_cur(True) as cur:
             cur.execute("""
-                SELECT 1
-                FROM equipment_bookings eb
-                WHERE eb.equipment_id = %s
-                  AND eb.id <> %s
-                  AND eb.status = ANY(%s)
-                  AND daterange(eb.start_date, eb.end_date, '[)') && daterange(%s, %s, '[)')
-                LIMIT 1
-            """, (bk["equipment_id"], booking_id, list(BLOCKING_STATUSES), bk["start_date"], bk["end_date"]))
-            if cur.fetchone():
-                return jsonify({"error": "overlap"},), 409
-
-        # Actualizamos estado
-        cur.execute("""
-            UPDATE equipment_bookings
-               SET status=%s
-             WHERE id=%s
-            RETURNING id
-        """, (new_status, booking_id))
+                WITH bk AS (
+                    SELECT b.id, b.equipment_id, b.renter_id, b.start_date, b.end_date, b.status,
+                           e.title, e.owner_id
+                    FROM equipment_bookings b
+                    JOIN equipment e ON e.id = b.equipment_id
+                    WHERE b.id = %(booking_id)s
+                    FOR UPDATE OF b
+                ),
+                overlap AS (
+                    SELECT 1
+                    FROM equipment_bookings eb, bk
+                    WHERE %(status)s = 'approved'
+                      AND eb.equipment_id = bk.equipment_id
+                      AND eb.id <> bk.id
+                      AND eb.status = ANY(%(blocking)s)
+                      AND daterange(eb.start_date, eb.end_date, '[)') && daterange(bk.start_date, bk.end_date, '[)')
+                    LIMIT 1
+                ),
+                upd AS (
+                    UPDATE equipment_bookings b
+                       SET status = %(status)s
+                      FROM bk
+                     WHERE b.id = bk.id AND bk.owner_id = %(owner_id)s
+                       AND NOT EXISTS (SELECT 1 FROM overlap)
+                    RETURNING b.id
+                )
+                SELECT bk.*,
+                       EXISTS (SELECT 1 FROM overlap) AS overlaps,
+                       (SELECT id FROM upd) AS updated_id
+                FROM bk
+            """, {"booking_id": booking_id, "status": new_status, "owner_id": owner_id,
+                  "blocking": list(BLOCKING_STATUSES)})
+            row = cur.fetchone()
+            if row and row["updated_id"]:
+                invalidate_calendar(row["equipment_id"])
+            return row
+
+    try:
+        bk = retry_on_deadlock(_update)
+    except psycopg2.Error as e:
+        if is_overlap_violation(e):
+            return jsonify({"error": "overlap"},), 409
+        raise
+    if not bk:
+        return jsonify({"error": "booking not found"}), 404
+    if bk["owner_id"] != owner_id:
+        return jsonify({"error": "forbidden"}), 403
+    if bk["overlaps"]:
+        return jsonify({"error": "overlap"},), 409
 
     # Notificamos al renter
-    title_ok = "✅ Solicitud aprobada"
-    body_ok  = f"Tu solicitud para '{bk['title']}' del {bk['start_date']} al {bk['end_date']} fue aprobada."
-    title_no = "❌ Solicitud rechazada"
-    body_no  = f"Tu solicitud para '{bk['title']}' del {bk['start_date']} al {bk['end_date']} fue rechazada."
-
-    notify_user(
-        user_id=bk["renter_id"],
-        ntype=f"booking_{new_status}",
-        title=title_ok if new_status=="approved" else title_no,
-        body= body_ok  if new_status=="approved" else body_no,
-        data={
-            "booking_id": booking_id,
-            "equipment_id": bk["equipment_id"],
-            "title": bk["title"],
-            "start_date": str(bk["start_date"]),
-            "end_date": str(bk["end_date"]),
-            "status": new_status,
-        }
-    )
+    notify_user(**_decision_notification(bk, new_status))
 
     return jsonify({"ok": True, "status": new_status})
 
 
+@bp.post("/bookings/decisions")
+def decide_bookings():
+    """
+    Aprueba/rechaza varias solicitudes en una transacción.
+    Body: {"decisions": [{"booking_id": 1, "status": "approved"}, ...]}
+    - Las aprobaciones se resuelven por start_date: si dos del lote se pisan,
+      gana la que empieza antes y la otra vuelve con "overlap".
+    - Respuesta por ítem, en el orden del pedido.
+    - Round trips: lock, bookings bloqueantes, UPDATE ... FROM (VALUES ...) y
+      un INSERT con todas las notificaciones.
+    """
+    owner_id, err = get_user_id_from_bearer(request)
+    if err:
+        return err
+
+    p = request.get_json(silent=True) or {}
+    items = p.get("decisions")
+    if not isinstance(items, list) or not items:
+        return error("decisions must be a non-empty list", 400)
+    if len(items) > BOOKING_DECISIONS_MAX:
+        return error(f"At most {BOOKING_DECISIONS_MAX} decisions per call", 400)
+
+    results = [None] * len(items)
+    wanted = {}   # booking_id -> (índice, status)
+    for i, it in enumerate(items):
+        it = it if isinstance(it, dict) else {}
+        status = str(it.get("status") or "").strip().lower()
+        try:
+            booking_id = int(it.get("booking_id"))
+        except (TypeError, ValueError):
+            results[i] = {"booking_id": it.get("booking_id"), "ok": False, "error": "invalid booking_id"}
+            continue
+        if status not in ("approved", "rejected"):
+            results[i] = {"booking_id": booking_id, "ok": False,
+                          "error": "status must be 'approved' or 'rejected'"}
+        elif booking_id in wanted:
+            results[i] = {"booking_id": booking_id, "ok": False, "error": "duplicate"}
+        else:
+            wanted[booking_id] = (i, status)
+
+    def _apply():
+        decided, failed = [], {}
+        with get_cur(True) as cur:
+            # Lock en orden de id: dos lotes que comparten bookings no se traban
+            cur.execute("""
+                SELECT b.id, b.equipment_id, b.renter_id, b.start_date, b.end_date, b.status,
+                       e.title, e.owner_id
+                FROM equipment_bookings b
+                JOIN equipment e ON e.id = b.equipment_id
+                WHERE b.id = ANY(%s)
+                ORDER BY b.id
+                FOR UPDATE OF b
+            """, (list(wanted),))
+            rows = {r["id"]: r for r in cur.fetchall()}
+
+            for bid in wanted:
+                if bid not in rows:
+                    failed[bid] = "booking not found"
+                elif rows[bid]["owner_id"] != owner_id:
+                    failed[bid] = "forbidden"
+            mine = sorted((r for r in rows.values() if r["id"] not in failed),
+                          key=lambda r: (r["start_date"], r["id"]))
+
+            # Ocupación vigente de los equipos involucrados, sin contar los del lote
+            taken = {}
+            approving = [r for r in mine if wanted[r["id"]][1] == "approved"]
+            if approving:
+                cur.execute("""
+                    SELECT equipment_id, start_date, end_date
+                    FROM equipment_bookings
+                    WHERE equipment_id = ANY(%s)
+                      AND status = ANY(%s)
+                      AND id <> ALL(%s)
+                      AND start_date < %s AND end_date > %s
+                """, (list({r["equipment_id"] for r in approving}), list(BLOCKING_STATUSES),
+                      [r["id"] for r in mine],
+                      max(r["end_date"] for r in approving), min(r["start_date"] for r in approving)))
+                for r in cur.fetchall():
+                    taken.setdefault(r["equipment_id"], []).append((r["start_date"], r["end_date"]))
+                # Los que ya bloquean y se re-aprueban conservan su lugar
+                for r in approving:
+                    if r["status"] in BLOCKING_STATUSES:
+                        taken.setdefault(r["equipment_id"], []).append((r["start_date"], r["end_date"]))
+
+            for r in mine:
+                status = wanted[r["id"]][1]
+                if status == "approved" and r["status"] not in BLOCKING_STATUSES:
+                    busy = taken.setdefault(r["equipment_id"], [])
+                    if any(r["start_date"] < e and r["end_date"] > s for s, e in busy):
+                        failed[r["id"]] = "overlap"
+                        continue
+                    busy.append((r["start_date"], r["end_date"]))
+                decided.append((r, status))
+
+            # Primero los rechazos y después las aprobaciones: equipment_bookings_no_overlap
+            # se chequea fila por fila, y en un solo UPDATE una aprobación podía chocar con
+            # un booking del mismo lote que todavía no había pasado a rechazado.
+            for batch in ([d for d in decided if d[1] != "approved"],
+                          [d for d in decided if d[1] == "approved"]):
+                if batch:
+                    execute_values(cur, """
+                        UPDATE equipment_bookings b
+                           SET status = v.status
+                          FROM (VALUES %s) AS v(id, status)
+                         WHERE b.id = v.id
+                    """, [(r["id"], status) for r, status in batch], page_size=len(batch))
+            for eid in {r["equipment_id"] for r, _ in decided}:
+                invalidate_calendar(eid)
+        return decided, failed
+
+    decided, failed = [], {}
+    if wanted:
+        # Una aprobación suelta que commitea entre nuestra lectura y el UPDATE
+        # dispara el constraint: reintentamos y en la relectura ya aparece.
+        for attempt in range(3):
+            try:
+                decided, failed = retry_on_deadlock(_apply)
+                break
+            except psycopg2.Error as e:
+                if not is_overlap_violation(e):
+                    raise
+                if attempt == 2:
+                    return error("overlap", 409)
+
+    for bid, reason in failed.items():
+        results[wanted[bid][0]] = {"booking_id": bid, "ok": False, "error": reason}
+    for r, status in decided:
+        results[wanted[r["id"]][0]] = {"booking_id": r["id"], "ok": True, "status": status}
+
+    notify_many([_decision_notification(r, status) for r, status in decided])
+
+    return ok({"results": results, "applied": len(decided)})
+
+
 @bp.get("/equipment/mine")
 def my_equipment():
     owner_id, err = get_user_id_from_bearer(request)
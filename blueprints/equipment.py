@@ -1,12 +1,58 @@
 # blueprints/equipment.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 from utils.http import ok, created, error
-from db import get_cur
+from db import get_cur, after_commit
 from blueprints.auth_helpers import get_user_id_from_bearer
 from utils.validators import UpdateEquipment  # si lo usás
+from utils.geo import GeoGridIndex, HAVERSINE_SQL, bbox_sql
+from utils.schema import registry as schema
+from utils.search import tokenize, prefix_tsquery, tsquery_sql
+from utils.pagination import Keyset, InvalidCursor, decode_cursor
+from utils.availability import BITMAP_JOIN, FREE_RANGE_SQL, LEGACY_FREE_RANGE_SQL
+from utils.intervals import merge, clip, subtract, days, as_json
+from utils.cache import TTLCache
+from utils import realtime
+from config import (GEO_GRID_INDEX, GEO_GRID_CELL_DEG, GEO_GRID_TTL, GEO_NEAREST_OVERSAMPLE,
+                    SEARCH_DISTANCE_DECAY_KM, CALENDAR_BATCH_MAX, CALENDAR_CACHE_MAX,
+                    CALENDAR_CACHE_TTL)
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import json
+import threading
+import time
 
 bp = Blueprint("equipment", __name__)
 
+# Columnas internas de equipment que no salen en las respuestas (búsqueda de texto)
+_HIDDEN_COLUMNS = ("search_tsv", "search_text")
+
+# Índice en memoria para nearest-N sin radio (opcional, ver GEO_GRID_INDEX)
+_grid = GeoGridIndex(GEO_GRID_CELL_DEG)
+_grid_lock = threading.Lock()
+
+def _geo_grid():
+    """
+    Carga el índice la primera vez (bloqueante) y lo recarga cuando tiene más
+    de GEO_GRID_TTL segundos: mientras un request recarga, los demás siguen
+    usando el índice anterior.
+    """
+    def stale():
+        return not _grid.built_at or time.monotonic() - _grid.built_at > GEO_GRID_TTL
+
+    if stale() and _grid_lock.acquire(blocking=not _grid.built_at):
+        try:
+            if not stale():
+                return _grid
+            with get_cur() as cur:
+                cur.execute("""
+                    SELECT id, latitude, longitude FROM equipment
+                    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+                """)
+                _grid.load((r["id"], r["latitude"], r["longitude"]) for r in cur.fetchall())
+        finally:
+            _grid_lock.release()
+    return _grid
+
 @bp.post("")
 def create_equipment():
     owner_id, err = get_user_id_from_bearer(request)
@@ -43,6 +89,9 @@ def create_equipment():
             RETURNING id
         """, (owner_id, sport_id, title, description, size, condition_id, latitude, longitude))
         eid = cur.fetchone()["id"]
+        if GEO_GRID_INDEX and latitude is not None and longitude is not None:
+            after_commit(lambda: _grid.insert(eid, latitude, longitude))
+        invalidate_calendar(eid)  # availability nueva
 
         for url in images:
             cur.execute("""
@@ -80,10 +129,26 @@ def search_equipment():
     end_date = request.args.get("end_date")
     page = max(1, request.args.get("page", default=1, type=int))
     page_size = max(1, min(50, request.args.get("page_size", default=20, type=int)))
+    cursor = request.args.get("cursor")  # presente (aunque vacío) => modo keyset
 
     conds, params = [], {}
-
-    if q:
+    sort = request.args.get("sort")
+
+    # Full-text (es/en/simple, prefijos) + trigramas para typos/modelos.
+    # Sin la migración 0003 (o si q no tiene tokens) seguimos con ILIKE.
+    tokens = tokenize(q) if q else []
+    relevance_join = ""
+    relevance_select = "NULL AS relevance"
+    if tokens and schema.has_column("equipment", "search_tsv"):
+        params["tsq"] = prefix_tsquery(tokens)
+        params["q_norm"] = " ".join(tokens)
+        tsq = tsquery_sql("tsq")
+        conds.append(f"(e.search_tsv @@ ({tsq}) OR %(q_norm)s <%% e.search_text)")
+        relevance_join = f"""CROSS JOIN LATERAL (
+                SELECT (ts_rank_cd(e.search_tsv, {tsq}) + word_similarity(%(q_norm)s, e.search_text))::float8 AS relevance
+            ) rel"""
+        relevance_select = "rel.relevance"
+    elif q:
         conds.append("(e.title ILIKE %(q)s OR e.description ILIKE %(q)s OR e.size ILIKE %(q)s)")
         params["q"] = f"%{q}%"
 
@@ -91,84 +156,120 @@ def search_equipment():
         conds.append("e.sport_id = %(sport_id)s")
         params["sport_id"] = sport_id
 
-    date_filter_sql = ""
+    date_join = ""
     if start_date and end_date:
-        date_filter_sql = """
-            AND EXISTS (
-                SELECT 1
-                FROM equipment_availability a
-                WHERE a.equipment_id = e.id
-                  AND COALESCE(a.kind, 'available') = 'available'
-                  AND a.start_date <= %(start_date)s::date
-                  AND a.end_date   >= %(end_date)s::date
-            )
-            AND NOT EXISTS (
-                SELECT 1
-                FROM equipment_bookings b
-                WHERE b.equipment_id = e.id
-                  AND b.status IS DISTINCT FROM 'cancelled'
-                  AND %(start_date)s::date <= b.end_date
-                  AND %(end_date)s::date   >= b.start_date
-            )
-        """
+        try:
+            if date.fromisoformat(start_date) > date.fromisoformat(end_date):
+                return error("start_date must be <= end_date", 400)
+        except ValueError:
+            return error("start_date/end_date must be YYYY-MM-DD", 400)
         params["start_date"] = start_date
         params["end_date"] = end_date
-
-    distance_expr = None
+        if schema.has_table("equipment_day_bitmaps"):
+            # chequeo de bits por fila en vez de EXISTS/NOT EXISTS (utils/availability.py)
+            date_join = BITMAP_JOIN
+            conds.append(FREE_RANGE_SQL)
+        else:
+            conds.append(LEGACY_FREE_RANGE_SQL)
+
+    # Orden total: (created_at, id) siempre al final como desempate
+    tail_keys = [("e.created_at", "DESC", "created_at", "timestamp"), ("e.id", "DESC", "id", "int")]
+    distance_join = ""
     distance_select = "NULL AS distance_km"
-    distance_where = ""
-    order_sql = " ORDER BY e.created_at DESC "
-
-    if lat is not None and lng is not None and radius_km is not None:
-        distance_expr = """
-            (6371 * acos(
-                cos(radians(%(lat)s)) * cos(radians(e.latitude)) *
-                cos(radians(e.longitude) - radians(%(lng)s)) +
-                sin(radians(%(lat)s)) * sin(radians(e.latitude))
-            ))
-        """
+    score_join = ""
+    score_select = ""
+    keys = ([("rel.relevance", "DESC", "relevance", "float8")] if relevance_join else []) + tail_keys
+
+    geo = lat is not None and lng is not None
+    nearest = geo and radius_km is None and sort == "nearest"
+
+    if geo and (radius_km is not None or nearest):
         params["lat"] = lat
         params["lng"] = lng
-
         conds.append("(e.latitude IS NOT NULL AND e.longitude IS NOT NULL)")
-
-        distance_select = f"{distance_expr} AS distance_km"
-        distance_where = f" AND {distance_expr} <= %(radius_km)s "
+        # Haversine una sola vez por fila (LATERAL), solo sobre los sobrevivientes del prefiltro
+        distance_join = f"CROSS JOIN LATERAL (SELECT {HAVERSINE_SQL} AS distance_km) d"
+        distance_select = "d.distance_km"
+        keys = [("d.distance_km", "ASC", "distance_km", "float8")] + tail_keys
+        if relevance_join and not nearest and sort != "distance":
+            # relevancia que decae con la distancia (a DECAY km vale la mitad)
+            params["decay_km"] = SEARCH_DISTANCE_DECAY_KM
+            score_join = "CROSS JOIN LATERAL (SELECT rel.relevance / (1 + d.distance_km / %(decay_km)s) AS score) sc"
+            score_select = ", sc.score"
+            keys = [("sc.score", "DESC", "score", "float8")] + keys
+
+    if geo and radius_km is not None:
+        # Bounding box servible por el índice GiST; haversine exacto después
+        conds.append(bbox_sql(lat, lng, radius_km, params))
+        conds.append("d.distance_km <= %(radius_km)s")
         params["radius_km"] = radius_km
 
-        order_sql = " ORDER BY distance_km ASC, e.created_at DESC "
-
-    where_sql = ("WHERE " + " AND ".join(conds)) if conds else ""
-    limit_sql = " LIMIT %(limit)s OFFSET %(offset)s "
-    params["limit"] = page_size
-    params["offset"] = (page - 1) * page_size
-
-    sql = f"""
-        SELECT
-            e.id, e.title, e.description, e.size, e.sport_id,
-            e.latitude, e.longitude, e.created_at,
-            COALESCE(img.image_url, NULL) AS image_url,
-            {distance_select}
-        FROM equipment e
-        LEFT JOIN LATERAL (
-            SELECT image_url
-            FROM equipment_images
-            WHERE equipment_id = e.id
-            ORDER BY id ASC
-            LIMIT 1
-        ) img ON TRUE
-        {where_sql}
-        {date_filter_sql}
-        {distance_where}
-        {order_sql}
-        {limit_sql}
-    """
-
-    with get_cur() as cur:
-        cur.execute(sql, params)
-        rows = cur.fetchall()
-
-    return ok(rows)
+    keyset = Keyset(keys)
+    if cursor is not None:
+        # keyset: la página N cuesta lo mismo que la 1 y no se corre al insertar
+        if cursor:
+            try:
+                conds.append(keyset.where_sql(decode_cursor(cursor), params))
+            except InvalidCursor as e:
+                return error(str(e), 400)
+        limit_sql = " LIMIT %(limit)s "
+        params["limit"] = page_size + 1
+    else:
+        limit_sql = " LIMIT %(limit)s OFFSET %(offset)s "
+        params["limit"] = page_size
+        params["offset"] = (page - 1) * page_size
+    order_sql = keyset.order_sql()
+
+    def _result(rows):
+        return ok(keyset.page(rows, page_size) if cursor is not None else rows)
+
+    def _query(extra_conds=()):
+        all_conds = conds + list(extra_conds)
+        where_sql = ("WHERE " + " AND ".join(all_conds)) if all_conds else ""
+        sql = f"""
+            SELECT
+                e.id, e.title, e.description, e.size, e.sport_id,
+                e.latitude, e.longitude, e.created_at,
+                COALESCE(img.image_url, NULL) AS image_url,
+                {distance_select},
+                {relevance_select}
+                {score_select}
+            FROM equipment e
+            {date_join}
+            {distance_join}
+            {relevance_join}
+            {score_join}
+            LEFT JOIN LATERAL (
+                SELECT image_url
+                FROM equipment_images
+                WHERE equipment_id = e.id
+                ORDER BY id ASC
+                LIMIT 1
+            ) img ON TRUE
+            {where_sql}
+            {order_sql}
+            {limit_sql}
+        """
+        with get_cur() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    if nearest and GEO_GRID_INDEX:
+        # Nearest-N sin radio: candidatos del índice en memoria, filtros en SQL.
+        # Si los filtros descartan demasiados, agrandamos la tanda de candidatos.
+        # Con cursor los candidatos incluyen las páginas ya vistas (el keyset las descarta).
+        grid = _geo_grid()
+        want = page * page_size
+        n = want * GEO_NEAREST_OVERSAMPLE
+        while True:
+            near_ids = [oid for oid, _ in grid.nearest(lat, lng, n)]
+            params["near_ids"] = near_ids
+            rows = _query(["e.id = ANY(%(near_ids)s)"])
+            if len(rows) == params["limit"] or len(near_ids) < n or n >= len(grid):
+                return _result(rows)
+            n *= 4
+
+    return _result(_query())
 
 @bp.get("/<int:eid>")
 def get_equipment(eid):
@@ -177,6 +278,8 @@ def get_equipment(eid):
         row = cur.fetchone()
     if not row:
         return error("Equipment not found", 404)
+    for col in _HIDDEN_COLUMNS:
+        row.pop(col, None)
     return ok(row)
 
 @bp.put("/<int:eid>")
@@ -194,186 +297,300 @@ def update_equipment(eid):
         return error("No fields to update")
     values.append(eid)
     with get_cur(True) as cur:
-        cur.execute(f"UPDATE equipment SET {', '.join(fields)} WHERE id=%s", tuple(values))
+        cur.execute(f"UPDATE equipment SET {', '.join(fields)} WHERE id=%s RETURNING latitude, longitude", tuple(values))
+        row = cur.fetchone()
+    if GEO_GRID_INDEX and row:
+        after_commit(lambda: _grid.insert(eid, row["latitude"], row["longitude"]))
     return ok({"updated": True})
 
+# Detalle completo en UNA sentencia (JSON anidado). Si la versión coincide con
+# la que ya tiene el cliente, el CASE corta y no se ejecuta ninguna subquery.
+_DETAIL_SQL = """
+    SELECT {version} AS version,
+      CASE WHEN {version} IS NOT DISTINCT FROM %(known_version)s::bigint THEN NULL ELSE (
+        json_build_object(
+          'equipment', (to_jsonb(e) - %(hidden)s::text[]) || jsonb_build_object('image_url', (
+              SELECT image_url FROM equipment_images
+              WHERE equipment_id = e.id
+              ORDER BY id ASC LIMIT 1)),
+          'images', COALESCE((
+              SELECT json_agg(json_build_object('id', i.id, 'image_url', i.image_url) ORDER BY i.id)
+              FROM equipment_images i
+              WHERE i.equipment_id = e.id), '[]'),
+          'availability', COALESCE((
+              SELECT json_agg(json_build_object('id', a.id, 'start_date', a.start_date, 'end_date', a.end_date)
+                              ORDER BY a.start_date)
+              FROM equipment_availability a
+              WHERE a.equipment_id = e.id AND COALESCE(a.kind, 'available') = 'available'), '[]'),
+          'approved_bookings', COALESCE((
+              SELECT json_agg(json_build_object('id', b.id, 'start_date', b.start_date,
+                                                'end_date', b.end_date, 'status', b.status)
+                              ORDER BY b.start_date)
+              FROM equipment_bookings b
+              WHERE b.equipment_id = e.id AND b.status = 'approved'), '[]'),
+          'reviews', COALESCE((
+              SELECT json_agg(x ORDER BY x.created_at DESC)
+              FROM (
+                  SELECT r.id, r.rating, r.comment, r.created_at, u.full_name AS reviewer_name
+                  FROM equipment_reviews r
+                  LEFT JOIN users u ON u.id = r.reviewer_id
+                  WHERE r.equipment_id = e.id
+                  ORDER BY r.created_at DESC
+                  LIMIT 50
+              ) x), '[]'),
+          'reviews_summary', (
+              -- avg como texto: igual que el Decimal que devolvía psycopg2
+              SELECT json_build_object('avg_rating', COALESCE(AVG(rating), 0)::text, 'total', COUNT(*))
+              FROM equipment_reviews
+              WHERE equipment_id = e.id)
+        )::text
+      ) END AS doc
+    FROM equipment e
+    WHERE e.id = %(eid)s
+"""
+
+def _detail_etag(eid, version):
+    return f"eq-{eid}-v{version}"
+
+def _known_version(eid):
+    """Versión del If-None-Match si es un ETag nuestro para este equipo."""
+    prefix = f"eq-{eid}-v"
+    for tag in request.if_none_match.as_set():
+        if tag.startswith(prefix) and tag[len(prefix):].isdigit():
+            return int(tag[len(prefix):])
+    return None
+
+def _revive_dates(obj):
+    """
+    El JSON de Postgres trae fechas en ISO; las volvemos a date/datetime para
+    que la respuesta salga igual que con psycopg2 (numéricos: parse_float=Decimal).
+    """
+    if isinstance(obj, list):
+        return [_revive_dates(v) for v in obj]
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            if isinstance(v, str) and (k.endswith("_at") or k.endswith("_date")):
+                try:
+                    v = datetime.fromisoformat(v) if "T" in v else date.fromisoformat(v)
+                except ValueError:
+                    pass
+            out[k] = _revive_dates(v)
+        return out
+    return obj
+
 @bp.get("/<int:eid>/detail")
 def equipment_detail(eid):
+    versioned = schema.has_column("equipment", "version")
+    known = _known_version(eid) if versioned else None
     with get_cur() as cur:
-        cur.execute("""
-            SELECT e.*, img.image_url
-            FROM equipment e
-            LEFT JOIN LATERAL (
-                SELECT image_url FROM equipment_images
-                WHERE equipment_id = e.id
-                ORDER BY id ASC LIMIT 1
-            ) img ON TRUE
-            WHERE e.id=%s
-        """, (eid,))
-        eq = cur.fetchone()
-        if not eq:
-            return error("Equipment not found", 404)
-
-        cur.execute("""
-            SELECT id, image_url
-            FROM equipment_images
-            WHERE equipment_id=%s
-            ORDER BY id ASC
-        """, (eid,))
-        images = cur.fetchall()
-
-        cur.execute("""
-            SELECT id, start_date, end_date
-            FROM equipment_availability
-            WHERE equipment_id=%s AND COALESCE(kind,'available')='available'
-            ORDER BY start_date ASC
-        """, (eid,))
-        availability = cur.fetchall()
-
-        cur.execute("""
-            SELECT id, start_date, end_date, status
-            FROM equipment_bookings
-            WHERE equipment_id=%s AND status='approved'
-            ORDER BY start_date ASC
-        """, (eid,))
-        approved = cur.fetchall()
+        cur.execute(_DETAIL_SQL.format(version="e.version" if versioned else "NULL::bigint"),
+                    {"eid": eid, "known_version": known, "hidden": list(_HIDDEN_COLUMNS)})
+        row = cur.fetchone()
+    if not row:
+        return error("Equipment not found", 404)
 
+    if row["doc"] is None:
+        resp = make_response("", 304)
+    else:
+        resp, _ = ok(_revive_dates(json.loads(row["doc"], parse_float=Decimal)))
+    if versioned:
+        resp.set_etag(_detail_etag(eid, row["version"]))
+        resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+# Estados que bloquean el calendario (mismos que BLOCKING_STATUSES en bookings.py)
+_CALENDAR_BLOCKING = ("approved", "handoff", "in_use", "returning")
+
+# (eid, start, end) -> (versión, calendario). Los writes de cualquier proceso
+# llegan por NOTIFY equipment_calendar (0024) al thread de LISTEN de
+# utils/realtime.py, que saca las entradas del equipo: con el LISTEN activo un
+# hit no toca la base. Si está caído, cada hit se valida contra
+# equipment_calendar_versions (0020, una lectura por PK). invalidate_calendar
+# además la saca en el proceso que escribió. Sin las migraciones solo queda
+# eso y el TTL (los otros workers pueden servir hasta CALENDAR_CACHE_TTL viejo).
+_calendar_cache = TTLCache(maxsize=CALENDAR_CACHE_MAX, ttl=CALENDAR_CACHE_TTL, name="equipment_calendars")
+
+CALENDAR_CHANNEL = "equipment_calendar"
+
+# Sube con cada (re)conexión del LISTEN: lo calculado antes no se guarda
+_calendar_epoch = 0
+
+def invalidate_calendar(eid):
+    """Invalida los calendarios cacheados de `eid` cuando commitea el request."""
+    after_commit(lambda: _calendar_cache.pop_group(eid))
+
+def _calendar_listening():
+    hub = realtime.get_hub()
+    if hub.ready(CALENDAR_CHANNEL):
+        return True
+    hub.watch(CALENDAR_CHANNEL, _on_calendar_notify, on_connect=_calendar_reset)
+    return False
+
+def _on_calendar_notify(payload):
+    if payload.isdigit():
+        _calendar_cache.pop_group(int(payload))
+
+def _calendar_reset():
+    # lo que se notificó con la conexión caída se perdió
+    global _calendar_epoch
+    _calendar_epoch += 1   # antes del clear: ver _cached_calendars
+    _calendar_cache.clear()
+
+def _calendar_window():
+    """(start, end) de ?start/&end (default: hoy + 90 días). ValueError si no son fechas."""
+    start_s = request.args.get("start")
+    end_s = request.args.get("end")
+    start = date.fromisoformat(start_s) if start_s else date.today()
+    end = date.fromisoformat(end_s) if end_s else date.today() + timedelta(days=90)
+    return start, end
+
+def _calendar_versions(eids):
+    """{eid: versión} de equipment_calendar_versions (0 si no hay fila); None sin la migración."""
+    if not schema.has_table("equipment_calendar_versions"):
+        return None
+    with get_cur() as cur:
         cur.execute("""
-            SELECT r.id, r.rating, r.comment, r.created_at,
-                   u.full_name AS reviewer_name
-            FROM equipment_reviews r
-            LEFT JOIN users u ON u.id = r.reviewer_id
-            WHERE r.equipment_id=%s
-            ORDER BY r.created_at DESC
-            LIMIT 50
-        """, (eid,))
-        reviews = cur.fetchall()
-
+            SELECT equipment_id, version FROM equipment_calendar_versions
+            WHERE equipment_id = ANY(%s)
+        """, (list(eids),))
+        found = {r["equipment_id"]: r["version"] for r in cur.fetchall()}
+    return {eid: found.get(eid, 0) for eid in eids}
+
+def _cached_calendars(eids, start, end):
+    """Como _calendars pero pasando por el cache: solo los que faltan (o cambiaron) van a la base."""
+    epoch = _calendar_epoch
+    versions = None if _calendar_listening() else _calendar_versions(eids)
+    out, missing, gens = {}, [], {}
+    for eid in eids:
+        hit = _calendar_cache.get((eid, start, end))
+        if hit is None or (versions is not None and hit[0] != versions[eid]):
+            missing.append(eid)
+            gens[eid] = _calendar_cache.generation(eid)
+        else:
+            out[eid] = hit[1]
+    if missing:
+        for eid, cal in _calendars(missing, start, end).items():
+            version = versions[eid] if versions is not None else None
+            _calendar_cache.set((eid, start, end), (version, cal), group=eid, generation=gens[eid])
+            if epoch != _calendar_epoch:
+                _calendar_cache.pop((eid, start, end))
+            out[eid] = cal
+    return out
+
+def _calendars(eids, start, end, with_days=True, debug=False):
+    """
+    Calendarios de varios equipos en [start, end) con UNA query: se traen los
+    rangos que tocan la ventana y se combinan con merge/subtract de intervalos
+    (O(rangos log rangos), independiente de la cantidad de días).
+    El status se normaliza acá, así el WHERE usa el índice por equipment_id.
+    """
+    with get_cur() as cur:
         cur.execute("""
-            SELECT COALESCE(AVG(rating),0) AS avg_rating,
-                   COUNT(*) AS total
-            FROM equipment_reviews
-            WHERE equipment_id=%s
-        """, (eid,))
-        agg = cur.fetchone()
+            SELECT 'availability' AS src, a.equipment_id, a.id, a.start_date, a.end_date, NULL AS status
+            FROM equipment_availability a
+            WHERE a.equipment_id = ANY(%(ids)s)
+              AND a.start_date < %(end)s AND a.end_date > %(start)s
+            UNION ALL
+            SELECT 'booking', b.equipment_id, b.id, b.start_date, b.end_date, b.status::text
+            FROM equipment_bookings b
+            WHERE b.equipment_id = ANY(%(ids)s)
+              AND b.start_date < %(end)s AND b.end_date > %(start)s
+        """, {"ids": list(eids), "start": start, "end": end})
+        rows = cur.fetchall()
 
-    return ok({
-        "equipment": eq,
-        "images": images,
-        "availability": availability,
-        "approved_bookings": approved,
-        "reviews": reviews,
-        "reviews_summary": agg
-    })
+    per_eq = {eid: {"avail": [], "booked": [], "pending": [], "debug": []} for eid in eids}
+    for r in rows:
+        acc = per_eq[r["equipment_id"]]
+        rng = (r["start_date"], r["end_date"])
+        if r["src"] == "availability":
+            acc["avail"].append(rng)
+            continue
+        status = (r["status"] or "").strip().lower()
+        if status in _CALENDAR_BLOCKING:
+            acc["booked"].append(rng)
+        elif status == "pending":
+            acc["pending"].append(rng)
+        if debug:
+            acc["debug"].append((r, status))
+
+    out = {}
+    for eid, acc in per_eq.items():
+        avail = clip(merge(acc["avail"]), start, end)
+        booked = clip(merge(acc["booked"]), start, end)
+        pending = clip(merge(acc["pending"]), start, end)
+        free = subtract(avail, booked)
+        cal = {
+            "available_ranges": as_json(free),
+            "booked_ranges": as_json(booked),
+            "pending_ranges": as_json(pending),
+        }
+        if with_days:
+            cal.update({
+                "available_days": days(free),
+                "booked_days": days(booked),
+                "pending_days": days(pending),
+            })
+        if debug:
+            cal["_debug_rows"] = [
+                f"{d} #id={r['id']} {status} [{r['start_date']}→{r['end_date']}]"
+                for r, status in acc["debug"]
+                for d in days(clip([(r["start_date"], r["end_date"])], start, end))
+            ]
+        out[eid] = cal
+    return out
 
 @bp.get("/<int:eq_id>/calendar")
 def equipment_calendar(eq_id):
-    start_s = request.args.get("start")
-    end_s   = request.args.get("end")
-    debug   = request.args.get("debug") in ("1", "true", "yes")
-
-    # Construimos SQL con un bloque de debug opcional
-    debug_cte = """
-    , booked_debug AS (
-        SELECT d.d::text AS day_txt, eb.id,
-               lower(trim(eb.status::text)) AS status,
-               eb.start_date::text AS s, eb.end_date::text AS e
-        FROM days d
-        JOIN equipment_bookings eb
-          ON eb.equipment_id = %s
-         AND d.d >= eb.start_date
-         AND d.d <  eb.end_date
-    )
-    """ if debug else ""
-
-    debug_select = """,
-      COALESCE((SELECT array_agg(
-        day_txt || ' #id=' || id::text || ' ' || status || ' [' || s || '→' || e || ']'
-      ) FROM booked_debug), ARRAY[]::text[]) AS _debug_rows
-    """ if debug else ""
-
-    sql = f"""
-    WITH bounds AS (
-      SELECT
-        COALESCE(%s::date, CURRENT_DATE) AS start_date,
-        COALESCE(%s::date, CURRENT_DATE + INTERVAL '90 days')::date AS end_date
-    ),
-    days AS (
-      SELECT generate_series(b.start_date, b.end_date - INTERVAL '1 day', INTERVAL '1 day')::date AS d
-      FROM bounds b
-    ),
-    -- Si querés "todo disponible salvo bloqueos", cambia este CTE por:  SELECT d.d FROM days d
-    avail AS (
-      SELECT d.d
-      FROM days d
-      JOIN equipment_availability ea
-        ON ea.equipment_id = %s
-       AND d.d >= ea.start_date
-       AND d.d <  ea.end_date
-      GROUP BY d.d
-    ),
-    booked_blocking AS (
-      SELECT d.d
-      FROM days d
-      JOIN equipment_bookings eb
-        ON eb.equipment_id = %s
-       AND lower(trim(eb.status::text)) IN ('approved','handoff','in_use','returning')
-       AND d.d >= eb.start_date
-       AND d.d <  eb.end_date
-      GROUP BY d.d
-    ),
-    pending_holds AS (
-      SELECT d.d
-      FROM days d
-      JOIN equipment_bookings eb
-        ON eb.equipment_id = %s
-       AND lower(trim(eb.status::text)) = 'pending'
-       AND d.d >= eb.start_date
-       AND d.d <  eb.end_date
-      GROUP BY d.d
-    ),
-    free_days AS (
-      SELECT a.d
-      FROM avail a
-      LEFT JOIN booked_blocking b ON b.d = a.d
-      WHERE b.d IS NULL
-      ORDER BY a.d
-    )
-    {debug_cte}
-    SELECT
-      COALESCE((SELECT array_agg(f.d::text) FROM free_days f), ARRAY[]::text[])       AS available_days,
-      COALESCE((SELECT array_agg(b.d::text) FROM booked_blocking b), ARRAY[]::text[]) AS booked_days,
-      COALESCE((SELECT array_agg(p.d::text) FROM pending_holds p), ARRAY[]::text[])   AS pending_days
-      {debug_select}
-    ;
     """
+    Días y rangos [start, end) libres / ocupados / con pedidos pendientes.
+    Los pending no restan disponibilidad (solo los estados bloqueantes).
+    """
+    debug = request.args.get("debug") in ("1", "true", "yes")
+    try:
+        start, end = _calendar_window()
+    except ValueError:
+        return error("start/end must be YYYY-MM-DD", 400)
 
-    # Parámetros (si hay debug, se usa eq_id una vez más para booked_debug)
-    params = [start_s, end_s, eq_id, eq_id, eq_id]
     if debug:
-        params.append(eq_id)
-
-    with get_cur() as cur:
-      cur.execute(sql, tuple(params))
-      row = cur.fetchone() or {}
-    print('asdasd')
-    print({
-        "version": "calendar_v3_trim_lower",
+        cal = _calendars([eq_id], start, end, debug=True)[eq_id]
+    else:
+        cal = _cached_calendars([eq_id], start, end)[eq_id]
+    return jsonify({
+        "version": "calendar_v4_intervals",
         "equipment_id": eq_id,
-        "start": start_s,
-        "end": end_s,
-        "available_days": row.get("available_days", []),
-        "booked_days": row.get("booked_days", []),
-        "pending_days": row.get("pending_days", [])
+        "start": request.args.get("start"),
+        "end": request.args.get("end"),
+        **cal,
     })
 
-    return jsonify({
-        "version": "calendar_v3_trim_lower",
-        "equipment_id": eq_id,
-        "start": start_s,
-        "end": end_s,
-        "available_days": row.get("available_days", []),
-        "booked_days": row.get("booked_days", []),
-        "pending_days": row.get("pending_days", []),
-        **({"_debug_rows": row.get("_debug_rows", [])} if debug else {}),
+@bp.get("/calendars")
+def equipment_calendars():
+    """
+    Calendarios de muchos equipos en una llamada (pantalla /equipment/mine):
+    ?ids=1,2,3&start=&end=  (máx. CALENDAR_BATCH_MAX ids). ?days=0 devuelve solo rangos.
+    """
+    try:
+        ids = list(dict.fromkeys(int(x) for x in (request.args.get("ids") or "").split(",") if x.strip()))
+    except ValueError:
+        return error("ids must be a comma separated list of integers", 400)
+    if not ids:
+        return error("ids is required", 400)
+    if len(ids) > CALENDAR_BATCH_MAX:
+        return error(f"at most {CALENDAR_BATCH_MAX} ids per call", 400)
+    try:
+        start, end = _calendar_window()
+    except ValueError:
+        return error("start/end must be YYYY-MM-DD", 400)
+
+    with_days = request.args.get("days") not in ("0", "false", "no")
+    cals = _cached_calendars(ids, start, end)
+    day_keys = () if with_days else ("available_days", "booked_days", "pending_days")
+    return ok({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "calendars": [
+            {"equipment_id": eid, **{k: v for k, v in cals[eid].items() if k not in day_keys}}
+            for eid in ids
+        ],
     })
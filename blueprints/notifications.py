@@ -1,28 +1,73 @@
 # blueprints/notifications.py
-from flask import Blueprint, request, jsonify
-from db import get_cur
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify
+from db import get_cur, release_request_connection
 from blueprints.auth_helpers import get_user_id_from_bearer
+from utils.http import ok, created, error
+from utils import realtime
+from utils.notify import unread_count
+from utils.pagination import Keyset, InvalidCursor, decode_cursor
+from config import NOTIFY_STREAM_HEARTBEAT, NOTIFY_STREAM_MAX_SECONDS, NOTIFY_LIST_LOOKBACK_DAYS
 
 bp = Blueprint("notifications", __name__)
 
+_INBOX_KEYSET = Keyset([
+    ("created_at", "DESC", "created_at", "timestamp"),
+    ("id", "DESC", "id", "int"),
+])
+
 @bp.get("/notifications")
 def list_notifications():
+    """
+    Con ?cursor= (vacío en la primera página) pagina por (created_at, id):
+    {"items", "next_cursor"}. Sin cursor: las últimas 100 (legacy).
+    """
     user_id, err = get_user_id_from_bearer(request)
     if err:
         return err
     only_unread = request.args.get("unread") in ("1","true","yes")
+    cursor = request.args.get("cursor")
+    limit = min(max(request.args.get("limit", type=int) or 30, 1), 100)
+
+    params = {"user_id": user_id}
+    wh = ["user_id = %(user_id)s"]
+    if only_unread:
+        wh.append("read_at IS NULL")
+    if cursor:
+        try:
+            wh.append(_INBOX_KEYSET.where_sql(decode_cursor(cursor), params))
+        except InvalidCursor as e:
+            return error(str(e), 400)
+    params["limit"] = limit + 1 if cursor is not None else 100
+
+    # Ventanas crecientes hacia atrás desde el cursor (o desde ahora): la página
+    # casi siempre sale de los meses recientes y el resto de las particiones ni
+    # se abre. Si no se llena, se agranda la ventana; la última es sin límite.
+    anchor = "%(c_created_at)s::timestamp" if cursor else "LOCALTIMESTAMP"
     with get_cur() as cur:
-        cur.execute(f"""
-            SELECT id, type, title, body, data, created_at, read_at
-            FROM notifications
-            WHERE user_id=%s
-            {"AND read_at IS NULL" if only_unread else ""}
-            ORDER BY created_at DESC
-            LIMIT 100
-        """, (user_id,))
-        rows = cur.fetchall()
+        for days in [*NOTIFY_LIST_LOOKBACK_DAYS, None]:
+            since = f"AND created_at >= {anchor} - make_interval(days => {int(days)})" if days else ""
+            cur.execute(f"""
+                SELECT id, type, title, body, data, created_at, read_at
+                FROM notifications
+                WHERE {" AND ".join(wh)} {since}
+                {_INBOX_KEYSET.order_sql()}
+                LIMIT %(limit)s
+            """, params)
+            rows = cur.fetchall()
+            if len(rows) == params["limit"]:
+                break
+    if cursor is not None:
+        return ok(_INBOX_KEYSET.page(rows, limit))
     return jsonify(rows)
 
+@bp.get("/notifications/unread-count")
+def unread_notifications_count():
+    user_id, err = get_user_id_from_bearer(request)
+    if err:
+        return err
+    return ok({"unread": unread_count(user_id)})
+
 @bp.put("/notifications/<int:nid>/read")
 def mark_notification_read(nid):
     user_id, err = get_user_id_from_bearer(request)
@@ -32,6 +77,128 @@ def mark_notification_read(nid):
         cur.execute("""
             UPDATE notifications
                SET read_at = NOW()
-             WHERE id=%s AND user_id=%s
+             WHERE id=%s AND user_id=%s AND read_at IS NULL
         """, (nid, user_id))
     return jsonify({"ok": True})
+
+@bp.put("/notifications/read")
+def mark_notifications_read():
+    """
+    Marca varias como leídas en un solo UPDATE.
+    Body: {"ids": [..]} y/o {"before": "<ISO>"} (todo lo creado hasta ese momento).
+    """
+    user_id, err = get_user_id_from_bearer(request)
+    if err:
+        return err
+    p = request.get_json(silent=True) or {}
+    ids, before = p.get("ids"), p.get("before")
+    if ids is None and before is None:
+        return error("ids or before is required", 400)
+    if ids is not None and not (
+            isinstance(ids, list) and all(isinstance(i, int) and not isinstance(i, bool) for i in ids)
+    ):
+        return error("ids must be a list of integers", 400)
+    try:
+        before = datetime.fromisoformat(before) if before is not None else None
+    except (TypeError, ValueError):
+        return error("before must be an ISO timestamp", 400)
+
+    conds, params = [], {"user_id": user_id, "ids": ids, "before": before}
+    if ids is not None:
+        conds.append("id = ANY(%(ids)s)")
+    if before is not None:
+        conds.append("created_at <= %(before)s")
+    with get_cur(True) as cur:
+        cur.execute(f"""
+            UPDATE notifications
+               SET read_at = NOW()
+             WHERE user_id = %(user_id)s AND read_at IS NULL
+               AND ({" OR ".join(conds)})
+        """, params)
+        updated = cur.rowcount
+    return ok({"updated": updated})
+
+@bp.get("/notifications/stream")
+def stream_notifications():
+    """
+    Server-Sent Events con las notificaciones nuevas del usuario (reemplaza
+    el polling de GET /notifications). Para reanudar: header Last-Event-ID
+    (o ?last_event_id=); primero llega lo posterior a ese id y después en vivo.
+    Los ids no llegan en orden estricto y el replay puede repetir alguno: el
+    cliente deduplica por id.
+    """
+    user_id, err = get_user_id_from_bearer(request)
+    if err:
+        return err
+    raw = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_id = int(raw) if raw else None
+    except ValueError:
+        return error("Invalid Last-Event-ID", 400)
+
+    # Suscribir ANTES de leer: lo que se commitee en el medio queda en la cola
+    sub = realtime.get_hub().subscribe(user_id)
+    try:
+        if last_id is None:
+            # sin replay; last_id solo ancla el catch-up si se corta el LISTEN
+            with get_cur() as cur:
+                sub.last_id = realtime.last_seen_id(cur, user_id)
+            replay = []
+        else:
+            sub.last_id = last_id
+            replay = realtime.fetch_since(user_id, last_id)
+    except Exception:
+        realtime.get_hub().unsubscribe(sub)
+        raise
+
+    # El stream dura minutos: la conexión del request vuelve al pool ya
+    release_request_connection()
+    resp = Response(
+        realtime.stream(sub, replay, NOTIFY_STREAM_HEARTBEAT, NOTIFY_STREAM_MAX_SECONDS),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    resp.call_on_close(lambda: realtime.get_hub().unsubscribe(sub))  # aunque nunca arranque
+    return resp
+
+
+# -----------------------------
+# Dispositivos (push)
+# -----------------------------
+@bp.post("/notifications/devices")
+def register_device():
+    """Registra (o reasigna al usuario actual) un token de push."""
+    user_id, err = get_user_id_from_bearer(request)
+    if err:
+        return err
+    p = request.get_json(silent=True) or {}
+    token = (p.get("token") or "").strip()
+    provider = (p.get("provider") or "fcm").strip().lower()
+    if not token:
+        return error("token is required", 400)
+    with get_cur(True) as cur:
+        cur.execute("""
+            INSERT INTO device_tokens (user_id, provider, token, platform)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (provider, token) DO UPDATE
+               SET user_id = EXCLUDED.user_id,
+                   platform = COALESCE(EXCLUDED.platform, device_tokens.platform),
+                   last_seen_at = NOW()
+            RETURNING id, provider, platform, created_at, last_seen_at
+        """, (user_id, provider, token, p.get("platform")))
+        row = cur.fetchone()
+    return created(row)
+
+@bp.delete("/notifications/devices")
+def unregister_device():
+    user_id, err = get_user_id_from_bearer(request)
+    if err:
+        return err
+    p = request.get_json(silent=True) or {}
+    token = (p.get("token") or "").strip()
+    if not token:
+        return error("token is required", 400)
+    with get_cur(True) as cur:
+        cur.execute("DELETE FROM device_tokens WHERE user_id = %s AND token = %s", (user_id, token))
+        removed = cur.rowcount
+    return ok({"removed": removed})
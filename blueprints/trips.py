@@ -3,9 +3,16 @@ from flask import Blueprint, request, g
 from utils.auth import require_auth
 from db import get_conn
 from utils.http import ok, created, error
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import json
-from utils.notify import notify_user  # 👈 usa tu helper existente
+import time
+from datetime import date, datetime
+from utils.notify import notify_user, notify_users, notify_many  # 👈 usa tu helper existente
+from utils.pagination import Keyset, InvalidCursor, decode_cursor, encode_cursor
+from utils import ratings
+from utils import seen as seen_trips
+from utils import ranking
+from config import FEED_SEEN_SCAN_MAX, SWIPE_BATCH_MAX
 
 trips_bp = Blueprint("trips", __name__)
 
@@ -133,6 +140,40 @@ def create_trip():
 # -----------------------------
 # Feed (con filtros)
 # -----------------------------
+_FEED_KEYSET = Keyset([
+    ("t.created_at", "DESC", "created_at", "timestamp"),
+    ("t.id", "DESC", "id", "int"),
+])
+
+# Swipeados afuera en SQL (anti-join por la UNIQUE (trip_id, user_id)), para
+# sort=recommended que rankea todos los candidatos de una
+_UNSEEN_SQL = "NOT EXISTS (SELECT 1 FROM trip_swipes s WHERE s.trip_id = t.id AND s.user_id = %s)"
+
+
+def _scan_unseen(fetch, keyset, seen, want, scan_max):
+    """
+    Recorre el feed por keyset en tandas crecientes salteando los trips de
+    `seen` hasta juntar `want` filas o recorrer `scan_max`. Devuelve
+    (rows, last): `last` es la última fila recorrida si cortó por el tope
+    (quedan más), None si se llegó a `want` o al final del feed.
+    """
+    rows, last, scanned, batch = [], None, 0, want
+    while True:
+        extra_wh, extra_vals = [], []
+        if last is not None:
+            cond, extra_vals = keyset.where_args({"created_at": last["created_at"].isoformat(), "id": last["id"]})
+            extra_wh = [cond]
+        got = fetch(extra_wh, extra_vals, "LIMIT %s", (batch,))
+        scanned += len(got)
+        rows.extend(r for r in got if r["id"] not in seen)
+        if len(got) < batch or len(rows) >= want:
+            return rows, None
+        last = got[-1]
+        if scanned >= scan_max:
+            return rows, last
+        batch = min(batch * 2, scan_max - scanned)
+
+
 @trips_bp.get("")
 @require_auth
 def list_feed():
@@ -144,6 +185,11 @@ def list_feed():
     gender = q.get("gender")  # 'any'|'male_only'|'female_only'|'mixed'
     limit  = q.get("limit", type=int) or 30
     offset = q.get("offset", type=int) or 0
+    cursor = q.get("cursor")  # presente (aunque vacío) => keyset en vez de OFFSET
+    include_seen = q.get("include_seen") in ("1", "true", "yes")
+    recommended = q.get("sort") == "recommended"
+    if recommended and q.get("offset") is not None:
+        return error("sort=recommended uses cursor pagination, not offset", 400)
 
     wh = ["t.status = 'open'"]
     vals = []
@@ -164,24 +210,138 @@ def list_feed():
         wh.append("t.gender_requirement = %s")
         vals.append(gender)
 
-    where = " AND ".join(wh) if wh else "TRUE"
-
-    with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+    keyset = _FEED_KEYSET
+    if cursor and not recommended:
+        try:
+            cond, cond_vals = keyset.where_args(decode_cursor(cursor))
+        except InvalidCursor as e:
+            return error(str(e), 400)
+        wh.append(cond)
+        vals.extend(cond_vals)
+
+    def fetch(extra_wh, extra_vals, page_sql, page_vals):
+        where = " AND ".join([*wh, *extra_wh])
         cur.execute(f"""
             SELECT t.*,
-                   COALESCE(AVG(r.rating), 0)::float AS creator_rating,
-                   COUNT(DISTINCT r.id)        AS creator_reviews
+                   COALESCE(rs.rating, 0)::float AS creator_rating,
+                   COALESCE(rs.reviews, 0)       AS creator_reviews
               FROM trip_plans t
-         LEFT JOIN trip_reviews r
-                ON r.reviewee_id = t.creator_id
+        {ratings.lateral_sql("t.creator_id")}
              WHERE {where}
                AND t.current_people < t.max_people
-          GROUP BY t.id
-          ORDER BY t.created_at DESC
-             LIMIT %s OFFSET %s;
-        """, (*vals, limit, offset))
-        rows = cur.fetchall()
-        return ok(rows)
+          {keyset.order_sql()}
+             {page_sql};
+        """, (*vals, *extra_vals, *page_vals))
+        return cur.fetchall()
+
+    with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if recommended:
+            return _recommended(cur, fetch, q, limit, cursor, include_seen)
+        if cursor is None:
+            # Legacy por offset: sin sacar los swipeados. Si no, cada swipe
+            # achica el conjunto y el offset siguiente saltea trips no vistos.
+            return ok(fetch([], [], "LIMIT %s OFFSET %s", (limit, offset)))
+        if include_seen:
+            return ok(keyset.page(fetch([], [], "LIMIT %s", (limit + 1,)), limit))
+
+        # Sin los trips que el usuario ya swipeó (utils/seen.py)
+        seen = seen_trips.get(cur, g.user["id"])
+        rows, last = _scan_unseen(fetch, keyset, seen, limit + 1, FEED_SEEN_SCAN_MAX)
+        if last is not None and len(rows) <= limit:
+            # tope de escaneo: página corta, el cursor sigue desde lo último recorrido
+            return ok({"items": rows, "next_cursor": keyset.cursor_for(last)})
+        return ok(keyset.page(rows, limit))
+
+
+# Cursor de sort=recommended. Fija el conjunto rankeado en la primera página:
+# candidatos pedidos (n), ventana de (created_at, id) que cubrieron (hi/lo,
+# lo = null si se llegó al final del feed) y el instante del score (at, la
+# señal recency depende de él). La posición es (score, created_at, id) del
+# último devuelto: el orden del ranking es ese mismo, descendente.
+def _rank_cursor(token):
+    c = decode_cursor(token)
+    try:
+        n, score, tid = c["n"], c["score"], c["id"]
+        if not all(isinstance(v, int) and not isinstance(v, bool) for v in (n, tid)):
+            raise InvalidCursor("Invalid cursor")
+        if isinstance(score, bool) or not isinstance(score, (int, float)):
+            raise InvalidCursor("Invalid cursor")
+        bounds = {}
+        for key in ("hi", "lo"):
+            b = c[key]
+            if b is None and key == "lo":
+                bounds[key] = None
+                continue
+            if not (isinstance(b, list) and len(b) == 2 and isinstance(b[1], int)):
+                raise InvalidCursor("Invalid cursor")
+            bounds[key] = (datetime.fromisoformat(b[0]), b[1])
+        return {"n": n, "at": datetime.fromisoformat(c["at"]), **bounds,
+                "after": (float(score), datetime.fromisoformat(c["created_at"]), tid)}
+    except (KeyError, TypeError, ValueError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def _recommended(cur, fetch, q, limit, cursor, include_seen):
+    """
+    ?sort=recommended: los candidatos más nuevos (cuántos, según el presupuesto
+    de latencia) puntuados en utils/ranking.py. Paginación por cursor
+    ({"items", "next_cursor"}, mismos filtros): las páginas siguientes
+    rankean la misma ventana de candidatos con el mismo reloj, menos lo que se
+    swipeó en el medio, y siguen después del último (score, created_at, id).
+    """
+    try:
+        target_date = date.fromisoformat(q["start_date"]) if q.get("start_date") else None
+    except ValueError:
+        return error("Invalid start_date (YYYY-MM-DD)", 400)
+    lat, lng = q.get("lat", type=float), q.get("lng", type=float)
+    budget = q.get("budget", type=int)
+    if budget is None:
+        bounds = [b for b in (q.get("min_budget", type=int), q.get("max_budget", type=int)) if b is not None]
+        budget = sum(bounds) / len(bounds) if bounds else None
+    try:
+        pos = _rank_cursor(cursor) if cursor else None
+    except InvalidCursor as e:
+        return error(str(e), 400)
+
+    extra_wh, extra_vals = [], []
+    if not include_seen:
+        extra_wh.append(_UNSEEN_SQL)
+        extra_vals.append(g.user["id"])
+    if pos is None:
+        n, now = ranking.budget.candidates, datetime.now()
+    else:
+        n, now = min(max(pos["n"], 1), ranking.budget.max_candidates), pos["at"]
+        extra_wh.append("(t.created_at, t.id) <= (%s, %s)")
+        extra_vals.extend(pos["hi"])
+        if pos["lo"] is not None:
+            extra_wh.append("(t.created_at, t.id) >= (%s, %s)")
+            extra_vals.extend(pos["lo"])
+
+    t0 = time.perf_counter()
+    rows = fetch(extra_wh, extra_vals, "LIMIT %s", (n,))
+    ctx = ranking.load_context(cur, g.user["id"], budget=budget, target_date=target_date, lat=lat, lng=lng)
+    ranked, scores = ranking.rank(rows, ctx, now=now)
+    ranking.budget.record((time.perf_counter() - t0) * 1000)
+
+    if pos is None:
+        if not rows:
+            return ok({"items": [], "next_cursor": None})
+        hi = (rows[0]["created_at"], rows[0]["id"])
+        lo = (rows[-1]["created_at"], rows[-1]["id"]) if len(rows) == n else None
+        start = 0
+    else:
+        hi, lo = pos["hi"], pos["lo"]
+        start = next((k for k, (row, sc) in enumerate(zip(ranked, scores))
+                      if (sc, row["created_at"], row["id"]) < pos["after"]), len(ranked))
+    page = ranked[start:start + limit]
+    for row, score in zip(page, scores[start:start + limit]):
+        row["rank_score"] = score
+    next_cursor = None
+    if start + limit < len(ranked):
+        last = page[-1]
+        next_cursor = encode_cursor({"n": n, "at": now, "hi": hi, "lo": lo, "score": last["rank_score"],
+                                     "created_at": last["created_at"], "id": last["id"]})
+    return ok({"items": page, "next_cursor": next_cursor})
 
 # -----------------------------
 # Swipe
@@ -212,6 +372,7 @@ def swipe_trip(trip_id):
             RETURNING *;
         """, (trip_id, user['id'], direction))
         swipe = cur.fetchone()
+        seen_trips.mark(user['id'], trip_id)
 
         match_made = False
         if direction == 1:
@@ -241,6 +402,112 @@ def swipe_trip(trip_id):
         return ok({"swipe": swipe, "pending_match": match_made})
 
 
+# -----------------------------
+# Swipes en lote
+# -----------------------------
+@trips_bp.post("/swipes")
+@require_auth
+def swipe_trips():
+    """
+    Varios swipes en una transacción (ráfagas o la cola offline del cliente).
+    Body: {"swipes": [{"trip_id": 1, "direction": 1}, ...]}
+    - En orden: si un trip se repite, vale el último y los anteriores vuelven
+      con "superseded".
+    - Round trips: trips válidos, upsert de swipes, solicitudes nuevas y un
+      INSERT con los avisos (uno por creador, aunque sean varios de sus trips).
+    - Respuesta por ítem, en el orden del pedido.
+    """
+    user = g.user
+    p = request.get_json(silent=True) or {}
+    items = p.get("swipes")
+    if not isinstance(items, list) or not items:
+        return error("swipes must be a non-empty list", 400)
+    if len(items) > SWIPE_BATCH_MAX:
+        return error(f"At most {SWIPE_BATCH_MAX} swipes per call", 400)
+
+    results = [None] * len(items)
+    wanted = {}   # trip_id -> (índice, direction)
+    for i, it in enumerate(items):
+        it = it if isinstance(it, dict) else {}
+        try:
+            trip_id = int(it.get("trip_id"))
+        except (TypeError, ValueError):
+            results[i] = {"trip_id": it.get("trip_id"), "ok": False, "error": "invalid trip_id"}
+            continue
+        direction = it.get("direction")
+        if direction not in (1, -1):
+            results[i] = {"trip_id": trip_id, "ok": False, "error": "direction must be 1 or -1"}
+            continue
+        if trip_id in wanted:
+            prev = wanted[trip_id][0]
+            results[prev] = {"trip_id": trip_id, "ok": True, "superseded": True}
+        wanted[trip_id] = (i, direction)
+
+    if not wanted:
+        return ok({"results": results, "applied": 0})
+
+    with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT id, creator_id, title, status
+            FROM trip_plans
+            WHERE id = ANY(%s)
+        """, (list(wanted),))
+        trips = {r["id"]: r for r in cur.fetchall()}
+        valid = []
+        for trip_id, (i, direction) in wanted.items():
+            if trips.get(trip_id, {}).get("status") != "open":
+                results[i] = {"trip_id": trip_id, "ok": False, "error": "trip not found or not open"}
+            else:
+                valid.append((trip_id, direction))
+        valid.sort()   # mismo orden de locks que otro lote concurrente
+
+        matched = set()
+        if valid:
+            execute_values(cur, """
+                INSERT INTO trip_swipes (trip_id, user_id, direction)
+                VALUES %s
+                ON CONFLICT (trip_id, user_id) DO UPDATE SET direction=EXCLUDED.direction
+            """, [(tid, user["id"], d) for tid, d in valid], page_size=len(valid))
+            likes = [tid for tid, d in valid if d == 1]
+            if likes:
+                matched = {r["trip_id"] for r in execute_values(cur, """
+                    INSERT INTO trip_participants (trip_id, user_id, role, approved)
+                    VALUES %s
+                    ON CONFLICT (trip_id, user_id) DO NOTHING
+                    RETURNING trip_id
+                """, [(tid, user["id"], "participant", False) for tid in likes],
+                    page_size=len(likes), fetch=True)}
+            for tid, _ in valid:
+                seen_trips.mark(user["id"], tid)
+
+        for trip_id, direction in valid:
+            results[wanted[trip_id][0]] = {"trip_id": trip_id, "ok": True, "direction": direction,
+                                           "pending_match": trip_id in matched}
+
+        # 🔔 Un aviso por creador con todas las solicitudes nuevas del lote
+        by_creator = {}
+        for trip_id in sorted(matched, key=lambda t: wanted[t][0]):
+            by_creator.setdefault(trips[trip_id]["creator_id"], []).append(trips[trip_id])
+        notify_many([_join_request_notification(user, creator_id, ts) for creator_id, ts in by_creator.items()])
+
+        return ok({"results": results, "applied": len(valid)})
+
+
+def _join_request_notification(user, creator_id, trips):
+    applicant_name = user.get('full_name') or user.get('name') or 'Nuevo rider'
+    data = {"applicant_id": user['id'], "applicant_name": applicant_name}
+    if len(trips) == 1:
+        # igual que el swipe suelto
+        return {"user_id": creator_id, "ntype": "trip_join_request",
+                "title": f'Solicitud para "{trips[0]["title"]}"',
+                "body": f'{applicant_name} quiere unirse a tu viaje.',
+                "data": {"trip_id": trips[0]["id"], **data}}
+    return {"user_id": creator_id, "ntype": "trip_join_request",
+            "title": f'{len(trips)} solicitudes nuevas',
+            "body": f'{applicant_name} quiere unirse a {len(trips)} de tus viajes.',
+            "data": {"trip_ids": [t["id"] for t in trips], **data}}
+
+
 # -----------------------------
 # Approve participant (solo creador)
 # -----------------------------
@@ -285,6 +552,19 @@ def approve_participant(trip_id, user_id):
             maybe_conf = cur.fetchone()
             if maybe_conf:
                 updated_trip = maybe_conf
+                # 🔔 Viaje confirmado: un solo INSERT para todos los aprobados
+                cur.execute("""
+                    SELECT user_id FROM trip_participants
+                    WHERE trip_id=%s AND approved=TRUE AND user_id <> %s
+                """, (trip_id, user['id']))
+                notify_users(
+                    [r['user_id'] for r in cur.fetchall()],
+                    ntype='trip_confirmed',
+                    title='¡Viaje confirmado!',
+                    body=f'"{trip["title"]}" ya tiene grupo: el viaje está confirmado.',
+                    data={"trip_id": trip_id},
+                    dedupe_key=f"trip:{trip_id}",
+                )
 
         # 🔔 Notifica al solicitante
         notify_user(
@@ -323,6 +603,7 @@ def reject_participant(trip_id, user_id):
             VALUES (%s,%s,-1)
             ON CONFLICT (trip_id, user_id) DO UPDATE SET direction=-1;
         """, (trip_id, user_id))
+        seen_trips.mark(user_id, trip_id)
 
         # 🔔 Notifica al solicitante
         notify_user(
@@ -370,10 +651,15 @@ def review_trip(trip_id):
         if not cur.fetchone():
             return error("only approved participants can review", 403)
 
-        cur.execute("""
-            INSERT INTO trip_reviews (trip_id, reviewer_id, reviewee_id, rating, comment)
-            VALUES (%s, %s, %s, %s, %s)
-        RETURNING *;
+        # el rating del creador (user_rating_stats) se actualiza en la misma sentencia
+        bump = f", s AS ({ratings.BUMP_SQL})" if ratings.enabled() else ""
+        cur.execute(f"""
+            WITH r AS (
+                INSERT INTO trip_reviews (trip_id, reviewer_id, reviewee_id, rating, comment)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING *
+            ){bump}
+            SELECT * FROM r;
         """, (trip_id, user["id"], trip["creator_id"], rating, comment))
         return created(cur.fetchone())
 
@@ -390,16 +676,15 @@ def list_requests(trip_id):
         if t['creator_id'] != user['id']:
             return error("only creator can see requests", 403)
 
-        cur.execute("""
+        cur.execute(f"""
             SELECT p.user_id, u.full_name, u.email, u.bio, u.avatar_url,
                    u.gender, u.city, u.country,
-                   COALESCE(avg(r.rating),0)::float AS rating,
-                   COUNT(DISTINCT r.id) AS reviews
+                   COALESCE(rs.rating, 0)::float AS rating,
+                   COALESCE(rs.reviews, 0) AS reviews
             FROM trip_participants p
             JOIN users u ON u.id = p.user_id
-            LEFT JOIN trip_reviews r ON r.reviewee_id = u.id
+            {ratings.lateral_sql("p.user_id")}
             WHERE p.trip_id=%s AND p.role='participant' AND p.approved=FALSE
-            GROUP BY p.user_id, u.full_name, u.email, u.bio, u.avatar_url, u.gender, u.city, u.country
             ORDER BY rating DESC, reviews DESC;
         """, (trip_id,))
         rows = cur.fetchall()
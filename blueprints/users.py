@@ -1,7 +1,8 @@
 from flask import Blueprint, request
 from utils.http import ok, created, error
 from utils.validators import CreateUser, UpdateUser, AssignRole, UserSport
-from db import get_cur
+from db import get_cur, after_commit
+from utils.auth import invalidate_user
 
 bp = Blueprint("users", __name__)
 
@@ -50,12 +51,14 @@ def update_user(user_id):
     values.append(user_id)
     with get_cur(True) as cur:
         cur.execute(f"UPDATE users SET {', '.join(fields)} WHERE id=%s", tuple(values))
+    after_commit(lambda: invalidate_user(user_id))
     return ok({"updated": True})
 
 @bp.delete("/<int:user_id>")
 def delete_user(user_id):
     with get_cur(True) as cur:
         cur.execute("DELETE FROM users WHERE id=%s", (user_id,))
+    after_commit(lambda: invalidate_user(user_id))  # auth_tokens se borran en cascada
     return ok({"deleted": True})
 
 @bp.post("/assign-role")
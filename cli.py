@@ -0,0 +1,50 @@
+# cli.py
+"""Comandos de mantenimiento: `flask <comando>` (con FLASK_APP=app.py)."""
+import click
+from db import get_cur
+from utils import availability, outbox, partitions, push, ratings
+from config import NOTIFY_WORKER_BATCH, NOTIFY_PARTITIONS_AHEAD
+
+
+def init_app(app):
+    @app.cli.command("availability-roll")
+    def availability_roll():
+        """Corre la ventana de 365 días de equipment_day_bitmaps (cron diario)."""
+        with get_cur(True) as cur:
+            n = availability.roll(cur)
+        click.echo(f"rolled {n} equipment bitmaps")
+
+    @app.cli.command("rating-stats-rebuild")
+    @click.option("--user-id", "user_ids", multiple=True, type=int, help="Solo estos usuarios (repetible).")
+    def rating_stats_rebuild(user_ids):
+        """Recalcula user_rating_stats desde trip_reviews (reparación)."""
+        with get_cur(True) as cur:
+            stats = ratings.rebuild(cur, list(user_ids) or None)
+        click.echo(f"fixed={stats['fixed']} removed={stats['removed']}")
+
+    @app.cli.command("notify-worker")
+    @click.option("--once", is_flag=True, help="Procesa lo vencido y sale (cron).")
+    @click.option("--batch", default=NOTIFY_WORKER_BATCH, show_default=True, help="Jobs por vuelta.")
+    def notify_worker(once, batch):
+        """Despacha el outbox de notificaciones (push) con reintentos."""
+        if once:
+            stats = outbox.drain(batch)
+            click.echo(" ".join(f"{k}={v}" for k, v in stats.items()))
+            click.echo(f"push: {push.stats()}")
+        else:
+            outbox.run(batch)
+
+    @app.cli.command("notifications-partitions")
+    @click.option("--ahead", default=NOTIFY_PARTITIONS_AHEAD, show_default=True, help="Meses a crear por adelantado.")
+    @click.option("--no-compact", is_flag=True, help="Solo crea particiones, sin aplicar la retención.")
+    def notifications_partitions(ahead, no_compact):
+        """Crea las particiones mensuales de notifications, parte la legacy y aplica la retención (cron diario)."""
+        with get_cur(True) as cur:
+            n = partitions.ensure(cur, ahead)
+        click.echo(f"created {n} notification partitions")
+        split = partitions.split_legacy()
+        if split is not None:
+            click.echo("legacy split: " + " ".join(f"{k}={v}" for k, v in split.items()))
+        if not no_compact:
+            stats = partitions.compact()
+            click.echo(" ".join(f"{k}={v}" for k, v in stats.items()))
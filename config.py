@@ -11,4 +11,99 @@ DB_CONFIG = {
     "password": os.getenv("DB_PASSWORD", "postgres"),
 }
 
-APP_PORT = int(os.getenv("APP_PORT", "5000"))
\ No newline at end of file
+# Pool de conexiones (ver db.py)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))            # seg. esperando una conexión libre
+DB_POOL_CHECK_IDLE = float(os.getenv("DB_POOL_CHECK_IDLE", "30"))     # seg. ociosa antes de hacer SELECT 1
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))        # seg. ociosa antes de cerrarla (por encima de MIN)
+
+# Cache token -> usuario (utils/auth.py); otros procesos lo invalidan por NOTIFY (0023)
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "10000"))
+
+# Búsqueda geo (utils/geo.py). El grid en memoria sirve ?sort=nearest sin radius_km;
+# apagado, ese orden se resuelve en SQL (exacto pero recorre todos los candidatos).
+GEO_GRID_INDEX = os.getenv("GEO_GRID_INDEX", "0") in ("1", "true", "yes")
+GEO_GRID_CELL_DEG = float(os.getenv("GEO_GRID_CELL_DEG", "0.5"))
+GEO_GRID_TTL = float(os.getenv("GEO_GRID_TTL", "300"))              # seg. hasta recargar desde la base
+GEO_NEAREST_OVERSAMPLE = int(os.getenv("GEO_NEAREST_OVERSAMPLE", "4"))
+
+# Búsqueda de texto: con geo, la relevancia se divide por (1 + distancia / DECAY)
+SEARCH_DISTANCE_DECAY_KM = float(os.getenv("SEARCH_DISTANCE_DECAY_KM", "25"))
+
+# Calendarios de equipos: máximo de ids por llamada a /calendars y cache en memoria
+CALENDAR_BATCH_MAX = int(os.getenv("CALENDAR_BATCH_MAX", "100"))
+CALENDAR_CACHE_MAX = int(os.getenv("CALENDAR_CACHE_MAX", "5000"))      # entradas (equipo, ventana)
+CALENDAR_CACHE_TTL = float(os.getenv("CALENDAR_CACHE_TTL", "900"))     # seg.; se invalida por NOTIFY (0024) o, sin LISTEN, contra la versión (0020)
+
+# Decisiones en lote de bookings (POST /api/bookings/decisions): máximo por llamada
+BOOKING_DECISIONS_MAX = int(os.getenv("BOOKING_DECISIONS_MAX", "200"))
+
+# Inbox del owner (GET /api/bookings/owner/requests): tope de la lista sin paginar (?legacy=1)
+OWNER_INBOX_LEGACY_MAX = int(os.getenv("OWNER_INBOX_LEGACY_MAX", "1000"))
+
+# Outbox de notificaciones (`flask notify-worker`): jobs por vuelta, espera sin
+# trabajo, lease de un job tomado y reintentos con backoff exponencial
+NOTIFY_WORKER_BATCH = int(os.getenv("NOTIFY_WORKER_BATCH", "50"))
+NOTIFY_WORKER_POLL = float(os.getenv("NOTIFY_WORKER_POLL", "1"))       # seg.
+NOTIFY_JOB_LEASE = int(os.getenv("NOTIFY_JOB_LEASE", "60"))            # seg.; si el worker muere, el job vuelve
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+NOTIFY_BACKOFF_BASE = float(os.getenv("NOTIFY_BACKOFF_BASE", "5"))     # seg.; se duplica en cada intento
+NOTIFY_BACKOFF_MAX = float(os.getenv("NOTIFY_BACKOFF_MAX", "3600"))
+
+# notify_users/notify_many: mismo (usuario, tipo, dedupe_key) dentro de esta ventana no se repite
+NOTIFY_DEDUPE_WINDOW = int(os.getenv("NOTIFY_DEDUPE_WINDOW", "3600"))  # seg.
+
+# Push (utils/push.py): providers activos separados por coma ("" = sin push,
+# "fake" = en memoria, "fcm"), threads de envío y timeout HTTP por request
+PUSH_PROVIDERS = os.getenv("PUSH_PROVIDERS", "")
+PUSH_WORKERS = int(os.getenv("PUSH_WORKERS", "4"))
+PUSH_TIMEOUT = float(os.getenv("PUSH_TIMEOUT", "10"))                  # seg.
+FCM_PROJECT_ID = os.getenv("FCM_PROJECT_ID", "")
+FCM_CREDENTIALS_FILE = os.getenv("FCM_CREDENTIALS_FILE", "")           # JSON de service account
+
+# Stream de notificaciones (SSE, utils/realtime.py): heartbeat, duración máxima de
+# una conexión (el cliente reconecta con Last-Event-ID), replay y cola por cliente.
+# Los ids no salen en orden de commit: el replay repite los últimos
+# NOTIFY_STREAM_REPLAY_OVERLAP seg. antes del último entregado y cada stream
+# descarta repetidos con sus últimos NOTIFY_STREAM_RECENT_IDS ids (el cliente deduplica por id)
+NOTIFY_STREAM_HEARTBEAT = float(os.getenv("NOTIFY_STREAM_HEARTBEAT", "15"))      # seg.
+NOTIFY_STREAM_MAX_SECONDS = float(os.getenv("NOTIFY_STREAM_MAX_SECONDS", "300"))
+NOTIFY_STREAM_REPLAY_MAX = int(os.getenv("NOTIFY_STREAM_REPLAY_MAX", "100"))
+NOTIFY_STREAM_QUEUE_MAX = int(os.getenv("NOTIFY_STREAM_QUEUE_MAX", "100"))
+NOTIFY_STREAM_REPLAY_OVERLAP = float(os.getenv("NOTIFY_STREAM_REPLAY_OVERLAP", "60"))  # seg.
+NOTIFY_STREAM_RECENT_IDS = int(os.getenv("NOTIFY_STREAM_RECENT_IDS", "500"))
+
+# Particiones mensuales de notifications (`flask notifications-partitions`, cron diario):
+# meses creados por adelantado y retención de leídas / no leídas; "archive" las
+# copia a notifications_archive antes de borrarlas, "drop" solo las borra
+NOTIFY_PARTITIONS_AHEAD = int(os.getenv("NOTIFY_PARTITIONS_AHEAD", "3"))
+NOTIFY_RETENTION_DAYS = int(os.getenv("NOTIFY_RETENTION_DAYS", "180"))
+NOTIFY_RETENTION_UNREAD_DAYS = int(os.getenv("NOTIFY_RETENTION_UNREAD_DAYS", "365"))
+NOTIFY_RETENTION_MODE = os.getenv("NOTIFY_RETENTION_MODE", "archive")
+NOTIFY_RETENTION_BATCH = int(os.getenv("NOTIFY_RETENTION_BATCH", "5000"))   # filas por DELETE / copia de la legacy
+# GET /notifications busca primero en los últimos N días (solo esas particiones)
+# y agranda la ventana si no llenó la página
+NOTIFY_LIST_LOOKBACK_DAYS = [int(d) for d in os.getenv("NOTIFY_LIST_LOOKBACK_DAYS", "31,186").split(",") if d.strip()]
+
+# Feed de trips: trips ya swipeados por usuario, cacheados por proceso (utils/seen.py),
+# y tope de filas recorridas por página (con cursor) al saltearlos
+FEED_SEEN_CACHE_MAX = int(os.getenv("FEED_SEEN_CACHE_MAX", "20000"))   # usuarios
+FEED_SEEN_CACHE_TTL = float(os.getenv("FEED_SEEN_CACHE_TTL", "900"))   # seg. hasta releer de trip_swipes
+FEED_SEEN_SCAN_MAX = int(os.getenv("FEED_SEEN_SCAN_MAX", "1000"))
+FEED_SEEN_REREAD_IDS = int(os.getenv("FEED_SEEN_REREAD_IDS", "10000"))  # ids de trip_swipes releídos antes del watermark
+
+# Swipes en lote (POST /api/trips/swipes, cola offline del cliente): máximo por llamada
+SWIPE_BATCH_MAX = int(os.getenv("SWIPE_BATCH_MAX", "200"))
+
+# Ranking del feed (?sort=recommended, utils/ranking.py): peso de cada señal,
+# candidatos máximos por request y presupuesto de latencia de la etapa; la
+# distancia y la fecha puntúan 0.5 a DISTANCE_KM / DATE_DAYS del objetivo
+TRIP_RANK_WEIGHTS = os.getenv("TRIP_RANK_WEIGHTS", "sport=3,budget=1,date=1,distance=1.5,rating=1,seats=0.5,recency=0.5")
+TRIP_RANK_CANDIDATES = int(os.getenv("TRIP_RANK_CANDIDATES", "2000"))
+TRIP_RANK_BUDGET_MS = float(os.getenv("TRIP_RANK_BUDGET_MS", "50"))
+TRIP_RANK_DISTANCE_KM = float(os.getenv("TRIP_RANK_DISTANCE_KM", "100"))
+TRIP_RANK_DATE_DAYS = float(os.getenv("TRIP_RANK_DATE_DAYS", "14"))
+
+APP_PORT = int(os.getenv("APP_PORT", "5000"))
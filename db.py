@@ -1,43 +1,409 @@
 # carving_flask_api_full/db.py
+import logging
+import os
+import threading
+import time
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 from contextlib import contextmanager
-from config import DB_CONFIG
+from flask import current_app, g, has_request_context
+from config import (
+    DB_CONFIG, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT,
+    DB_POOL_CHECK_IDLE, DB_POOL_MAX_IDLE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    """No se liberó ninguna conexión dentro del timeout de checkout."""
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones thread-safe.
+      - min/max: conexiones que se mantienen abiertas / tope absoluto
+      - timeout: cuánto espera getconn() a que se libere una conexión
+      - health check al sacar una conexión que estuvo ociosa > check_idle seg.
+      - al devolverla: ROLLBACK + DISCARD ALL (queda limpia para el próximo)
+      - fork-safe: si cambia el PID (gunicorn/uwsgi pre-fork) el hijo arranca
+        con un pool vacío y NO toca los sockets heredados del padre.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, check_idle, max_idle, **conn_kwargs):
+        if maxconn < 1 or minconn > maxconn:
+            raise ValueError("invalid pool size: min=%s max=%s" % (minconn, maxconn))
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.max_idle = max_idle
+        self._conn_kwargs = conn_kwargs
+        self._reset_state()
+
+    def _reset_state(self):
+        self._cond = threading.Condition()
+        self._idle = []        # [(conn, devuelta_en)] -> LIFO, la más reciente arriba
+        self._size = 0         # abiertas = ociosas + prestadas
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+        # Estamos en un hijo. Cerrar las conexiones heredadas mandaría un
+        # Terminate por el socket compartido y mataría la sesión del padre:
+        # primero apuntamos nuestra copia del fd a /dev/null y recién ahí cerramos.
+        inherited = [c for c, _ in self._idle]
+        self._reset_state()
+        for conn in inherited:
+            self._detach(conn)
+
+    @staticmethod
+    def _detach(conn):
+        try:
+            devnull = os.open(os.devnull, os.O_RDWR)
+            try:
+                os.dup2(devnull, conn.fileno())
+            finally:
+                os.close(devnull)
+            conn.close()
+        except (OSError, psycopg2.Error):
+            pass
+
+    def _connect(self):
+        return psycopg2.connect(**self._conn_kwargs)
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                self._check_fork()
+                while True:
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        conn, idle_since = None, None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            "no free connection after %.1fs (max=%d)" % (self.timeout, self.maxconn)
+                        )
+                    self._cond.wait(remaining)
+
+            # Conectar / chequear fuera del lock
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                self._prefill()
+                return conn
+
+            if self._is_healthy(conn, idle_since):
+                return conn
+            self._close(conn)
+            self._release_slot()
+
+    def _prefill(self):
+        """Abre conexiones hasta llegar a minconn (solo la primera vez, lazy)."""
+        while True:
+            with self._cond:
+                if self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                self._release_slot()
+                return
+            with self._cond:
+                self._idle.insert(0, (conn, time.monotonic()))
+                self._cond.notify()
+
+    def _reset(self, conn):
+        """ROLLBACK + DISCARD ALL. Devuelve False si la conexión quedó inservible."""
+        try:
+            conn.rollback()
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("DISCARD ALL")
+            conn.autocommit = False
+            return True
+        except psycopg2.Error:
+            return False
+
+    def putconn(self, conn, discard=False):
+        if self._pid != os.getpid():
+            # Conexión de otro proceso: no es nuestra, no la reciclamos.
+            return
+        if discard or conn.closed or not self._reset(conn):
+            self._close(conn)
+            self._release_slot()
+            return
+
+        now = time.monotonic()
+        stale = []
+        with self._cond:
+            # Cerramos las que llevan demasiado ociosas (respetando minconn)
+            while (self._idle and self._size - len(stale) > self.minconn
+                   and now - self._idle[0][1] > self.max_idle):
+                stale.append(self._idle.pop(0)[0])
+            self._size -= len(stale)
+            self._idle.append((conn, now))
+            self._cond.notify()
+        for c in stale:
+            self._close(c)
+
+    def closeall(self):
+        with self._cond:
+            self._check_fork()
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle),
+                    "in_use": self._size - len(self._idle), "max": self.maxconn}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Pool del proceso (se crea lazy: importar db.py no abre conexiones)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT,
+                    DB_POOL_CHECK_IDLE, DB_POOL_MAX_IDLE, **DB_CONFIG
+                )
+    return _pool
+
+def close_pool():
+    if _pool is not None:
+        _pool.closeall()
+
+class UnitOfWork:
+    """
+    Una conexión + una transacción por request (vive en flask.g).
+      - La conexión se pide al pool recién en el primer get_conn()/get_cur().
+      - Todos los get_conn()/get_cur() del request (auth, handler, notify_user)
+        reusan esa conexión; los anidados se vuelven SAVEPOINTs.
+      - COMMIT/ROLLBACK una sola vez al final del request (ver init_app).
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+        self._depth = 0
+        self._broken = False
+        self._after_commit = []
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = self._pool.getconn()
+        return self._conn
+
+    @contextmanager
+    def scope(self):
+        conn = self._connection()
+        if self._depth == 0:
+            # Nivel superior: sin savepoint; si falla se descarta la transacción entera
+            self._depth = 1
+            try:
+                yield conn
+            except Exception:
+                self._rollback(conn)
+                raise
+            finally:
+                self._depth = 0
+            return
+
+        name = "uow_sp_%d" % self._depth
+        with conn.cursor() as cur:
+            cur.execute("SAVEPOINT " + name)
+        self._depth += 1
+        n_callbacks = len(self._after_commit)
+        try:
+            yield conn
+        except Exception:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("ROLLBACK TO SAVEPOINT " + name)
+                del self._after_commit[n_callbacks:]   # lo deshecho no invalida nada
+            except psycopg2.Error:
+                self._rollback(conn)
+            raise
+        else:
+            with conn.cursor() as cur:
+                cur.execute("RELEASE SAVEPOINT " + name)
+        finally:
+            self._depth -= 1
+
+    def _rollback(self, conn):
+        self._after_commit = []
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            self._broken = True
+
+    def finish(self, commit):
+        """Cierra la transacción y devuelve la conexión al pool (idempotente)."""
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        broken = self._broken
+        callbacks, self._after_commit = self._after_commit, []
+        try:
+            if commit and not broken:
+                conn.commit()
+            else:
+                conn.rollback()
+                callbacks = []
+        except psycopg2.Error:
+            broken = True
+            if commit:
+                raise
+        finally:
+            self._pool.putconn(conn, discard=broken)
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception:
+                logger.exception("after_commit callback failed")
+
+
+def after_commit(fn):
+    """
+    Ejecuta fn() cuando se commitee la transacción del request (se descarta si
+    hay ROLLBACK). Fuera de un request se ejecuta en el momento: get_conn ya
+    commiteó al salir del with. Pensado para invalidar caches en memoria.
+    """
+    uow = _request_unit()
+    if uow is None or uow._conn is None:
+        fn()
+    else:
+        uow._after_commit.append(fn)
+
+def release_request_connection():
+    """
+    Commitea y devuelve YA la conexión del request al pool. Para respuestas
+    largas (SSE): el generador no debe tocar la base con el contexto del request.
+    """
+    uow = _request_unit()
+    if uow is not None:
+        uow.finish(commit=True)
+
+def _request_unit():
+    """UnitOfWork del request actual, o None fuera de un request de la app."""
+    if not has_request_context() or not current_app.extensions.get("db_unit_of_work"):
+        return None
+    uow = g.get("_db_uow")
+    if uow is None:
+        uow = g._db_uow = UnitOfWork(get_pool())
+    return uow
+
+def _commit_request_unit(response):
+    uow = g.get("_db_uow")
+    if uow is not None:
+        uow.finish(commit=response.status_code < 500)
+    return response
+
+def _release_request_unit(exc):
+    uow = g.pop("_db_uow", None)
+    if uow is not None:
+        uow.finish(commit=False)  # no-op si after_request ya hizo commit
+
+def init_app(app):
+    """
+    Activa la transacción por request:
+      - after_request: COMMIT (o ROLLBACK si la respuesta es 5xx). Va acá y no
+        en teardown para que un fallo del COMMIT termine en 500 y no en un 200.
+      - teardown_request: ROLLBACK de lo que haya quedado abierto (excepciones)
+        y devuelve la conexión al pool.
+    """
+    app.extensions["db_unit_of_work"] = True
+    app.after_request(_commit_request_unit)
+    app.teardown_request(_release_request_unit)
 
 @contextmanager
 def get_conn():
     """
-    Abre una conexión y:
+    Dentro de un request: devuelve la conexión del request (ver UnitOfWork);
+    el COMMIT se hace una sola vez al terminar el request.
+
+    Fuera de un request (scripts, workers) saca una conexión del pool y:
       - COMMIT al salir si no hubo excepción
       - ROLLBACK si hubo excepción
     Importante: esto hace que los endpoints que usan get_conn()+cursor
     persistan sin tener que llamar conn.commit() a mano.
+    Al salir la conexión vuelve al pool (no se cierra).
     """
-    conn = psycopg2.connect(**DB_CONFIG)
+    uow = _request_unit()
+    if uow is not None:
+        with uow.scope() as conn:
+            yield conn
+        return
+
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
     try:
         yield conn
         conn.commit()
     except Exception:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
         raise
     finally:
-        conn.close()
+        pool.putconn(conn, discard=broken)
 
 @contextmanager
 def get_cur(commit=False):
     """
-    Mantengo compatibilidad con el resto del código:
-    - Si commit=True, se hace commit aquí (antes de que get_conn haga el suyo).
-      Hacer commit dos veces no rompe nada.
+    Mantengo compatibilidad con el resto del código: `commit` ya no hace
+    falta (get_conn commitea al salir, o al final del request), se acepta
+    para no tocar los call sites.
     """
     with get_conn() as conn:
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         try:
             yield cur
-            if commit:
-                conn.commit()
-        except Exception:
-            conn.rollback()
-            raise
         finally:
             cur.close()
@@ -0,0 +1,536 @@
+"""
+Benchmarks contra la base configurada (usar una copia con datos, no producción).
+
+    python sql/bench.py search [-q "tabla pyzel" ...] [--runs 20]
+    python sql/bench.py detail [--ids 30] [--runs 20] [--rtt-ms 1.5]
+    python sql/bench.py bookings [--workers 16] [--requests 400] [--days 20] [--keep]   # escribe en la base
+    python sql/bench.py notifications [--rows 1000000,10000000,30000000] [--users 20000] [--months 24]
+    python sql/bench.py ranking [--candidates 500,2000,5000] [--runs 20]
+
+search: compara el camino viejo (ILIKE '%q%') contra full-text + trigramas
+(0003/0004) para cada término, y mide el tokenizer de utils/search.py.
+detail: las 6 queries secuenciales del detalle viejo contra la sentencia única
+(y el caso 304, que solo compara la versión). --rtt-ms simula la latencia de red
+por round trip (contra una base local es ~0 y no se ve la diferencia).
+bookings: chequeo MANUAL de concurrencia (no es un test automático): create +
+approve en paralelo contra la API sobre el mismo equipo y verificación de que
+no quedó ningún doble booking. Escribe en la base configurada (owner, renters,
+equipo, bookings): correrlo contra una base descartable, nunca producción. Al
+final borra lo que creó (--keep para dejarlo).
+notifications: arma una copia particionada por mes (bench_notifications, mismos
+índices que 0016) y la va llenando hasta cada tamaño de --rows; en cada escalón
+mide primera página, página profunda y no leídas con las ventanas de
+GET /notifications. La latencia no tiene que crecer con el total. Al final la
+borra (--keep para dejarla).
+ranking: puntúa trips abiertos reales (repetidos hasta cada --candidates) con
+utils/ranking.py contra un loop fila por fila en Python; verifica que den el
+mismo orden y mide ms por llamada contra TRIP_RANK_BUDGET_MS.
+"""
+from pathlib import Path
+import argparse
+import random
+import secrets
+import statistics
+import sys
+import threading
+import time
+import math
+from datetime import date, datetime, timedelta
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+# Añade el root del proyecto al sys.path
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(BASE_DIR))
+
+from config import DB_CONFIG, NOTIFY_LIST_LOOKBACK_DAYS, TRIP_RANK_BUDGET_MS  # ← ahora absoluto
+from utils.search import normalize, tokenize, prefix_tsquery, tsquery_sql
+from utils.geo import haversine_km
+
+DEFAULT_TERMS = ["tabla", "surf", "pyzel", "wetsuit 4/3", "tabla blanda", "quilla", "longboard 9'2"]
+
+ILIKE_SQL = """
+    SELECT e.id FROM equipment e
+    WHERE e.title ILIKE %(q)s OR e.description ILIKE %(q)s OR e.size ILIKE %(q)s
+    ORDER BY e.created_at DESC LIMIT 20
+"""
+
+FTS_SQL = f"""
+    SELECT e.id FROM equipment e
+    CROSS JOIN LATERAL (
+        SELECT ts_rank_cd(e.search_tsv, {tsquery_sql()}) + word_similarity(%(q_norm)s, e.search_text) AS relevance
+    ) rel
+    WHERE e.search_tsv @@ ({tsquery_sql()}) OR %(q_norm)s <%% e.search_text
+    ORDER BY rel.relevance DESC, e.created_at DESC LIMIT 20
+"""
+
+
+def _time(cur, sql, params, runs):
+    """(mediana ms, filas) de `runs` ejecuciones."""
+    samples, n = [], 0
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        cur.execute(sql, params)
+        n = len(cur.fetchall())
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), n
+
+
+def bench_search(terms, runs):
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM equipment")
+    print(f"equipment rows: {cur.fetchone()[0]}")
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'equipment' AND column_name = 'search_tsv'
+    """)
+    has_fts = cur.fetchone() is not None
+    if not has_fts:
+        print("(sin search_tsv: correr python sql/migrate.py; solo se mide ILIKE)")
+
+    print(f"\n{'term':<22}{'ilike ms':>10}{'rows':>6}{'fts ms':>10}{'rows':>6}")
+    for term in terms:
+        ilike_ms, ilike_n = _time(cur, ILIKE_SQL, {"q": f"%{term}%"}, runs)
+        line = f"{term:<22}{ilike_ms:>10.2f}{ilike_n:>6}"
+        tokens = tokenize(term)
+        if has_fts and tokens:
+            params = {"tsq": prefix_tsquery(tokens), "q_norm": " ".join(tokens)}
+            try:
+                fts_ms, fts_n = _time(cur, FTS_SQL, params, runs)
+                line += f"{fts_ms:>10.2f}{fts_n:>6}"
+            except psycopg2.Error as e:
+                conn.rollback()
+                line += f"  error: {(e.pgerror or str(e)).strip()}"
+        print(line)
+    cur.close()
+    conn.close()
+
+    # tokenizer: costo por query del lado de la app
+    sample = terms * 1000
+    t0 = time.perf_counter()
+    for term in sample:
+        prefix_tsquery(tokenize(term))
+    per_call = (time.perf_counter() - t0) / len(sample) * 1e6
+    print(f"\ntokenize+prefix_tsquery: {per_call:.1f} µs/query "
+          f"(ej. {terms[-1]!r} -> {normalize(terms[-1])!r})")
+
+
+# Detalle viejo: 6 round trips
+OLD_DETAIL_QUERIES = [
+    """SELECT e.*, img.image_url FROM equipment e
+       LEFT JOIN LATERAL (SELECT image_url FROM equipment_images WHERE equipment_id = e.id
+                          ORDER BY id ASC LIMIT 1) img ON TRUE
+       WHERE e.id=%(eid)s""",
+    "SELECT id, image_url FROM equipment_images WHERE equipment_id=%(eid)s ORDER BY id ASC",
+    """SELECT id, start_date, end_date FROM equipment_availability
+       WHERE equipment_id=%(eid)s AND COALESCE(kind,'available')='available' ORDER BY start_date ASC""",
+    """SELECT id, start_date, end_date, status FROM equipment_bookings
+       WHERE equipment_id=%(eid)s AND status='approved' ORDER BY start_date ASC""",
+    """SELECT r.id, r.rating, r.comment, r.created_at, u.full_name AS reviewer_name
+       FROM equipment_reviews r LEFT JOIN users u ON u.id = r.reviewer_id
+       WHERE r.equipment_id=%(eid)s ORDER BY r.created_at DESC LIMIT 50""",
+    """SELECT COALESCE(AVG(rating),0) AS avg_rating, COUNT(*) AS total
+       FROM equipment_reviews WHERE equipment_id=%(eid)s""",
+]
+
+
+def bench_detail(n_ids, runs, rtt_ms=0.0):
+    from blueprints.equipment import _DETAIL_SQL, _HIDDEN_COLUMNS
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    cur = conn.cursor()
+    # los equipos con más bookings/reviews/imágenes (peor caso del detalle)
+    cur.execute("""
+        SELECT equipment_id FROM equipment_bookings
+        GROUP BY 1 ORDER BY count(*) DESC LIMIT %s
+    """, (n_ids,))
+    ids = [r[0] for r in cur.fetchall()] or [1]
+    new_sql = _DETAIL_SQL.format(version="e.version")
+
+    def old(eid):
+        for sql in OLD_DETAIL_QUERIES:
+            time.sleep(rtt_ms / 1000)
+            cur.execute(sql, {"eid": eid})
+            cur.fetchall()
+
+    def new(eid, known=None):
+        time.sleep(rtt_ms / 1000)
+        cur.execute(new_sql, {"eid": eid, "known_version": known, "hidden": list(_HIDDEN_COLUMNS)})
+        return cur.fetchone()
+
+    versions = {eid: new(eid)[0] for eid in ids}
+    paths = [
+        ("old (6 queries)", old),
+        ("new (1 statement)", new),
+        ("new, 304 (version match)", lambda eid: new(eid, versions[eid])),
+    ]
+    print(f"{len(ids)} equipment ids x {runs} runs, rtt {rtt_ms} ms")
+    for label, fn in paths:
+        samples = []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            for eid in ids:
+                fn(eid)
+            samples.append((time.perf_counter() - t0) * 1000 / len(ids))
+        print(f"  {label:<28}{statistics.median(samples):>8.2f} ms/detail")
+    cur.close()
+    conn.close()
+
+
+def _stress_fixture(cur, n_renters, days):
+    """Owner + renters con token + un equipo con availability para la ventana."""
+    tag = secrets.token_hex(4)
+    tokens = []
+    for i in range(n_renters + 1):
+        cur.execute("""
+            INSERT INTO users (full_name, email, password_hash)
+            VALUES (%s, %s, 'x') RETURNING id
+        """, (f"stress {tag} {i}", f"stress-{tag}-{i}@bench.local"))
+        uid = cur.fetchone()[0]
+        token = secrets.token_hex(32)
+        cur.execute("INSERT INTO auth_tokens (token, user_id) VALUES (%s, %s)", (token, uid))
+        tokens.append((uid, token))
+    owner_id = tokens[0][0]
+    cur.execute("""
+        INSERT INTO equipment (owner_id, sport_id, title, condition_id)
+        VALUES (%s, (SELECT min(id) FROM sports), %s, (SELECT min(id) FROM equipment_status))
+        RETURNING id
+    """, (owner_id, f"stress board {tag}"))
+    eid = cur.fetchone()[0]
+    first = date.today() + timedelta(days=1)
+    cur.execute("""
+        INSERT INTO equipment_availability (equipment_id, start_date, end_date, kind)
+        VALUES (%s, %s, %s, 'available')
+    """, (eid, first, first + timedelta(days=days + 5)))
+    return eid, first, [uid for uid, _ in tokens], tokens[0][1], [t for _, t in tokens[1:]]
+
+
+def _stress_cleanup(cur, eid, user_ids):
+    """Borra el equipo, sus bookings y los usuarios del fixture (y lo que cuelga de ellos)."""
+    cur.execute("DELETE FROM equipment_bookings WHERE equipment_id = %s", (eid,))
+    cur.execute("DELETE FROM equipment WHERE id = %s", (eid,))
+    cur.execute("DELETE FROM users WHERE id = ANY(%s)", (user_ids,))
+
+
+def bench_bookings(workers, n_requests, days, keep):
+    from app import app
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    cur = conn.cursor()
+    eid, first, user_ids, owner_token, renter_tokens = _stress_fixture(cur, workers, days)
+    counts, lock = {}, threading.Lock()
+    todo = iter(range(n_requests))
+
+    def bump(key):
+        with lock:
+            counts[key] = counts.get(key, 0) + 1
+
+    def worker(renter_token):
+        client = app.test_client()
+        while True:
+            with lock:
+                if next(todo, None) is None:
+                    return
+            start = first + timedelta(days=random.randrange(days))
+            end = start + timedelta(days=random.randint(1, 4))
+            r = client.post("/api/bookings", headers={"Authorization": f"Bearer {renter_token}"},
+                            json={"equipment_id": eid, "start_date": start.isoformat(),
+                                  "end_date": end.isoformat()})
+            bump(f"create {r.status_code}")
+            if r.status_code != 201:
+                continue
+            bid = r.get_json()["data"]["booking_id"]
+            r = client.put(f"/api/bookings/{bid}/status", headers={"Authorization": f"Bearer {owner_token}"},
+                           json={"status": "approved"})
+            bump(f"approve {r.status_code}")
+
+    try:
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(t,)) for t in renter_tokens]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        cur.execute("""
+            SELECT count(*)
+            FROM equipment_bookings a
+            JOIN equipment_bookings b
+              ON b.equipment_id = a.equipment_id AND b.id > a.id
+             AND daterange(a.start_date, a.end_date, '[)') && daterange(b.start_date, b.end_date, '[)')
+            WHERE a.equipment_id = %s
+              AND a.status IN ('approved', 'handoff', 'in_use', 'returning')
+              AND b.status IN ('approved', 'handoff', 'in_use', 'returning')
+        """, (eid,))
+        double = cur.fetchone()[0]
+        cur.execute("SELECT count(*) FROM equipment_bookings WHERE equipment_id = %s AND status = 'approved'", (eid,))
+        approved = cur.fetchone()[0]
+    finally:
+        if not keep:
+            _stress_cleanup(cur, eid, user_ids)
+        cur.close()
+        conn.close()
+
+    print(f"equipment {eid}: {n_requests} create+approve con {workers} workers en {elapsed:.1f}s "
+          f"({n_requests / elapsed:.0f} req/s)")
+    for key in sorted(counts):
+        print(f"  {key:<14}{counts[key]:>6}")
+    print(f"approved: {approved}  overlapping approved pairs: {double}")
+    if double:
+        raise SystemExit("DOUBLE BOOKING")
+
+
+def _notifications_fixture(cur, months):
+    """bench_notifications: particiones mensuales de `months` atrás hasta el mes que viene."""
+    cur.execute("DROP TABLE IF EXISTS bench_notifications")
+    cur.execute("""
+        CREATE TABLE bench_notifications (LIKE notifications INCLUDING DEFAULTS)
+        PARTITION BY RANGE (created_at)
+    """)
+    cur.execute("CREATE SEQUENCE IF NOT EXISTS bench_notifications_id_seq OWNED BY bench_notifications.id")
+    cur.execute("ALTER TABLE bench_notifications ALTER COLUMN id SET DEFAULT nextval('bench_notifications_id_seq')")
+    cur.execute("""
+        SELECT m::date AS lo, (m + INTERVAL '1 month')::date AS hi
+        FROM generate_series(date_trunc('month', NOW()) - make_interval(months => %s),
+                             date_trunc('month', NOW()) + INTERVAL '1 month', INTERVAL '1 month') m
+    """, (months,))
+    for lo, hi in cur.fetchall():
+        cur.execute(f"""
+            CREATE TABLE bench_notifications_p{lo:%Y%m} PARTITION OF bench_notifications
+            FOR VALUES FROM ('{lo}') TO ('{hi}')
+        """)
+    cur.execute("CREATE TABLE bench_notifications_p_default PARTITION OF bench_notifications DEFAULT")
+    cur.execute("ALTER TABLE bench_notifications ADD PRIMARY KEY (id, created_at)")
+    cur.execute("CREATE INDEX ON bench_notifications (user_id, created_at DESC, id DESC)")
+    cur.execute("CREATE INDEX ON bench_notifications (user_id, created_at DESC, id DESC) WHERE read_at IS NULL")
+
+
+def _notifications_fill(cur, n, users, months):
+    """n filas más: usuarios al azar, created_at repartido en los últimos `months` meses, 70% leídas."""
+    cur.execute("""
+        INSERT INTO bench_notifications (user_id, type, title, body, created_at, read_at)
+        SELECT 1 + (random() * (%(users)s - 1))::int, 'bench', 'bench', 'bench', c,
+               CASE WHEN random() < 0.7 THEN c + INTERVAL '1 hour' END
+        FROM (
+            SELECT LOCALTIMESTAMP - random() * make_interval(days => %(days)s) AS c
+            FROM generate_series(1, %(n)s)
+        ) g
+    """, {"n": n, "users": users, "days": months * 30})
+
+
+def _inbox_page(cur, user_id, unread=False, cursor=None, limit=30):
+    """Misma forma que list_notifications: ventanas crecientes, después sin límite."""
+    wh = "user_id = %(user_id)s" + (" AND read_at IS NULL" if unread else "")
+    params = {"user_id": user_id, "limit": limit + 1}
+    anchor = "LOCALTIMESTAMP"
+    if cursor:
+        wh += " AND (created_at, id) < (%(c_created_at)s, %(c_id)s)"
+        params.update(c_created_at=cursor[0], c_id=cursor[1])
+        anchor = "%(c_created_at)s::timestamp"
+    for days in [*NOTIFY_LIST_LOOKBACK_DAYS, None]:
+        since = f"AND created_at >= {anchor} - make_interval(days => {int(days)})" if days else ""
+        cur.execute(f"""
+            SELECT id, created_at FROM bench_notifications
+            WHERE {wh} {since}
+            ORDER BY created_at DESC, id DESC LIMIT %(limit)s
+        """, params)
+        rows = cur.fetchall()
+        if len(rows) == limit + 1:
+            break
+    return rows
+
+
+def _pct(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def bench_notifications(sizes, users, months, samples, keep):
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    cur = conn.cursor()
+    _notifications_fixture(cur, months)
+    print(f"bench_notifications: {months + 2} particiones mensuales + default, {users} usuarios")
+    print(f"\n{'rows':>12}{'fill s':>8}{'parts':>7}"
+          f"{'first p50':>11}{'p95':>7}{'deep p50':>10}{'p95':>7}{'unread p50':>12}{'p95':>7}  (ms)")
+    total = 0
+    try:
+        for size in sizes:
+            t0 = time.perf_counter()
+            if size > total:
+                _notifications_fill(cur, size - total, users, months)
+                total = size
+                cur.execute("ANALYZE bench_notifications")
+            fill = time.perf_counter() - t0
+
+            # particiones que abre la primera página (poda al arrancar el executor)
+            cur.execute("""
+                EXPLAIN SELECT id FROM bench_notifications
+                WHERE user_id = 1 AND created_at >= LOCALTIMESTAMP - make_interval(days => %s)
+                ORDER BY created_at DESC, id DESC LIMIT 31
+            """, (NOTIFY_LIST_LOOKBACK_DAYS[0] if NOTIFY_LIST_LOOKBACK_DAYS else 36500,))
+            parts = sum(1 for (line,) in cur.fetchall() if " on bench_notifications_p" in line)
+
+            first, deep, unread = [], [], []
+            for uid in random.sample(range(1, users + 1), min(samples, users)):
+                t0 = time.perf_counter()
+                rows = _inbox_page(cur, uid)
+                first.append((time.perf_counter() - t0) * 1000)
+                # 10 páginas más abajo: el cursor es la fila 300 del usuario
+                cur.execute("""
+                    SELECT created_at, id FROM bench_notifications WHERE user_id = %s
+                    ORDER BY created_at DESC, id DESC OFFSET 300 LIMIT 1
+                """, (uid,))
+                at = cur.fetchone()
+                if at:
+                    t0 = time.perf_counter()
+                    _inbox_page(cur, uid, cursor=at)
+                    deep.append((time.perf_counter() - t0) * 1000)
+                t0 = time.perf_counter()
+                _inbox_page(cur, uid, unread=True)
+                unread.append((time.perf_counter() - t0) * 1000)
+
+            fmt = lambda xs: (f"{_pct(xs, 0.5):.2f}", f"{_pct(xs, 0.95):.2f}") if xs else ("-", "-")
+            (f50, f95), (d50, d95), (u50, u95) = fmt(first), fmt(deep), fmt(unread)
+            print(f"{total:>12}{fill:>8.0f}{parts:>7}{f50:>11}{f95:>7}{d50:>10}{d95:>7}{u50:>12}{u95:>7}")
+    finally:
+        if not keep:
+            cur.execute("DROP TABLE IF EXISTS bench_notifications")
+            cur.execute("DROP SEQUENCE IF EXISTS bench_notifications_id_seq")
+        cur.close()
+        conn.close()
+
+
+def _rank_reference(rows, ctx, weights, now):
+    """Mismo score que utils/ranking.py, fila por fila (la versión sin NumPy)."""
+    from utils import ranking as rk
+    inv = lambda x, scale: 1.0 / (1.0 + x / scale)
+    scored = []
+    for i, r in enumerate(rows):
+        f = [0.0] * len(rk.FEATURES)
+        names = [str(s).strip().lower() for s in (r.get("sports") or [])]
+        if ctx.sports:
+            f[0] = sum(s in ctx.sports for s in names) / len(names) if names else rk.NEUTRAL
+        if ctx.budget:
+            lo, hi = r.get("budget_min"), r.get("budget_max")
+            if lo is None and hi is None:
+                f[1] = rk.NEUTRAL
+            else:
+                gap = max((lo if lo is not None else -math.inf) - ctx.budget,
+                          ctx.budget - (hi if hi is not None else math.inf), 0.0)
+                f[1] = inv(gap, max(ctx.budget, 1))
+        start = r.get("start_date")
+        f[2] = rk.NEUTRAL if start is None else inv(abs(start.toordinal() - ctx.target_date.toordinal()),
+                                                    rk.TRIP_RANK_DATE_DAYS)
+        if ctx.lat is not None and ctx.lng is not None:
+            if r.get("latitude") is None or r.get("longitude") is None:
+                f[3] = rk.NEUTRAL
+            else:
+                km = haversine_km(ctx.lat, ctx.lng, float(r["latitude"]), float(r["longitude"]))
+                f[3] = inv(km, rk.TRIP_RANK_DISTANCE_KM)
+        n = r["creator_reviews"] or 0
+        f[4] = ((r["creator_rating"] or 0) * n + rk.RATING_PRIOR * rk.RATING_PRIOR_REVIEWS) \
+            / (n + rk.RATING_PRIOR_REVIEWS) / 5.0
+        mx = r["max_people"] or 0
+        f[5] = min(max((mx - r["current_people"]) / mx, 0.0), 1.0) if mx > 0 else 0.0
+        age = max((now - r["created_at"]).total_seconds() / 86400.0, 0.0)
+        f[6] = inv(age, rk.RECENCY_DAYS)
+        scored.append((-round(sum(w * x for w, x in zip(weights, f)), 4), i))
+    return [rows[i] for _, i in sorted(scored)]
+
+
+def bench_ranking(sizes, runs):
+    from utils import ranking as rk
+    from utils.ratings import lateral_sql
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute(f"""
+        SELECT t.*, COALESCE(rs.rating, 0)::float AS creator_rating, COALESCE(rs.reviews, 0) AS creator_reviews
+        FROM trip_plans t
+        {lateral_sql("t.creator_id")}
+        WHERE t.status = 'open' AND t.current_people < t.max_people
+        ORDER BY t.created_at DESC, t.id DESC
+        LIMIT %s
+    """, (max(sizes),))
+    base = cur.fetchall()
+    if not base:
+        print("no hay trips abiertos")
+        return
+    # usuario con deportes cargados, ubicación y presupuesto de un trip cualquiera
+    cur.execute("SELECT user_id FROM user_sports GROUP BY user_id ORDER BY count(*) DESC LIMIT 1")
+    u = cur.fetchone()
+    located = [r for r in base if r["latitude"] is not None] or [{"latitude": None, "longitude": None}]
+    lat, lng = located[0]["latitude"], located[0]["longitude"]
+    budgets = [r["budget_max"] for r in base if r["budget_max"]]
+    ctx = rk.load_context(cur, u["user_id"] if u else 0,
+                          budget=statistics.median(budgets) if budgets else None,
+                          lat=float(lat) if lat is not None else None,
+                          lng=float(lng) if lng is not None else None)
+    conn.rollback()
+    conn.close()
+    print(f"bench_ranking: {len(base)} trips reales, deportes={sorted(ctx.sports)}, "
+          f"budget={ctx.budget}, lat/lng={ctx.lat},{ctx.lng}; presupuesto {TRIP_RANK_BUDGET_MS:g} ms")
+    print(f"\n{'candidates':>11}{'numpy p50':>11}{'p95':>8}{'python p50':>12}{'p95':>8}{'x':>7}  same order")
+    now = datetime.now()
+    for size in sizes:
+        rows = [dict(base[i % len(base)]) for i in range(size)]
+        fast, slow = [], []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            got, _ = rk.rank(rows, ctx, now=now)
+            fast.append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            ref = _rank_reference(rows, ctx, rk.WEIGHTS.tolist(), now)
+            slow.append((time.perf_counter() - t0) * 1000)
+        same = [id(r) for r in got] == [id(r) for r in ref]
+        f50, s50 = _pct(fast, 0.5), _pct(slow, 0.5)
+        print(f"{size:>11}{f50:>11.2f}{_pct(fast, 0.95):>8.2f}{s50:>12.2f}{_pct(slow, 0.95):>8.2f}"
+              f"{s50 / f50:>7.1f}  {'yes' if same else 'NO'}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmarks de queries de la API")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("search", help="ILIKE vs full-text/trigramas")
+    s.add_argument("-q", dest="terms", action="append", help="término (repetible)")
+    s.add_argument("--runs", type=int, default=20)
+
+    d = sub.add_parser("detail", help="detalle: 6 queries vs 1 sentencia")
+    d.add_argument("--ids", type=int, default=30)
+    d.add_argument("--runs", type=int, default=20)
+    d.add_argument("--rtt-ms", type=float, default=0.0, help="latencia simulada por round trip")
+
+    b = sub.add_parser("bookings", help="chequeo manual: create/approve concurrentes sin doble booking (escribe en la base)")
+    b.add_argument("--workers", type=int, default=16)
+    b.add_argument("--requests", type=int, default=400)
+    b.add_argument("--days", type=int, default=20, help="ventana de fechas (más chica = más choques)")
+    b.add_argument("--keep", action="store_true", help="no borrar el equipo/usuarios/bookings creados")
+
+    n = sub.add_parser("notifications", help="latencia del inbox a medida que crece la tabla particionada")
+    n.add_argument("--rows", default="1000000,10000000,30000000", help="tamaños totales, separados por coma")
+    n.add_argument("--users", type=int, default=20000)
+    n.add_argument("--months", type=int, default=24, help="meses de historia")
+    n.add_argument("--samples", type=int, default=200, help="usuarios medidos por escalón")
+    n.add_argument("--keep", action="store_true", help="no borrar bench_notifications al final")
+
+    r = sub.add_parser("ranking", help="ranking del feed: NumPy vs loop en Python")
+    r.add_argument("--candidates", default="500,2000,5000", help="candidatos por llamada, separados por coma")
+    r.add_argument("--runs", type=int, default=20)
+
+    args = ap.parse_args()
+    if args.cmd == "search":
+        bench_search(args.terms or DEFAULT_TERMS, args.runs)
+    elif args.cmd == "detail":
+        bench_detail(args.ids, args.runs, args.rtt_ms)
+    elif args.cmd == "bookings":
+        bench_bookings(args.workers, args.requests, args.days, args.keep)
+    elif args.cmd == "notifications":
+        bench_notifications([int(x) for x in args.rows.split(",")], args.users, args.months,
+                            args.samples, args.keep)
+    elif args.cmd == "ranking":
+        bench_ranking([int(x) for x in args.candidates.split(",")], args.runs)
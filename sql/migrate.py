@@ -0,0 +1,311 @@
+"""
+Runner de migraciones versionadas.
+
+    python sql/migrate.py             # aplica las pendientes
+    python sql/migrate.py --status    # lista aplicadas / pendientes
+    python sql/migrate.py --explain   # + reporte de planes de las queries calientes antes/después
+
+Las migraciones viven en sql/migrations/NNNN_nombre.sql y se aplican en orden.
+Cada una queda registrada en schema_migrations. Por defecto corren en UNA
+transacción (archivo + registro de versión). Si el archivo empieza con
+`-- migrate: no-transaction` se ejecuta sentencia por sentencia en autocommit
+(necesario para CREATE INDEX CONCURRENTLY); esas migraciones tienen que ser
+idempotentes (IF NOT EXISTS) porque pueden quedar a medio aplicar.
+"""
+from pathlib import Path
+import argparse
+import json
+import re
+import sys
+import psycopg2
+
+# Añade el root del proyecto al sys.path
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(BASE_DIR))
+
+from config import DB_CONFIG  # ← ahora absoluto
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+LOCK_KEY = 72_001  # pg_advisory_lock: un solo runner a la vez
+
+VERSIONS_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+"""
+
+_FILE_RE = re.compile(r"^(\d{4})_([a-z0-9_]+)\.sql$")
+_CONCURRENT_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.I
+)
+
+# Queries calientes de los blueprints (forma simplificada) para --explain.
+# Los %(..)s se completan con ids reales de la base (ver _samples).
+HOT_QUERIES = [
+    ("equipment.my_equipment", """
+        SELECT e.id FROM equipment e
+        WHERE e.owner_id = %(user_id)s ORDER BY e.created_at DESC"""),
+    ("equipment.search (first image)", """
+        SELECT image_url FROM equipment_images
+        WHERE equipment_id = %(equipment_id)s ORDER BY id ASC LIMIT 1"""),
+    ("equipment.search (sport)", """
+        SELECT e.id FROM equipment e
+        WHERE e.sport_id = %(sport_id)s ORDER BY e.created_at DESC LIMIT 20"""),
+    ("equipment.detail reviews", """
+        SELECT r.id FROM equipment_reviews r
+        WHERE r.equipment_id = %(equipment_id)s ORDER BY r.created_at DESC LIMIT 50"""),
+    ("bookings.create availability", """
+        SELECT 1 FROM equipment_availability a
+        WHERE a.equipment_id = %(equipment_id)s
+          AND COALESCE(a.kind, 'available') = 'available'
+          AND a.start_date <= CURRENT_DATE AND a.end_date >= CURRENT_DATE + 3
+        LIMIT 1"""),
+    ("bookings.create overlap", """
+        SELECT 1 FROM equipment_bookings b
+        WHERE b.equipment_id = %(equipment_id)s
+          AND b.status IN ('approved','handoff','in_use','returning')
+          AND CURRENT_DATE < b.end_date AND CURRENT_DATE + 3 > b.start_date
+        LIMIT 1"""),
+    ("bookings.owner_requests", """
+        SELECT b.id FROM equipment e
+        CROSS JOIN LATERAL (
+            SELECT b.id, b.start_date FROM equipment_bookings b
+            WHERE b.equipment_id = e.id AND b.status = 'pending'
+            ORDER BY b.start_date, b.id LIMIT 51) b
+        WHERE e.owner_id = %(user_id)s
+        ORDER BY b.start_date, b.id LIMIT 51"""),
+    ("bookings.owner_requests_summary", """
+        SELECT e.id, c.pending FROM equipment e
+        CROSS JOIN LATERAL (
+            SELECT count(*) AS pending FROM equipment_bookings b
+            WHERE b.equipment_id = e.id AND b.status = 'pending') c
+        WHERE e.owner_id = %(user_id)s"""),
+    ("notifications.list", """
+        SELECT id FROM notifications
+        WHERE user_id = %(user_id)s
+          AND created_at >= LOCALTIMESTAMP - make_interval(days => 31)
+        ORDER BY created_at DESC, id DESC LIMIT 31"""),
+    ("notifications.list unread", """
+        SELECT id FROM notifications
+        WHERE user_id = %(user_id)s AND read_at IS NULL
+          AND created_at >= LOCALTIMESTAMP - make_interval(days => 31)
+        ORDER BY created_at DESC, id DESC LIMIT 31"""),
+    ("notifications.unread_count", """
+        SELECT unread FROM notification_counters WHERE user_id = %(user_id)s"""),
+    ("trips.list_feed", """
+        SELECT t.id FROM trip_plans t
+        WHERE t.status = 'open' AND t.current_people < t.max_people
+        ORDER BY t.created_at DESC LIMIT 30"""),
+    ("trips.list_requests", """
+        SELECT p.user_id FROM trip_participants p
+        WHERE p.trip_id = %(trip_id)s AND p.role = 'participant' AND p.approved = FALSE"""),
+    ("trips creator rating", """
+        SELECT rating_avg, reviews FROM user_rating_stats WHERE user_id = %(user_id)s"""),
+]
+
+
+def split_statements(sql: str):
+    """Parte un script en sentencias respetando '...' , "..." y $tag$...$tag$."""
+    out, buf, i, n = [], [], 0, len(sql)
+    quote = None
+    while i < n:
+        ch = sql[i]
+        if quote:
+            if sql.startswith(quote, i):
+                buf.append(quote)
+                i += len(quote)
+                quote = None
+                continue
+        elif sql.startswith("--", i):
+            j = sql.find("\n", i)
+            i = n if j == -1 else j + 1
+            buf.append("\n")
+            continue
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch == "$":
+            m = re.match(r"\$\w*\$", sql[i:])
+            if m:
+                quote = m.group(0)
+                buf.append(quote)
+                i += len(quote)
+                continue
+        elif ch == ";":
+            stmt = "".join(buf).strip()
+            if stmt:
+                out.append(stmt)
+            buf = []
+            i += 1
+            continue
+        buf.append(ch)
+        i += 1
+    stmt = "".join(buf).strip()
+    if stmt:
+        out.append(stmt)
+    return out
+
+
+def discover():
+    items = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        m = _FILE_RE.match(path.name)
+        if not m:
+            raise SystemExit(f"bad migration filename: {path.name}")
+        sql = path.read_text()
+        no_tx = sql.lstrip().lower().startswith("-- migrate: no-transaction")
+        items.append({"version": m.group(1), "name": m.group(2), "sql": sql, "no_tx": no_tx})
+    versions = [it["version"] for it in items]
+    if len(versions) != len(set(versions)):
+        raise SystemExit("duplicated migration version")
+    return items
+
+
+def applied_versions(cur):
+    cur.execute("SELECT version FROM schema_migrations")
+    return {r[0] for r in cur.fetchall()}
+
+
+def _drop_invalid_index(cur, name):
+    """Un CREATE INDEX CONCURRENTLY que falló deja el índice INVALID: lo limpiamos para reintentar."""
+    cur.execute("""
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid
+    """, (name,))
+    if cur.fetchone():
+        print(f"  dropping invalid index {name}")
+        cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def apply(conn, mig):
+    label = f"{mig['version']}_{mig['name']}"
+    cur = conn.cursor()
+    if mig["no_tx"]:
+        conn.autocommit = True
+        for stmt in split_statements(mig["sql"]):
+            m = _CONCURRENT_INDEX_RE.search(stmt)
+            if m:
+                _drop_invalid_index(cur, m.group(1))
+            cur.execute(stmt)
+        cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (mig["version"], mig["name"]))
+    else:
+        conn.autocommit = False
+        try:
+            cur.execute(mig["sql"])
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                        (mig["version"], mig["name"]))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+    cur.close()
+    print(f"applied {label}")
+
+
+# ---- --explain ----
+
+def _samples(cur):
+    def first(sql):
+        try:
+            cur.execute(sql)
+            row = cur.fetchone()
+            return row[0] if row and row[0] is not None else 1
+        except psycopg2.Error:
+            return 1
+    return {
+        "user_id": first("SELECT owner_id FROM equipment GROUP BY owner_id ORDER BY count(*) DESC LIMIT 1"),
+        "equipment_id": first("SELECT equipment_id FROM equipment_bookings GROUP BY 1 ORDER BY count(*) DESC LIMIT 1"),
+        "sport_id": first("SELECT sport_id FROM equipment GROUP BY 1 ORDER BY count(*) DESC LIMIT 1"),
+        "trip_id": first("SELECT trip_id FROM trip_participants GROUP BY 1 ORDER BY count(*) DESC LIMIT 1"),
+    }
+
+
+def _scans(plan, acc):
+    rel = plan.get("Relation Name")
+    if rel:
+        scan = f"{plan['Node Type']} on {rel}"
+        if plan.get("Index Name"):
+            scan += f" using {plan['Index Name']}"
+        acc.append(scan)
+    elif plan.get("Index Name"):          # Bitmap Index Scan (no trae Relation Name)
+        acc.append(f"{plan['Node Type']} using {plan['Index Name']}")
+    for child in plan.get("Plans", []):
+        _scans(child, acc)
+    return acc
+
+
+def explain_hot_queries(conn):
+    cur = conn.cursor()
+    params = _samples(cur)
+    report = {}
+    for name, sql in HOT_QUERIES:
+        try:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            raw = cur.fetchone()[0]
+            plan = (raw if isinstance(raw, list) else json.loads(raw))[0]["Plan"]
+            report[name] = _scans(plan, [])
+        except psycopg2.Error as e:
+            report[name] = [f"error: {e.pgerror or e}".strip()]
+    cur.close()
+    return report
+
+
+def print_plan_diff(before, after):
+    print("\nhot query plans (before -> after)")
+    switched = 0
+    for name in after:
+        b, a = before.get(name, []), after[name]
+        seq_before = any(s.startswith("Seq Scan") for s in b)
+        seq_after = any(s.startswith("Seq Scan") for s in a)
+        mark = "SWITCHED " if seq_before and not seq_after else ("unchanged" if b == a else "changed  ")
+        switched += mark.startswith("SWITCHED")
+        print(f"  [{mark}] {name}")
+        print(f"      before: {', '.join(b) or '-'}")
+        print(f"      after:  {', '.join(a) or '-'}")
+    print(f"{switched} hot queries moved off sequential scans")
+    print("(con tablas chicas el planner puede seguir eligiendo Seq Scan: es más barato)")
+
+
+def run(explain=False, status=False):
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+    try:
+        cur.execute(VERSIONS_SQL)
+        done = applied_versions(cur)
+        migrations = discover()
+        pending = [m for m in migrations if m["version"] not in done]
+
+        if status:
+            for m in migrations:
+                mark = "x" if m["version"] in done else " "
+                print(f"[{mark}] {m['version']}_{m['name']}")
+            return
+
+        if not pending:
+            print("No pending migrations.")
+            return
+
+        before = explain_hot_queries(conn) if explain else None
+        for mig in pending:
+            apply(conn, mig)
+        if explain:
+            print_plan_diff(before, explain_hot_queries(conn))
+    finally:
+        conn.autocommit = True
+        cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Aplica sql/migrations/*.sql en orden")
+    ap.add_argument("--explain", action="store_true", help="reporta planes de queries calientes antes/después")
+    ap.add_argument("--status", action="store_true", help="lista migraciones aplicadas/pendientes")
+    args = ap.parse_args()
+    run(explain=args.explain, status=args.status)
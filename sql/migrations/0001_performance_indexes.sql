@@ -0,0 +1,77 @@
+-- migrate: no-transaction
+-- Índices secundarios para los WHERE / ORDER BY de los blueprints.
+-- CONCURRENTLY: no bloquea escrituras mientras se construyen (por eso no-transaction).
+
+-- equipment: /equipment/mine y bandeja del owner (e.owner_id = ? ORDER BY e.created_at DESC)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_owner_created
+    ON equipment (owner_id, created_at DESC);
+
+-- equipment: búsqueda sin geo (ORDER BY e.created_at DESC, opcional e.sport_id = ?)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_created
+    ON equipment (created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_sport_created
+    ON equipment (sport_id, created_at DESC);
+
+-- LATERAL "primera imagen" (equipment_id = ? ORDER BY id LIMIT 1) y detalle
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_images_equipment
+    ON equipment_images (equipment_id, id);
+
+-- availability declarada por equipo (search por fechas, create_booking, calendario)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_availability_equipment
+    ON equipment_availability (equipment_id, start_date);
+
+-- solapes contra bookings bloqueantes, approved del detalle, calendario
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_bookings_equipment_status
+    ON equipment_bookings (equipment_id, status, start_date);
+
+-- bandeja del owner: solo pendientes (parcial: chico aunque el historial crezca)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_bookings_pending
+    ON equipment_bookings (equipment_id, start_date)
+    WHERE status = 'pending';
+
+-- últimas reviews del equipo + agregado
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_reviews_equipment_created
+    ON equipment_reviews (equipment_id, created_at DESC);
+
+-- notificaciones: listado (user_id = ? ORDER BY created_at DESC) y solo no leídas
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_created
+    ON notifications (user_id, created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_unread
+    ON notifications (user_id, created_at DESC)
+    WHERE read_at IS NULL;
+
+-- revocación de tokens por usuario / ON DELETE CASCADE de users
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_auth_tokens_user
+    ON auth_tokens (user_id);
+
+-- feed de trips: status = 'open' ORDER BY created_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trip_plans_open_created
+    ON trip_plans (created_at DESC)
+    WHERE status = 'open';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trip_plans_creator
+    ON trip_plans (creator_id);
+
+-- solicitudes pendientes de un trip (list_requests)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trip_participants_pending
+    ON trip_participants (trip_id)
+    WHERE role = 'participant' AND approved = FALSE;
+
+-- rating del creador / del solicitante (r.reviewee_id = ?)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trip_reviews_reviewee
+    ON trip_reviews (reviewee_id);
+
+-- swipes de un usuario (el UNIQUE existente arranca por trip_id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trip_swipes_user
+    ON trip_swipes (user_id, trip_id);
+
+ANALYZE equipment;
+ANALYZE equipment_images;
+ANALYZE equipment_availability;
+ANALYZE equipment_bookings;
+ANALYZE equipment_reviews;
+ANALYZE notifications;
+ANALYZE auth_tokens;
+ANALYZE trip_plans;
+ANALYZE trip_participants;
+ANALYZE trip_reviews;
+ANALYZE trip_swipes;
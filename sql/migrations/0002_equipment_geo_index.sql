@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Prefiltro geo de search_equipment: bounding box sobre point(lng, lat) con GiST.
+-- La expresión tiene que coincidir con utils/geo.POINT_SQL para que el planner la use.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_geo_point
+    ON equipment USING gist (point(longitude::float8, latitude::float8));
+
+ANALYZE equipment;
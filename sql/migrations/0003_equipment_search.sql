@@ -0,0 +1,33 @@
+-- Búsqueda de texto de equipment: tsvector (es/en/simple) + texto normalizado para trigramas.
+-- Se mantienen con trigger (no GENERATED) para poder usar unaccent y no reescribir la tabla con lock.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+ALTER TABLE equipment ADD COLUMN IF NOT EXISTS search_tsv tsvector;
+ALTER TABLE equipment ADD COLUMN IF NOT EXISTS search_text TEXT;
+
+CREATE OR REPLACE FUNCTION equipment_search_refresh() RETURNS trigger AS $$
+DECLARE
+  t TEXT := unaccent(coalesce(NEW.title, ''));
+  d TEXT := unaccent(coalesce(NEW.description, ''));
+  s TEXT := unaccent(coalesce(NEW.size, ''));
+BEGIN
+  -- título + medida (modelos tipo "JJF 5'8") para trigramas / typos
+  NEW.search_text := lower(t || ' ' || s);
+  NEW.search_tsv :=
+      setweight(to_tsvector('spanish', t), 'A') ||
+      setweight(to_tsvector('english', t), 'A') ||
+      setweight(to_tsvector('simple', t || ' ' || s), 'A') ||
+      setweight(to_tsvector('spanish', d), 'B') ||
+      setweight(to_tsvector('english', d), 'B');
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_equipment_search ON equipment;
+CREATE TRIGGER trg_equipment_search
+    BEFORE INSERT OR UPDATE OF title, description, size ON equipment
+    FOR EACH ROW EXECUTE FUNCTION equipment_search_refresh();
+
+-- backfill (dispara el trigger)
+UPDATE equipment SET title = title;
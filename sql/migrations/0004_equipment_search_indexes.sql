@@ -0,0 +1,8 @@
+-- migrate: no-transaction
+-- Índices de la búsqueda de texto (ver 0003_equipment_search.sql).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_search_tsv
+    ON equipment USING gin (search_tsv);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_search_trgm
+    ON equipment USING gin (search_text gin_trgm_ops);
+
+ANALYZE equipment;
@@ -0,0 +1,15 @@
+-- migrate: no-transaction
+-- Paginación por keyset: el ORDER BY ahora desempata por id, así que los
+-- índices de orden llevan (created_at DESC, id DESC) y reemplazan a los de 0001.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_created_id
+    ON equipment (created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_sport_created_id
+    ON equipment (sport_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trip_plans_open_created_id
+    ON trip_plans (created_at DESC, id DESC)
+    WHERE status = 'open';
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_equipment_created;
+DROP INDEX CONCURRENTLY IF EXISTS idx_equipment_sport_created;
+DROP INDEX CONCURRENTLY IF EXISTS idx_trip_plans_open_created;
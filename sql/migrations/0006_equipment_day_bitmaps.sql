@@ -0,0 +1,105 @@
+-- Bitmap de disponibilidad por equipo: 365 días desde base_date, 1 bit por día.
+--   avail_bits: día cubierto por equipment_availability ('available', rangos inclusive)
+--   busy_bits:  día ocupado por un booking bloqueante ([start_date, end_date))
+-- La búsqueda por fechas pasa a ser un chequeo de bits en vez de EXISTS/NOT EXISTS por fila.
+-- Los triggers la mantienen al día; `flask availability-roll` corre la ventana cada noche.
+
+CREATE TABLE IF NOT EXISTS equipment_day_bitmaps (
+    equipment_id INT PRIMARY KEY REFERENCES equipment(id) ON DELETE CASCADE,
+    base_date DATE NOT NULL,
+    avail_bits BIT(365) NOT NULL,
+    busy_bits BIT(365) NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_equipment_day_bitmaps_base
+    ON equipment_day_bitmaps (base_date);
+
+-- Días [from_d, to_d) como máscara relativa a base (recortada a la ventana)
+CREATE OR REPLACE FUNCTION equipment_day_mask(from_d DATE, to_d DATE, base DATE)
+RETURNS BIT(365) AS $$
+    SELECT CASE
+        WHEN hi <= lo THEN repeat('0', 365)
+        ELSE rpad(repeat('0', lo) || repeat('1', hi - lo), 365, '0')
+    END::bit(365)
+    FROM (SELECT greatest(from_d - base, 0) AS lo, least(to_d - base, 365) AS hi) r
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Recalcula (upsert) los bitmaps de `ids` con base = hoy. Set-based: sirve para
+-- un equipo (triggers), para el roll nocturno y para el backfill.
+-- Estados bloqueantes: los mismos que BLOCKING_STATUSES en blueprints/bookings.py
+CREATE OR REPLACE FUNCTION equipment_bitmap_refresh(ids INT[]) RETURNS void AS $$
+    INSERT INTO equipment_day_bitmaps AS bm (equipment_id, base_date, avail_bits, busy_bits, updated_at)
+    SELECT e.id, CURRENT_DATE,
+           COALESCE(av.bits, repeat('0', 365)::bit(365)),
+           COALESCE(bu.bits, repeat('0', 365)::bit(365)),
+           NOW()
+    FROM equipment e
+    LEFT JOIN (
+        SELECT a.equipment_id, bit_or(equipment_day_mask(a.start_date, a.end_date + 1, CURRENT_DATE)) AS bits
+        FROM equipment_availability a
+        WHERE a.equipment_id = ANY(ids)
+          AND COALESCE(a.kind, 'available') = 'available'
+          AND a.end_date >= CURRENT_DATE
+        GROUP BY a.equipment_id
+    ) av ON av.equipment_id = e.id
+    LEFT JOIN (
+        SELECT b.equipment_id, bit_or(equipment_day_mask(b.start_date, b.end_date, CURRENT_DATE)) AS bits
+        FROM equipment_bookings b
+        WHERE b.equipment_id = ANY(ids)
+          AND b.status IN ('approved', 'handoff', 'in_use', 'returning')
+          AND b.end_date > CURRENT_DATE
+        GROUP BY b.equipment_id
+    ) bu ON bu.equipment_id = e.id
+    WHERE e.id = ANY(ids)
+    ON CONFLICT (equipment_id) DO UPDATE
+       SET base_date = EXCLUDED.base_date,
+           avail_bits = EXCLUDED.avail_bits,
+           busy_bits = EXCLUDED.busy_bits,
+           updated_at = EXCLUDED.updated_at;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION equipment_availability_bitmap_trg() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM equipment_bitmap_refresh(ARRAY[OLD.equipment_id]);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') AND (TG_OP = 'INSERT' OR NEW.equipment_id <> OLD.equipment_id) THEN
+    PERFORM equipment_bitmap_refresh(ARRAY[NEW.equipment_id]);
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Solo importan los bookings que entran/salen de un estado bloqueante (los pending no)
+CREATE OR REPLACE FUNCTION equipment_bookings_bitmap_trg() RETURNS trigger AS $$
+DECLARE
+  blocking TEXT[] := ARRAY['approved', 'handoff', 'in_use', 'returning'];
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = ANY(blocking) THEN
+    PERFORM equipment_bitmap_refresh(ARRAY[OLD.equipment_id]);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = ANY(blocking)
+     AND (TG_OP = 'INSERT' OR NOT (OLD.status = ANY(blocking)) OR NEW.equipment_id <> OLD.equipment_id
+          OR NEW.start_date <> OLD.start_date OR NEW.end_date <> OLD.end_date) THEN
+    PERFORM equipment_bitmap_refresh(ARRAY[NEW.equipment_id]);
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_equipment_availability_bitmap ON equipment_availability;
+CREATE TRIGGER trg_equipment_availability_bitmap
+    AFTER INSERT OR UPDATE OR DELETE ON equipment_availability
+    FOR EACH ROW EXECUTE FUNCTION equipment_availability_bitmap_trg();
+
+DROP TRIGGER IF EXISTS trg_equipment_bookings_bitmap ON equipment_bookings;
+CREATE TRIGGER trg_equipment_bookings_bitmap
+    AFTER INSERT OR UPDATE OR DELETE ON equipment_bookings
+    FOR EACH ROW EXECUTE FUNCTION equipment_bookings_bitmap_trg();
+
+-- backfill: solo equipos con availability (sin fila = sin disponibilidad declarada)
+SELECT equipment_bitmap_refresh(array_agg(DISTINCT equipment_id))
+FROM equipment_availability;
+
+ANALYZE equipment_day_bitmaps;
@@ -0,0 +1,65 @@
+-- equipment.version: sube con cada cambio visible en el detalle del equipo
+-- (fila propia, imágenes, availability, bookings aprobadas, reviews).
+-- Es la base del ETag de GET /api/equipment/<id>/detail.
+
+ALTER TABLE equipment ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION equipment_version_bump() RETURNS trigger AS $$
+BEGIN
+  -- UPDATE directo sobre equipment (si ya viene con version nueva, la respetamos)
+  IF NEW.version = OLD.version THEN
+    NEW.version := OLD.version + 1;
+  END IF;
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_equipment_version ON equipment;
+CREATE TRIGGER trg_equipment_version
+    BEFORE UPDATE ON equipment
+    FOR EACH ROW EXECUTE FUNCTION equipment_version_bump();
+
+-- Tablas hijas: cualquier cambio sube la versión del equipo
+CREATE OR REPLACE FUNCTION equipment_child_version_bump() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    UPDATE equipment SET version = version + 1 WHERE id = OLD.equipment_id;
+  END IF;
+  IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR NEW.equipment_id <> OLD.equipment_id) THEN
+    UPDATE equipment SET version = version + 1 WHERE id = NEW.equipment_id;
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_equipment_images_version ON equipment_images;
+CREATE TRIGGER trg_equipment_images_version
+    AFTER INSERT OR UPDATE OR DELETE ON equipment_images
+    FOR EACH ROW EXECUTE FUNCTION equipment_child_version_bump();
+
+DROP TRIGGER IF EXISTS trg_equipment_availability_version ON equipment_availability;
+CREATE TRIGGER trg_equipment_availability_version
+    AFTER INSERT OR UPDATE OR DELETE ON equipment_availability
+    FOR EACH ROW EXECUTE FUNCTION equipment_child_version_bump();
+
+DROP TRIGGER IF EXISTS trg_equipment_reviews_version ON equipment_reviews;
+CREATE TRIGGER trg_equipment_reviews_version
+    AFTER INSERT OR UPDATE OR DELETE ON equipment_reviews
+    FOR EACH ROW EXECUTE FUNCTION equipment_child_version_bump();
+
+-- bookings: el detalle solo muestra las aprobadas (las pending no invalidan)
+DROP TRIGGER IF EXISTS trg_equipment_bookings_version_ins ON equipment_bookings;
+CREATE TRIGGER trg_equipment_bookings_version_ins
+    AFTER INSERT ON equipment_bookings
+    FOR EACH ROW WHEN (NEW.status = 'approved')
+    EXECUTE FUNCTION equipment_child_version_bump();
+DROP TRIGGER IF EXISTS trg_equipment_bookings_version_upd ON equipment_bookings;
+CREATE TRIGGER trg_equipment_bookings_version_upd
+    AFTER UPDATE ON equipment_bookings
+    FOR EACH ROW WHEN (OLD.status = 'approved' OR NEW.status = 'approved')
+    EXECUTE FUNCTION equipment_child_version_bump();
+DROP TRIGGER IF EXISTS trg_equipment_bookings_version_del ON equipment_bookings;
+CREATE TRIGGER trg_equipment_bookings_version_del
+    AFTER DELETE ON equipment_bookings
+    FOR EACH ROW WHEN (OLD.status = 'approved')
+    EXECUTE FUNCTION equipment_child_version_bump();
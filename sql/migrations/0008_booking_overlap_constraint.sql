@@ -0,0 +1,45 @@
+-- Solapes de bookings bloqueantes: los impide la base (exclusion constraint),
+-- no un SELECT previo en la app que dos requests concurrentes pueden pasar a la vez.
+-- Estados bloqueantes: los mismos que BLOCKING_STATUSES en blueprints/bookings.py
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Si ya hay solapes en los datos el constraint no se puede crear: fallamos con
+-- un mensaje claro en vez de tocar bookings de usuarios.
+DO $$
+DECLARE
+  n INT;
+  sample TEXT;
+BEGIN
+  -- fechas invertidas o vacías: el CHECK de abajo fallaría sin decir cuáles
+  SELECT count(*), string_agg(id::text, ', ' ORDER BY id) FILTER (WHERE rn <= 20)
+    INTO n, sample
+  FROM (
+    SELECT id, row_number() OVER (ORDER BY id) AS rn
+    FROM equipment_bookings
+    WHERE NOT (start_date < end_date)
+  ) bad;
+  IF n > 0 THEN
+    RAISE EXCEPTION '% bookings con start_date >= end_date (ids: %): corregirlos antes de migrar', n, sample;
+  END IF;
+
+  SELECT count(*) INTO n
+  FROM equipment_bookings a
+  JOIN equipment_bookings b
+    ON b.equipment_id = a.equipment_id
+   AND b.id > a.id
+   AND daterange(a.start_date, a.end_date, '[)') && daterange(b.start_date, b.end_date, '[)')
+  WHERE a.status IN ('approved', 'handoff', 'in_use', 'returning')
+    AND b.status IN ('approved', 'handoff', 'in_use', 'returning');
+  IF n > 0 THEN
+    RAISE EXCEPTION '% pares de bookings bloqueantes solapados: resolverlos antes de migrar', n;
+  END IF;
+END
+$$;
+
+ALTER TABLE equipment_bookings
+    ADD CONSTRAINT equipment_bookings_dates_check CHECK (start_date < end_date);
+
+ALTER TABLE equipment_bookings
+    ADD CONSTRAINT equipment_bookings_no_overlap
+    EXCLUDE USING gist (equipment_id WITH =, daterange(start_date, end_date, '[)') WITH &&)
+    WHERE (status IN ('approved', 'handoff', 'in_use', 'returning'));
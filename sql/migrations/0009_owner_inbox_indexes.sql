@@ -0,0 +1,13 @@
+-- migrate: no-transaction
+-- Bandeja del owner paginada por (start_date, id): cada equipo del owner se
+-- recorre con un LATERAL ... LIMIT sobre este índice parcial, así que el costo
+-- depende del tamaño de la página y no del historial de bookings.
+-- Reemplaza a idx_equipment_bookings_pending de 0001 (mismo prefijo + id).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipment_bookings_pending_start_id
+    ON equipment_bookings (equipment_id, start_date, id)
+    WHERE status = 'pending';
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_equipment_bookings_pending;
+
+ANALYZE equipment_bookings;
@@ -0,0 +1,20 @@
+-- Outbox de notificaciones: notify_user/notify_many escriben la notificación y
+-- su job de envío en la misma transacción del request; `flask notify-worker`
+-- los toma con FOR UPDATE SKIP LOCKED y hace el push fuera del request.
+-- Sin FK a notifications a propósito (la tabla se va a particionar).
+
+CREATE TABLE IF NOT EXISTS notification_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    notification_id BIGINT NOT NULL,
+    user_id INT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',      -- pending | dead (los enviados se borran)
+    attempts INT NOT NULL DEFAULT 0,
+    run_at TIMESTAMP NOT NULL DEFAULT NOW(),     -- próximo intento (o fin del lease al tomarlo)
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- cola: vencidos en orden (parcial: los dead no cuentan)
+CREATE INDEX IF NOT EXISTS idx_notification_jobs_due
+    ON notification_jobs (run_at, id)
+    WHERE status = 'pending';
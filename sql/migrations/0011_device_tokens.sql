@@ -0,0 +1,18 @@
+-- Tokens de push por usuario (utils/push.py). Un token pertenece a un solo
+-- dispositivo: si otro usuario lo registra (logout/login en el mismo teléfono)
+-- se reasigna. Los que el provider rechaza se borran al enviar.
+
+CREATE TABLE IF NOT EXISTS device_tokens (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    provider TEXT NOT NULL,                 -- 'fcm' | 'fake' | ...
+    token TEXT NOT NULL,
+    platform TEXT,                          -- 'ios' | 'android' | 'web' (informativo)
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    last_seen_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    UNIQUE (provider, token)
+);
+
+-- envío: todos los tokens de un lote de usuarios (user_id = ANY(...))
+CREATE INDEX IF NOT EXISTS idx_device_tokens_user
+    ON device_tokens (user_id);
@@ -0,0 +1,10 @@
+-- migrate: no-transaction
+-- Dedupe de notificaciones: notify_users/notify_many no repiten el mismo
+-- (user_id, type, dedupe_key) dentro de NOTIFY_DEDUPE_WINDOW. dedupe_key
+-- identifica la entidad ("trip:12", "booking:34"); NULL = sin dedupe.
+
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS dedupe_key TEXT;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_dedupe
+    ON notifications (user_id, type, dedupe_key, created_at DESC)
+    WHERE dedupe_key IS NOT NULL;
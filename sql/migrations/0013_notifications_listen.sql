@@ -0,0 +1,16 @@
+-- Aviso en tiempo real: cada notificación nueva hace pg_notify en el canal
+-- 'notifications' con payload '<user_id>:<id>'. utils/realtime.py escucha con
+-- UNA conexión por proceso y reparte a los streams SSE conectados. El NOTIFY
+-- sale recién con el COMMIT (un ROLLBACK no avisa nada).
+
+CREATE OR REPLACE FUNCTION notifications_pg_notify() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('notifications', NEW.user_id || ':' || NEW.id);
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notifications_pg_notify ON notifications;
+CREATE TRIGGER trg_notifications_pg_notify
+    AFTER INSERT ON notifications
+    FOR EACH ROW EXECUTE FUNCTION notifications_pg_notify();
@@ -0,0 +1,63 @@
+-- Contador de no leídas por usuario, mantenido por triggers de sentencia con
+-- transition tables: un fan-out de N filas o un "marcar todo leído" tocan una
+-- fila de contador por usuario, no una por notificación.
+-- En una transacción: el CREATE TRIGGER bloquea inserts hasta el COMMIT, así
+-- el backfill no se cruza con escrituras concurrentes.
+
+CREATE TABLE IF NOT EXISTS notification_counters (
+    user_id INT PRIMARY KEY,
+    unread INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- (user_id, delta) ordenado por user_id: statements concurrentes toman los
+-- locks de los contadores en el mismo orden
+CREATE OR REPLACE FUNCTION notification_counters_trg() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO notification_counters AS c (user_id, unread)
+    SELECT user_id, count(*) FROM new_rows WHERE read_at IS NULL
+    GROUP BY user_id ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET unread = c.unread + EXCLUDED.unread, updated_at = NOW();
+  ELSIF TG_OP = 'UPDATE' THEN
+    INSERT INTO notification_counters AS c (user_id, unread)
+    SELECT user_id, sum(d) FROM (
+        SELECT user_id, -1 AS d FROM old_rows WHERE read_at IS NULL
+        UNION ALL
+        SELECT user_id, 1 FROM new_rows WHERE read_at IS NULL
+    ) x
+    GROUP BY user_id HAVING sum(d) <> 0 ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET unread = c.unread + EXCLUDED.unread, updated_at = NOW();
+  ELSE
+    INSERT INTO notification_counters AS c (user_id, unread)
+    SELECT user_id, -count(*) FROM old_rows WHERE read_at IS NULL
+    GROUP BY user_id ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET unread = c.unread + EXCLUDED.unread, updated_at = NOW();
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- (una transition table por evento: Postgres no deja combinarlos en un trigger)
+DROP TRIGGER IF EXISTS trg_notification_counters_ins ON notifications;
+CREATE TRIGGER trg_notification_counters_ins
+    AFTER INSERT ON notifications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notification_counters_trg();
+DROP TRIGGER IF EXISTS trg_notification_counters_upd ON notifications;
+CREATE TRIGGER trg_notification_counters_upd
+    AFTER UPDATE ON notifications
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notification_counters_trg();
+DROP TRIGGER IF EXISTS trg_notification_counters_del ON notifications;
+CREATE TRIGGER trg_notification_counters_del
+    AFTER DELETE ON notifications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notification_counters_trg();
+
+-- backfill (absoluto)
+INSERT INTO notification_counters AS c (user_id, unread)
+SELECT user_id, count(*) FILTER (WHERE read_at IS NULL)
+FROM notifications
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET unread = EXCLUDED.unread, updated_at = NOW();
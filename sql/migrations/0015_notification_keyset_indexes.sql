@@ -0,0 +1,12 @@
+-- migrate: no-transaction
+-- Bandeja de notificaciones por keyset (created_at DESC, id DESC): los índices
+-- de 0001 pasan a desempatar por id.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_created_id
+    ON notifications (user_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_unread_id
+    ON notifications (user_id, created_at DESC, id DESC)
+    WHERE read_at IS NULL;
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_notifications_user_created;
+DROP INDEX CONCURRENTLY IF EXISTS idx_notifications_user_unread;
@@ -0,0 +1,147 @@
+-- migrate: no-transaction
+-- notifications pasa a estar particionada por mes (RANGE sobre created_at).
+--   - La tabla actual queda como partición notifications_p_legacy: todo lo
+--     anterior al mes que viene (no se copia nada). `flask notifications-partitions`
+--     la parte después en meses, por tandas (utils/partitions.py, split_legacy).
+--   - notifications_ensure_partitions(n) crea los meses que faltan hasta n
+--     meses adelante (`flask notifications-partitions` la corre cada día).
+--   - notifications_p_default: red de seguridad si el cron no corrió.
+--   - notifications_archive: destino de las leídas viejas (ver utils/partitions.py).
+-- La PK pasa a ser (id, created_at): la clave de partición tiene que estar en
+-- cualquier índice único. Los ids siguen saliendo de la misma secuencia.
+--
+-- Todo lo que escanea la tabla va antes y sin lock exclusivo: CHECKs NOT VALID
+-- + VALIDATE (SHARE UPDATE EXCLUSIVE, se sigue leyendo y escribiendo) y el
+-- índice de la PK nueva CONCURRENTLY. El cambio de verdad (3) es una sola
+-- transacción corta que solo usa lo ya validado: SET NOT NULL y ATTACH no
+-- vuelven a escanear.
+
+-- 1) validaciones online
+ALTER TABLE notifications
+    DROP CONSTRAINT IF EXISTS notifications_created_at_not_null,
+    ADD CONSTRAINT notifications_created_at_not_null CHECK (created_at IS NOT NULL) NOT VALID;
+ALTER TABLE notifications VALIDATE CONSTRAINT notifications_created_at_not_null;
+
+DO $$
+BEGIN
+  EXECUTE format('ALTER TABLE notifications
+                    DROP CONSTRAINT IF EXISTS notifications_p_legacy_bound,
+                    ADD CONSTRAINT notifications_p_legacy_bound CHECK (created_at < %L) NOT VALID',
+                 date_trunc('month', NOW()) + INTERVAL '1 month');
+END
+$$;
+ALTER TABLE notifications VALIDATE CONSTRAINT notifications_p_legacy_bound;
+
+-- 2) misma forma que la PK del padre: el ATTACH la adopta en vez de construir otra
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS notifications_p_legacy_pkey
+    ON notifications (id, created_at);
+
+-- 3) el cambio, todo o nada
+BEGIN;
+
+ALTER TABLE notifications ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE notifications DROP CONSTRAINT notifications_created_at_not_null;
+ALTER TABLE notifications RENAME TO notifications_p_legacy;
+
+-- los triggers pasan al padre (una partición no puede tener triggers con
+-- transition tables); la FK se queda y el ATTACH la adopta sin revalidar
+DROP TRIGGER IF EXISTS trg_notification_counters_ins ON notifications_p_legacy;
+DROP TRIGGER IF EXISTS trg_notification_counters_upd ON notifications_p_legacy;
+DROP TRIGGER IF EXISTS trg_notification_counters_del ON notifications_p_legacy;
+DROP TRIGGER IF EXISTS trg_notifications_pg_notify ON notifications_p_legacy;
+ALTER TABLE notifications_p_legacy DROP CONSTRAINT notifications_pkey;
+ALTER TABLE notifications_p_legacy ADD CONSTRAINT notifications_p_legacy_pkey
+    PRIMARY KEY USING INDEX notifications_p_legacy_pkey;
+
+ALTER INDEX IF EXISTS idx_notifications_user_created_id RENAME TO notifications_p_legacy_user_created_id;
+ALTER INDEX IF EXISTS idx_notifications_user_unread_id RENAME TO notifications_p_legacy_user_unread_id;
+ALTER INDEX IF EXISTS idx_notifications_dedupe RENAME TO notifications_p_legacy_dedupe;
+
+-- padre particionado
+CREATE TABLE notifications (
+    LIKE notifications_p_legacy INCLUDING DEFAULTS
+) PARTITION BY RANGE (created_at);
+
+ALTER TABLE notifications ADD CONSTRAINT notifications_pkey PRIMARY KEY (id, created_at);
+ALTER TABLE notifications ADD CONSTRAINT notifications_user_id_fkey
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+ALTER SEQUENCE notifications_id_seq OWNED BY notifications.id;
+
+-- mismo límite que el CHECK validado en (1): el ATTACH no escanea
+DO $$
+DECLARE
+  hi TIMESTAMP := date_trunc('month', NOW()) + INTERVAL '1 month';
+BEGIN
+  EXECUTE format('ALTER TABLE notifications ATTACH PARTITION notifications_p_legacy
+                  FOR VALUES FROM (MINVALUE) TO (%L)', hi);
+END
+$$;
+
+-- los índices del padre adoptan los equivalentes que ya tiene la legacy
+CREATE INDEX idx_notifications_user_created_id
+    ON notifications (user_id, created_at DESC, id DESC);
+CREATE INDEX idx_notifications_user_unread_id
+    ON notifications (user_id, created_at DESC, id DESC)
+    WHERE read_at IS NULL;
+CREATE INDEX idx_notifications_dedupe
+    ON notifications (user_id, type, dedupe_key, created_at DESC)
+    WHERE dedupe_key IS NOT NULL;
+
+CREATE TABLE notifications_p_default PARTITION OF notifications DEFAULT;
+
+-- triggers (0013 y 0014) ahora sobre el padre
+CREATE TRIGGER trg_notifications_pg_notify
+    AFTER INSERT ON notifications
+    FOR EACH ROW EXECUTE FUNCTION notifications_pg_notify();
+CREATE TRIGGER trg_notification_counters_ins
+    AFTER INSERT ON notifications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notification_counters_trg();
+CREATE TRIGGER trg_notification_counters_upd
+    AFTER UPDATE ON notifications
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notification_counters_trg();
+CREATE TRIGGER trg_notification_counters_del
+    AFTER DELETE ON notifications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notification_counters_trg();
+
+COMMIT;
+
+-- 4) particiones mensuales: desde el mes actual hasta `ahead` meses adelante.
+-- Los meses que ya cubre otra partición (la legacy) se saltean.
+CREATE OR REPLACE FUNCTION notifications_ensure_partitions(ahead INT) RETURNS INT AS $$
+DECLARE
+  m DATE;
+  part TEXT;
+  created INT := 0;
+BEGIN
+  FOR i IN 0..ahead LOOP
+    m := (date_trunc('month', NOW()) + make_interval(months => i))::date;
+    part := 'notifications_p' || to_char(m, 'YYYYMM');
+    CONTINUE WHEN to_regclass(part) IS NOT NULL;
+    BEGIN
+      EXECUTE format('CREATE TABLE %I PARTITION OF notifications FOR VALUES FROM (%L) TO (%L)',
+                     part, m, (m + INTERVAL '1 month')::date);
+      created := created + 1;
+    EXCEPTION
+      WHEN invalid_object_definition THEN NULL;   -- se pisa con otra partición
+      WHEN check_violation THEN                   -- la default ya tiene filas de ese mes
+        RAISE WARNING 'notifications_p_default has rows for %, partition not created', m;
+    END;
+  END LOOP;
+  RETURN created;
+END
+$$ LANGUAGE plpgsql;
+
+SELECT notifications_ensure_partitions(3);
+
+-- 5) archivo de las leídas viejas (solo para consulta/soporte)
+CREATE TABLE IF NOT EXISTS notifications_archive (
+    LIKE notifications INCLUDING DEFAULTS
+);
+ALTER TABLE notifications_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP NOT NULL DEFAULT NOW();
+CREATE INDEX IF NOT EXISTS idx_notifications_archive_user
+    ON notifications_archive (user_id, created_at DESC);
+
+ANALYZE notifications;
@@ -0,0 +1,29 @@
+-- Rating de cada usuario como reviewee de trip_reviews (cantidad, suma y
+-- promedio). El feed de trips y las solicitudes lo leen directo en vez de
+-- agregar trip_reviews en cada request. review_trip lo actualiza en la misma
+-- sentencia que inserta la review; `flask rating-stats-rebuild` lo recalcula
+-- desde trip_reviews si algo quedó desfasado.
+
+CREATE TABLE IF NOT EXISTS user_rating_stats (
+    user_id INT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    reviews INT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    rating_avg DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- backfill (absoluto); el lock frena reviews nuevas hasta el COMMIT
+LOCK TABLE trip_reviews IN SHARE MODE;
+
+INSERT INTO user_rating_stats AS s (user_id, reviews, rating_sum, rating_avg)
+SELECT reviewee_id, count(*), sum(rating), avg(rating)::float
+FROM trip_reviews
+WHERE reviewee_id IS NOT NULL AND rating IS NOT NULL
+GROUP BY reviewee_id
+ON CONFLICT (user_id) DO UPDATE
+   SET reviews = EXCLUDED.reviews,
+       rating_sum = EXCLUDED.rating_sum,
+       rating_avg = EXCLUDED.rating_avg,
+       updated_at = NOW();
+
+ANALYZE user_rating_stats;
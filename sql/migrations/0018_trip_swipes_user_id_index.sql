@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- Seen set del feed (utils/seen.py): cada feed lee solo los swipes del usuario
+-- posteriores al último id que ya tiene cacheado.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trip_swipes_user_id
+    ON trip_swipes (user_id, id) INCLUDE (trip_id);
@@ -0,0 +1,43 @@
+-- equipment_bitmap_refresh (0006) recalculaba el bitmap con el snapshot de la
+-- sentencia y pisaba la fila con EXCLUDED.*: dos transacciones que aprueban
+-- bookings (o agregan availability) del mismo equipo a la vez terminaban con el
+-- bitmap de la segunda, sin los días de la primera.
+--
+-- Ahora primero bloquea las filas de equipment (en orden de id, sin deadlocks
+-- entre refrescos) y recién después recalcula: en READ COMMITTED cada sentencia
+-- de una función VOLATILE toma snapshot nuevo, así que la segunda espera el
+-- COMMIT de la primera y la ve. NO KEY UPDATE no choca con el KEY SHARE de las
+-- FKs: insertar bookings en paralelo no se bloquea.
+
+CREATE OR REPLACE FUNCTION equipment_bitmap_refresh(ids INT[]) RETURNS void AS $$
+    SELECT 1 FROM equipment WHERE id = ANY(ids) ORDER BY id FOR NO KEY UPDATE;
+
+    INSERT INTO equipment_day_bitmaps AS bm (equipment_id, base_date, avail_bits, busy_bits, updated_at)
+    SELECT e.id, CURRENT_DATE,
+           COALESCE(av.bits, repeat('0', 365)::bit(365)),
+           COALESCE(bu.bits, repeat('0', 365)::bit(365)),
+           NOW()
+    FROM equipment e
+    LEFT JOIN (
+        SELECT a.equipment_id, bit_or(equipment_day_mask(a.start_date, a.end_date + 1, CURRENT_DATE)) AS bits
+        FROM equipment_availability a
+        WHERE a.equipment_id = ANY(ids)
+          AND COALESCE(a.kind, 'available') = 'available'
+          AND a.end_date >= CURRENT_DATE
+        GROUP BY a.equipment_id
+    ) av ON av.equipment_id = e.id
+    LEFT JOIN (
+        SELECT b.equipment_id, bit_or(equipment_day_mask(b.start_date, b.end_date, CURRENT_DATE)) AS bits
+        FROM equipment_bookings b
+        WHERE b.equipment_id = ANY(ids)
+          AND b.status IN ('approved', 'handoff', 'in_use', 'returning')
+          AND b.end_date > CURRENT_DATE
+        GROUP BY b.equipment_id
+    ) bu ON bu.equipment_id = e.id
+    WHERE e.id = ANY(ids)
+    ON CONFLICT (equipment_id) DO UPDATE
+       SET base_date = EXCLUDED.base_date,
+           avail_bits = EXCLUDED.avail_bits,
+           busy_bits = EXCLUDED.busy_bits,
+           updated_at = EXCLUDED.updated_at;
+$$ LANGUAGE sql;
@@ -0,0 +1,46 @@
+-- Versión del calendario de cada equipo: sube con cualquier cambio que el
+-- calendario muestra (availability, bookings pending o bloqueantes, fechas).
+-- Cada worker valida su cache de calendarios contra esta fila (lectura por PK),
+-- así un booking aprobado en otro proceso no deja calendarios viejos.
+-- equipment.version (0007) no alcanza: solo mira bookings 'approved'.
+-- Sin fila = versión 0.
+
+CREATE TABLE IF NOT EXISTS equipment_calendar_versions (
+    equipment_id INT PRIMARY KEY REFERENCES equipment(id) ON DELETE CASCADE,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION equipment_calendar_bump() RETURNS trigger AS $$
+BEGIN
+  -- bookings: un UPDATE que no toca status/fechas/equipo no cambia el calendario
+  -- (IF anidado: plpgsql no corta el AND y availability no tiene status)
+  IF TG_OP = 'UPDATE' AND TG_TABLE_NAME = 'equipment_bookings' THEN
+    IF (NEW.status, NEW.start_date, NEW.end_date, NEW.equipment_id)
+       IS NOT DISTINCT FROM (OLD.status, OLD.start_date, OLD.end_date, OLD.equipment_id) THEN
+      RETURN NULL;
+    END IF;
+  END IF;
+  -- SELECT FROM equipment: en el DELETE en cascada de un equipo ya no está y no hay nada que versionar
+  IF TG_OP <> 'INSERT' THEN
+    INSERT INTO equipment_calendar_versions AS v (equipment_id, version)
+    SELECT id, 1 FROM equipment WHERE id = OLD.equipment_id
+    ON CONFLICT (equipment_id) DO UPDATE SET version = v.version + 1;
+  END IF;
+  IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR NEW.equipment_id <> OLD.equipment_id) THEN
+    INSERT INTO equipment_calendar_versions AS v (equipment_id, version)
+    SELECT id, 1 FROM equipment WHERE id = NEW.equipment_id
+    ON CONFLICT (equipment_id) DO UPDATE SET version = v.version + 1;
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_equipment_availability_calendar ON equipment_availability;
+CREATE TRIGGER trg_equipment_availability_calendar
+    AFTER INSERT OR UPDATE OR DELETE ON equipment_availability
+    FOR EACH ROW EXECUTE FUNCTION equipment_calendar_bump();
+
+DROP TRIGGER IF EXISTS trg_equipment_bookings_calendar ON equipment_bookings;
+CREATE TRIGGER trg_equipment_bookings_calendar
+    AFTER INSERT OR UPDATE OR DELETE ON equipment_bookings
+    FOR EACH ROW EXECUTE FUNCTION equipment_calendar_bump();
@@ -0,0 +1,4 @@
+-- Dispositivos que ya recibieron el push de cada job ("provider:token"). Si un
+-- job con varios dispositivos falla en alguno, el reintento manda solo a los
+-- que faltan en vez de repetirlo en los que ya respondieron OK.
+ALTER TABLE notification_jobs ADD COLUMN IF NOT EXISTS delivered TEXT[] NOT NULL DEFAULT '{}';
@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- El (user_id, trip_id) de 0001 quedó de más: la carga inicial del seen set usa
+-- idx_trip_swipes_user_id (0018) y el anti-join del feed la UNIQUE (trip_id, user_id).
+-- Cada swipe mantiene un índice menos.
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_trip_swipes_user;
@@ -0,0 +1,35 @@
+-- Invalidaciones del cache token -> usuario (utils/auth.py) entre procesos.
+-- Cada logout / revocación (UPDATE o DELETE en auth_tokens) y cada cambio de
+-- lo que se cachea del usuario manda NOTIFY auth_invalidate al commitear; el
+-- thread de LISTEN de cada proceso saca la entrada. El token va como sha256
+-- en hex, igual que la key del cache: nunca en claro por el canal.
+
+CREATE OR REPLACE FUNCTION auth_tokens_invalidate() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('auth_invalidate', 'token:' || encode(sha256(convert_to(OLD.token, 'UTF8')), 'hex'));
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_auth_tokens_invalidate ON auth_tokens;
+CREATE TRIGGER trg_auth_tokens_invalidate
+    AFTER UPDATE OR DELETE ON auth_tokens
+    FOR EACH ROW EXECUTE FUNCTION auth_tokens_invalidate();
+
+-- Solo las columnas de utils/auth.py USER_COLUMNS (el id no cambia)
+CREATE OR REPLACE FUNCTION users_auth_invalidate() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' THEN
+    IF (NEW.full_name, NEW.email, NEW.created_at) IS NOT DISTINCT FROM (OLD.full_name, OLD.email, OLD.created_at) THEN
+      RETURN NULL;
+    END IF;
+  END IF;
+  PERFORM pg_notify('auth_invalidate', 'user:' || OLD.id);
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_auth_invalidate ON users;
+CREATE TRIGGER trg_users_auth_invalidate
+    AFTER UPDATE OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION users_auth_invalidate();
@@ -0,0 +1,51 @@
+-- Calendarios cacheados sin lectura por request: además de subir la versión
+-- (0020), cada cambio manda NOTIFY equipment_calendar con el id del equipo al
+-- commitear y cada proceso saca sus entradas (blueprints/equipment.py). La
+-- lectura de equipment_calendar_versions queda para cuando el LISTEN está caído.
+--
+-- Cada equipo tiene su fila de versión desde que se crea (antes aparecía con
+-- el primer cambio).
+
+CREATE OR REPLACE FUNCTION equipment_calendar_bump() RETURNS trigger AS $$
+BEGIN
+  -- bookings: un UPDATE que no toca status/fechas/equipo no cambia el calendario
+  -- (IF anidado: plpgsql no corta el AND y availability no tiene status)
+  IF TG_OP = 'UPDATE' AND TG_TABLE_NAME = 'equipment_bookings' THEN
+    IF (NEW.status, NEW.start_date, NEW.end_date, NEW.equipment_id)
+       IS NOT DISTINCT FROM (OLD.status, OLD.start_date, OLD.end_date, OLD.equipment_id) THEN
+      RETURN NULL;
+    END IF;
+  END IF;
+  -- SELECT FROM equipment: en el DELETE en cascada de un equipo ya no está y no hay nada que versionar
+  IF TG_OP <> 'INSERT' THEN
+    INSERT INTO equipment_calendar_versions AS v (equipment_id, version)
+    SELECT id, 1 FROM equipment WHERE id = OLD.equipment_id
+    ON CONFLICT (equipment_id) DO UPDATE SET version = v.version + 1;
+    PERFORM pg_notify('equipment_calendar', OLD.equipment_id::text);
+  END IF;
+  IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR NEW.equipment_id <> OLD.equipment_id) THEN
+    INSERT INTO equipment_calendar_versions AS v (equipment_id, version)
+    SELECT id, 1 FROM equipment WHERE id = NEW.equipment_id
+    ON CONFLICT (equipment_id) DO UPDATE SET version = v.version + 1;
+    PERFORM pg_notify('equipment_calendar', NEW.equipment_id::text);
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION equipment_calendar_seed() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO equipment_calendar_versions (equipment_id) VALUES (NEW.id)
+  ON CONFLICT (equipment_id) DO NOTHING;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_equipment_calendar_seed ON equipment;
+CREATE TRIGGER trg_equipment_calendar_seed
+    AFTER INSERT ON equipment
+    FOR EACH ROW EXECUTE FUNCTION equipment_calendar_seed();
+
+INSERT INTO equipment_calendar_versions (equipment_id)
+SELECT id FROM equipment
+ON CONFLICT (equipment_id) DO NOTHING;
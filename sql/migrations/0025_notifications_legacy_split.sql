@@ -0,0 +1,55 @@
+-- Partir notifications_p_legacy (0016) en particiones mensuales sin cortar
+-- lecturas ni escrituras (utils/partitions.py, split_legacy):
+--   - la historia se copia por tandas a notifications_legacy_split, un padre
+--     aparte con los mismos meses, índices y FK que nadie consulta;
+--   - todo lo que se escribe en la legacy desde acá (INSERT/UPDATE/DELETE)
+--     queda anotado en notifications_legacy_changes y se vuelve a copiar al final;
+--   - el cambio es una transacción corta: DETACH de la legacy, los meses pasan
+--     a notifications (CHECK ya válidos: el ATTACH no escanea) y DROP.
+-- Así la retención borra meses enteros también para la historia vieja.
+
+CREATE TABLE IF NOT EXISTS notifications_legacy_changes (
+    id INT NOT NULL,
+    created_at TIMESTAMP NOT NULL
+);
+
+-- hasta qué id de la legacy se copió (una sola fila)
+CREATE TABLE IF NOT EXISTS notifications_legacy_split_state (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    copied_id BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO notifications_legacy_split_state DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION notifications_legacy_capture() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    INSERT INTO notifications_legacy_changes (id, created_at) VALUES (OLD.id, OLD.created_at);
+  END IF;
+  IF TG_OP <> 'DELETE' THEN
+    INSERT INTO notifications_legacy_changes (id, created_at) VALUES (NEW.id, NEW.created_at);
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notifications_legacy_capture ON notifications_p_legacy;
+CREATE TRIGGER trg_notifications_legacy_capture
+    AFTER INSERT OR UPDATE OR DELETE ON notifications_p_legacy
+    FOR EACH ROW EXECUTE FUNCTION notifications_legacy_capture();
+
+-- misma PK, FK e índices que notifications: el ATTACH final los adopta
+CREATE TABLE IF NOT EXISTS notifications_legacy_split (
+    LIKE notifications INCLUDING DEFAULTS,
+    CONSTRAINT notifications_legacy_split_pkey PRIMARY KEY (id, created_at),
+    CONSTRAINT notifications_legacy_split_user_id_fkey
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX IF NOT EXISTS idx_notifications_legacy_split_user_created_id
+    ON notifications_legacy_split (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_notifications_legacy_split_user_unread_id
+    ON notifications_legacy_split (user_id, created_at DESC, id DESC)
+    WHERE read_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_notifications_legacy_split_dedupe
+    ON notifications_legacy_split (user_id, type, dedupe_key, created_at DESC)
+    WHERE dedupe_key IS NOT NULL;
@@ -9,6 +9,11 @@ CREATE TABLE users (
     password_hash TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT NOW()
 );
+CREATE TABLE auth_tokens (
+    token TEXT PRIMARY KEY,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
 CREATE TABLE user_role_assignments (
     user_id INT REFERENCES users(id) ON DELETE CASCADE,
     role_id INT REFERENCES user_roles(id) ON DELETE CASCADE,
@@ -1,9 +1,14 @@
 # utils/auth.py
+import hashlib
 from functools import wraps
 from flask import request, g
 from psycopg2.extras import RealDictCursor
 from db import get_conn
 from utils.http import error
+from utils.cache import TTLCache
+from utils.schema import registry as schema
+from utils import realtime
+from config import AUTH_CACHE_TTL, AUTH_CACHE_MAX
 
 def _extract_bearer_token() -> str | None:
     """
@@ -21,24 +26,49 @@ def _extract_bearer_token() -> str | None:
         return None
     return token.strip() or None
 
-def _load_user_by_token(token: str):
+_token_cache = TTLCache(maxsize=AUTH_CACHE_MAX, ttl=AUTH_CACHE_TTL, name="auth_tokens")
+
+# Invalidaciones entre procesos: los triggers de la migración 0023 mandan
+# NOTIFY auth_invalidate ('token:<sha256>' o 'user:<id>') al commitear un
+# logout, una revocación o un cambio del usuario, y el thread de LISTEN de
+# utils/realtime.py las aplica en cada proceso. Sin LISTEN activo el cache no
+# se usa (lo que pasó con la conexión caída se perdió) y al volver se vacía.
+INVALIDATE_CHANNEL = "auth_invalidate"
+
+# Sube con cada invalidación: una carga que empezó antes no deja su entrada
+_epoch = 0
+
+# Lo único que se carga (y cachea) en g.user: nunca password_hash ni el perfil
+# completo. Si un endpoint necesita otra columna, que la lea de users.
+USER_COLUMNS = ("id", "full_name", "email", "created_at")
+
+def _token_key(token: str) -> str:
+    # Nunca guardamos el token en claro como key del cache
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def load_user_by_token(token: str):
     """
     Carga usuario por token. Si la tabla auth_tokens no tiene columnas
     'revoked' o 'expires_at', omite esos checks de forma segura.
+    Los aciertos se cachean (TTL + LRU) por hash del token: con cache hit
+    no hay ningún round trip a la base. Ver invalidate_token/invalidate_user.
     """
+    key = _token_key(token)
+    use_cache = _cache_ready()
+    if use_cache:
+        cached = _token_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+    epoch = _epoch
+
     with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        # Descubrir columnas disponibles
-        cur.execute("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = 'auth_tokens'
-        """)
-        cols = {r['column_name'] for r in cur.fetchall()}
+        cols = schema.columns("auth_tokens")   # introspectado al arrancar
         has_revoked = 'revoked' in cols
         has_expires = 'expires_at' in cols
 
-        base = """
-            SELECT u.*
+        base = f"""
+            SELECT {", ".join("u." + c for c in USER_COLUMNS)},
+                   {"EXTRACT(EPOCH FROM (t.expires_at - NOW()))" if has_expires else "NULL"} AS _token_ttl
             FROM auth_tokens t
             JOIN users u ON u.id = t.user_id
             WHERE t.token = %s
@@ -56,7 +86,48 @@ def _load_user_by_token(token: str):
         query = base + where_extra + " LIMIT 1;"
 
         cur.execute(query, (token,))
-        return cur.fetchone()   
+        row = cur.fetchone()
+
+    if not row:
+        return None   # los negativos no se cachean
+    user = dict(row)
+    token_ttl = user.pop("_token_ttl", None)
+    if use_cache:
+        ttl = AUTH_CACHE_TTL if token_ttl is None else min(AUTH_CACHE_TTL, float(token_ttl))
+        _token_cache.set(key, user, ttl=ttl)
+        if epoch != _epoch:
+            # hubo una invalidación mientras se leía: puede ser de este token
+            _token_cache.pop(key)
+    return dict(user)
+
+def _cache_ready():
+    hub = realtime.get_hub()
+    if hub.ready(INVALIDATE_CHANNEL):
+        return True
+    hub.watch(INVALIDATE_CHANNEL, _on_invalidate, on_connect=_token_cache.clear)
+    return False
+
+def _on_invalidate(payload):
+    kind, _, value = payload.partition(":")
+    if kind == "token":
+        _pop_key(value)
+    elif kind == "user" and value.isdigit():
+        invalidate_user(int(value))
+
+def _pop_key(key):
+    global _epoch
+    _epoch += 1   # antes del pop: ver load_user_by_token
+    _token_cache.pop(key)
+
+def invalidate_token(token: str):
+    """Saca el token del cache de este proceso (a los demás les llega por NOTIFY)."""
+    _pop_key(_token_key(token))
+
+def invalidate_user(user_id: int):
+    """Saca todos los tokens cacheados de un usuario (baja, cambio de datos, revocación masiva)."""
+    global _epoch
+    _epoch += 1
+    _token_cache.pop_where(lambda _k, u: u.get("id") == user_id)
 
 def require_auth(fn):
     """
@@ -75,7 +146,7 @@ def require_auth(fn):
         token = _extract_bearer_token()
         if not token:
             return error("Unauthorized: missing bearer token", 401)
-        user = _load_user_by_token(token)
+        user = load_user_by_token(token)
         if not user:
             return error("Unauthorized: invalid token", 401)
         g.user = user
@@ -94,7 +165,7 @@ def require_role(*roles):
             token = _extract_bearer_token()
             if not token:
                 return error("Unauthorized: missing bearer token", 401)
-            user = _load_user_by_token(token)
+            user = load_user_by_token(token)
             if not user:
                 return error("Unauthorized: invalid token", 401)
             # chequear roles si se pasaron
@@ -124,7 +195,7 @@ def optional_auth(fn):
         token = _extract_bearer_token()
         g.user = None
         if token:
-            user = _load_user_by_token(token)
+            user = load_user_by_token(token)
             if user:
                 g.user = user
         return fn(*args, **kwargs)
@@ -0,0 +1,65 @@
+# utils/availability.py
+"""
+Filtro "libre todo el rango" sobre equipment_day_bitmaps
+(ver sql/migrations/0006_equipment_day_bitmaps.sql).
+
+Una sola definición de "libre todo el rango", con o sin bitmap: la unión de
+la availability declarada tiene que cubrir start_date..end_date (inclusive) y
+ningún booking bloqueante (BLOCKING_STATUSES) puede pisar [start_date,
+end_date). Los bookings pending no ocultan el equipo.
+"""
+
+WINDOW_DAYS = 365
+
+# Fuera de la ventana del bitmap (rangos muy lejanos o un bitmap sin rolar) o
+# sin la migración 0006: subqueries por fila. Como en el bitmap, cuenta la
+# unión de los rangos (range_agg: uno hasta el 10 y otro desde el 11 cubren juntos).
+LEGACY_FREE_RANGE_SQL = """
+    (
+        SELECT range_agg(daterange(a.start_date, a.end_date, '[]'))
+        FROM equipment_availability a
+        WHERE a.equipment_id = e.id
+          AND COALESCE(a.kind, 'available') = 'available'
+          AND a.start_date <= %(end_date)s::date
+          AND a.end_date   >= %(start_date)s::date
+    ) @> daterange(%(start_date)s::date, %(end_date)s::date, '[]')
+    AND NOT EXISTS (
+        SELECT 1
+        FROM equipment_bookings b
+        WHERE b.equipment_id = e.id
+          AND b.status IN ('approved', 'handoff', 'in_use', 'returning')
+          AND %(start_date)s::date < b.end_date
+          AND %(end_date)s::date   > b.start_date
+    )
+"""
+
+BITMAP_JOIN = "JOIN equipment_day_bitmaps bm ON bm.equipment_id = e.id"
+
+FREE_RANGE_SQL = f"""
+    CASE
+      WHEN %(start_date)s::date >= bm.base_date
+       AND %(end_date)s::date < bm.base_date + {WINDOW_DAYS}
+      THEN
+        -- ningún 0 en los días declarados, ningún 1 en los días ocupados
+        position(B'0' IN substring(bm.avail_bits
+                 FROM %(start_date)s::date - bm.base_date + 1
+                 FOR %(end_date)s::date - %(start_date)s::date + 1)) = 0
+        AND position(B'1' IN substring(bm.busy_bits
+                 FROM %(start_date)s::date - bm.base_date + 1
+                 FOR %(end_date)s::date - %(start_date)s::date)) = 0
+      ELSE {LEGACY_FREE_RANGE_SQL}
+    END
+"""
+
+
+def roll(cur):
+    """Recalcula los bitmaps con base vieja (corrido nocturno). Devuelve cuántos."""
+    cur.execute("""
+        SELECT array_agg(equipment_id) AS ids
+        FROM equipment_day_bitmaps
+        WHERE base_date < CURRENT_DATE
+    """)
+    ids = cur.fetchone()["ids"] or []
+    if ids:
+        cur.execute("SELECT equipment_bitmap_refresh(%s)", (ids,))
+    return len(ids)
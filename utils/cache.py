@@ -0,0 +1,131 @@
+# utils/cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+# Caches con nombre, para exponer sus stats (GET /api/health/caches)
+_registry = {}
+
+
+def all_stats():
+    return {name: cache.stats() for name, cache in sorted(_registry.items())}
+
+
+class TTLCache:
+    """
+    Cache en memoria del proceso: LRU acotado (maxsize) + TTL opcional.
+    Thread-safe. Lleva contadores de hits/misses/evictions (ver stats()).
+    ttl=None -> las entradas viven hasta que se invalidan o las desaloja el LRU.
+
+    Grupos opcionales: set(..., group=g) indexa la entrada bajo `g` y
+    pop_group(g) invalida todas las del grupo sin recorrer el cache.
+    generation(g) sube con cada pop_group: leerla antes de calcular un valor y
+    pasarla en set(..., generation=...) evita guardar algo que se invalidó
+    mientras se calculaba.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (value, expira_en | None)
+        self._lock = threading.Lock()
+        self._groups = {}            # group -> {keys}
+        self._group_of = {}          # key -> group
+        self._generations = {}       # group -> int
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        if name:
+            _registry[name] = self
+
+    def _delete(self, key):
+        """Saca `key` (con el lock tomado) y la desindexa de su grupo."""
+        item = self._data.pop(key, None)
+        group = self._group_of.pop(key, None)
+        if group is not None:
+            keys = self._groups.get(group)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._groups[group]
+        return item
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._delete(key)
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None, group=None, generation=None):
+        """
+        Guarda `value`; `ttl` (seg.) pisa el TTL por defecto para esta entrada.
+        Con `generation`, no guarda nada si el grupo se invalidó desde entonces.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            if generation is not None and generation != self._generations.get(group, 0):
+                return False
+            self._delete(key)
+            self._data[key] = (value, expires)
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+                self._group_of[key] = group
+            while len(self._data) > self.maxsize:
+                self._delete(next(iter(self._data)))
+                self.evictions += 1
+            return True
+
+    def generation(self, group):
+        with self._lock:
+            return self._generations.get(group, 0)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._delete(key)
+        return default if item is None else item[0]
+
+    def pop_group(self, group):
+        """Invalida todas las entradas de `group`."""
+        with self._lock:
+            self._generations[group] = self._generations.get(group, 0) + 1
+            keys = list(self._groups.get(group, ()))
+            for k in keys:
+                self._delete(k)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def pop_where(self, predicate):
+        """Invalida todas las entradas cuyo (key, value) cumpla `predicate`."""
+        with self._lock:
+            keys = [k for k, (v, _) in self._data.items() if predicate(k, v)]
+            for k in keys:
+                self._delete(k)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._groups.clear()
+            self._group_of.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,169 @@
+# utils/geo.py
+import heapq
+import math
+import threading
+import time
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180.0   # ~111.19 km
+
+# Haversine en SQL sobre e.latitude/e.longitude; se evalúa una sola vez por fila
+# (LATERAL) y solo sobre las filas que sobreviven al bounding box.
+HAVERSINE_SQL = """
+    (2 * 6371 * asin(sqrt(
+        power(sin(radians(e.latitude - %(lat)s) / 2), 2) +
+        cos(radians(%(lat)s)) * cos(radians(e.latitude)) *
+        power(sin(radians(e.longitude - %(lng)s) / 2), 2)
+    )))
+"""
+
+# Expresión que indexa 0002_equipment_geo_index.sql (GiST sobre point(lng, lat))
+POINT_SQL = "point(e.longitude::float8, e.latitude::float8)"
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Caja lat/lng que contiene el círculo (lat, lng, radius_km).
+    Devuelve (lat_min, lat_max, [(lng_min, lng_max), ...]): dos rangos de
+    longitud si cruza el antimeridiano, uno de -180..180 si toca un polo.
+    """
+    dlat = radius_km / KM_PER_DEG_LAT
+    lat_min, lat_max = lat - dlat, lat + dlat
+    if lat_min <= -90 or lat_max >= 90:
+        return max(lat_min, -90.0), min(lat_max, 90.0), [(-180.0, 180.0)]
+
+    # ancho angular máximo en longitud (exacto para un círculo sobre la esfera)
+    dlng = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    lng_min, lng_max = lng - dlng, lng + dlng
+    if lng_min < -180:
+        return lat_min, lat_max, [(lng_min + 360, 180.0), (-180.0, lng_max)]
+    if lng_max > 180:
+        return lat_min, lat_max, [(lng_min, 180.0), (-180.0, lng_max - 360)]
+    return lat_min, lat_max, [(lng_min, lng_max)]
+
+
+def bbox_sql(lat, lng, radius_km, params):
+    """
+    Condición SQL (servible por el índice GiST) para el bounding box.
+    Agrega los parámetros necesarios a `params`.
+    """
+    lat_min, lat_max, lng_ranges = bounding_box(lat, lng, radius_km)
+    boxes = []
+    for i, (lo, hi) in enumerate(lng_ranges):
+        params.update({"bb_lat_min": lat_min, "bb_lat_max": lat_max,
+                       f"bb_lng_min_{i}": lo, f"bb_lng_max_{i}": hi})
+        boxes.append(
+            f"{POINT_SQL} <@ box(point(%(bb_lng_min_{i})s, %(bb_lat_min)s), "
+            f"point(%(bb_lng_max_{i})s, %(bb_lat_max)s))"
+        )
+    return "(" + " OR ".join(boxes) + ")"
+
+
+class GeoGridIndex:
+    """
+    Índice en memoria por grilla de celdas de `cell_deg` grados (tipo geohash)
+    para nearest-N sin radio. Busca en anillos de celdas alrededor del punto
+    hasta que ninguna celda sin visitar pueda tener algo más cerca.
+    """
+
+    def __init__(self, cell_deg=0.5):
+        self.cell_deg = cell_deg
+        self._cells = {}     # (i, j) -> {id: (lat, lng)}
+        self._where = {}     # id -> (i, j)
+        self._lock = threading.RLock()
+        self.built_at = 0.0
+
+    def _cell(self, lat, lng):
+        lat = min(max(lat, -90.0), 90.0 - 1e-9)
+        return (int(math.floor((lat + 90) / self.cell_deg)),
+                int(math.floor((lng + 180) / self.cell_deg)) % self._ncols)
+
+    @property
+    def _ncols(self):
+        return int(math.ceil(360 / self.cell_deg))
+
+    def load(self, rows):
+        """Reemplaza todo el contenido con `rows` = [(id, lat, lng), ...]."""
+        cells, where = {}, {}
+        for oid, lat, lng in rows:
+            c = self._cell(float(lat), float(lng))
+            cells.setdefault(c, {})[oid] = (float(lat), float(lng))
+            where[oid] = c
+        with self._lock:
+            self._cells, self._where = cells, where
+            self.built_at = time.monotonic()
+
+    def insert(self, oid, lat, lng):
+        with self._lock:
+            self.remove(oid)
+            if lat is None or lng is None:
+                return
+            c = self._cell(float(lat), float(lng))
+            self._cells.setdefault(c, {})[oid] = (float(lat), float(lng))
+            self._where[oid] = c
+
+    def remove(self, oid):
+        with self._lock:
+            c = self._where.pop(oid, None)
+            if c is not None:
+                self._cells.get(c, {}).pop(oid, None)
+
+    def __len__(self):
+        return len(self._where)
+
+    def _ring(self, ci, cj, k):
+        ncols = self._ncols
+        if k == 0:
+            yield ci, cj
+            return
+        for di in range(-k, k + 1):
+            i = ci + di
+            if i < 0 or i * self.cell_deg >= 180:
+                continue
+            dj_values = range(-k, k + 1) if abs(di) == k else (-k, k)
+            for dj in dj_values:
+                yield i, (cj + dj) % ncols
+
+    def _ring_bound_km(self, lat, k):
+        """
+        Cota inferior de la distancia desde el punto a cualquier celda de los
+        anillos > k: están a >= k celdas en latitud o en longitud.
+        """
+        delta = math.radians(min(180.0, k * self.cell_deg))
+        by_lat = EARTH_RADIUS_KM * delta
+        # en longitud: d >= 2R·asin(cos(lat_max)·sin(Δλ/2)) para todo punto con |lat| <= lat_max
+        lat_max = min(90.0, abs(lat) + (k + 1) * self.cell_deg)
+        by_lng = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.cos(math.radians(lat_max)) * math.sin(delta / 2)))
+        return min(by_lat, by_lng)
+
+    def nearest(self, lat, lng, n):
+        """[(id, distance_km), ...] de los n más cercanos, ordenados por distancia."""
+        with self._lock:
+            if not self._where:
+                return []
+            ci, cj = self._cell(lat, lng)
+            best = []      # max-heap por distancia: (-dist, id)
+            seen = set()
+            max_k = max(int(math.ceil(180 / self.cell_deg)), self._ncols // 2 + 1)
+            for k in range(0, max_k + 1):
+                for cell in self._ring(ci, cj, k):
+                    if cell in seen:
+                        continue
+                    seen.add(cell)
+                    for oid, (plat, plng) in self._cells.get(cell, {}).items():
+                        d = haversine_km(lat, lng, plat, plng)
+                        if len(best) < n:
+                            heapq.heappush(best, (-d, oid))
+                        elif d < -best[0][0]:
+                            heapq.heapreplace(best, (-d, oid))
+                if len(best) == n and self._ring_bound_km(lat, k) >= -best[0][0]:
+                    break
+            return sorted(((oid, -d) for d, oid in best), key=lambda t: t[1])
@@ -0,0 +1,55 @@
+# utils/intervals.py
+"""
+Aritmética de intervalos semiabiertos [start, end) sobre fechas (o cualquier
+cosa ordenable). Todas las funciones devuelven listas ordenadas y sin solapes.
+"""
+from datetime import timedelta
+
+
+def merge(ranges):
+    """Une rangos que se solapan o se tocan. O(n log n)."""
+    out = []
+    for s, e in sorted(r for r in ranges if r[0] < r[1]):
+        if out and s <= out[-1][1]:
+            if e > out[-1][1]:
+                out[-1][1] = e
+        else:
+            out.append([s, e])
+    return [(s, e) for s, e in out]
+
+
+def clip(ranges, lo, hi):
+    """Recorta a [lo, hi)."""
+    return [(max(s, lo), min(e, hi)) for s, e in ranges if s < hi and e > lo]
+
+
+def subtract(a, b):
+    """a - b, ambos ya mergeados (barrido lineal)."""
+    out, j = [], 0
+    for s, e in a:
+        while j < len(b) and b[j][1] <= s:
+            j += 1
+        k, cur = j, s
+        while k < len(b) and b[k][0] < e:
+            if b[k][0] > cur:
+                out.append((cur, b[k][0]))
+            cur = max(cur, b[k][1])
+            k += 1
+        if cur < e:
+            out.append((cur, e))
+    return out
+
+
+def days(ranges):
+    """Expande a la lista de días (ISO) de cada rango."""
+    out = []
+    for s, e in ranges:
+        d = s
+        while d < e:
+            out.append(d.isoformat())
+            d += timedelta(days=1)
+    return out
+
+
+def as_json(ranges):
+    return [{"start": s.isoformat(), "end": e.isoformat()} for s, e in ranges]
@@ -1,31 +1,119 @@
 # utils/notify.py
+from psycopg2.extras import execute_values
 from db import get_cur
+from utils.schema import registry as schema
+from config import NOTIFY_DEDUPE_WINDOW
 
-def notify_user(user_id: int, ntype: str, title: str, body: str, data: dict | None = None):
-    """Inserta una notificación y (opcional) envía push."""
-    data = data or {}
+# La notificación y su job de envío (outbox) salen en la misma sentencia, dentro
+# de la transacción de quien llama: si el request hace ROLLBACK no queda ninguna.
+# El push lo hace `flask notify-worker` (utils/outbox.py), fuera del request.
+# Con dedupe_key (migración 0012) se saltea lo que ya se mandó al mismo
+# (user_id, type, dedupe_key) dentro de NOTIFY_DEDUPE_WINDOW. Es best-effort:
+# dos requests simultáneos pueden pasar los dos el NOT EXISTS.
+def _insert_sql(dedupe):
+    enqueue = """,
+        job AS (
+            INSERT INTO notification_jobs (notification_id, user_id)
+            SELECT id, user_id FROM n
+        )""" if schema.has_table("notification_jobs") else ""
+    if not dedupe:
+        return f"""
+            WITH v (user_id, type, title, body, data) AS (VALUES %s),
+            n AS (
+                INSERT INTO notifications (user_id, type, title, body, data)
+                SELECT * FROM v
+                RETURNING id, user_id
+            ){enqueue}
+            SELECT id FROM n
+        """
+    return f"""
+        WITH v (user_id, type, title, body, data, dedupe_key) AS (VALUES %s),
+        n AS (
+            INSERT INTO notifications (user_id, type, title, body, data, dedupe_key)
+            SELECT * FROM v
+            WHERE v.dedupe_key IS NULL OR NOT EXISTS (
+                SELECT 1
+                FROM notifications x
+                WHERE x.user_id = v.user_id
+                  AND x.type = v.type
+                  AND x.dedupe_key = v.dedupe_key
+                  AND x.created_at > NOW() - make_interval(secs => {int(NOTIFY_DEDUPE_WINDOW)})
+            )
+            RETURNING id, user_id
+        ){enqueue}
+        SELECT id FROM n
+    """
+
+def notify_user(user_id: int, ntype: str, title: str, body: str, data: dict | None = None,
+                dedupe_key: str | None = None):
+    """Inserta una notificación y encola su push. Devuelve el id (None si se deduplicó)."""
+    ids = notify_many([{"user_id": user_id, "ntype": ntype, "title": title, "body": body,
+                        "data": data, "dedupe_key": dedupe_key}])
+    return ids[0] if ids else None
+
+def notify_users(user_ids, ntype: str, title: str, body: str, data: dict | None = None,
+                 dedupe_key: str | None = None):
+    """Fan-out: el mismo aviso a varios usuarios en un solo INSERT."""
+    return notify_many([{"user_id": uid, "ntype": ntype, "title": title, "body": body,
+                         "data": data, "dedupe_key": dedupe_key}
+                        for uid in dict.fromkeys(user_ids)])
+
+def notify_many(items):
+    """
+    Varias notificaciones en UN INSERT multi-fila. `items`: dicts con
+    user_id, ntype, title, body, data y dedupe_key (estos dos opcionales).
+    Devuelve los ids insertados (sin los deduplicados).
+    """
+    if not items:
+        return []
+    dedupe = schema.has_column("notifications", "dedupe_key")
+    rows, seen = [], set()
+    for it in items:
+        key = it.get("dedupe_key")
+        if key is not None:
+            if (it["user_id"], it["ntype"], key) in seen:
+                continue
+            seen.add((it["user_id"], it["ntype"], key))
+        row = (it["user_id"], it["ntype"], it["title"], it["body"], json_dumps(it.get("data") or {}))
+        rows.append(row + (key,) if dedupe else row)
+    template = "(%s::int, %s::text, %s::text, %s::text, %s::jsonb" + (", %s::text)" if dedupe else ")")
     with get_cur(True) as cur:
-        cur.execute("""
-            INSERT INTO notifications (user_id, type, title, body, data)
-            VALUES (%s, %s, %s, %s, %s::jsonb)
-            RETURNING id
-        """, (user_id, ntype, title, body, json_dumps(data)))
-        nid = cur.fetchone()["id"]
+        ids = [r["id"] for r in execute_values(
+            cur, _insert_sql(dedupe), rows, template=template, page_size=len(rows), fetch=True)]
+
+    _push_without_outbox([(it["user_id"], it["title"], it["body"], it.get("data") or {}) for it in items])
+    return ids
 
-    # (Opcional) push: integra FCM si tenés tokens guardados
-    try:
-        send_push_if_configured(user_id, title, body, data)
-    except Exception:
-        pass
+# ---- No leídas ----
+# notification_counters lo mantienen los triggers de 0014: leerlo es un acceso
+# por PK, sin cache (uno por proceso mostraba el badge viejo en los demás).
+def unread_count(user_id: int) -> int:
+    with get_cur() as cur:
+        if schema.has_table("notification_counters"):
+            cur.execute("SELECT unread FROM notification_counters WHERE user_id = %s", (user_id,))
+        else:
+            cur.execute("SELECT count(*) AS unread FROM notifications WHERE user_id = %s AND read_at IS NULL",
+                        (user_id,))
+        row = cur.fetchone()
+    return row["unread"] if row else 0
 
-    return nid
+def _push_without_outbox(pushes):
+    """Sin la migración 0010 no hay worker: push sincrónico como antes."""
+    if schema.has_table("notification_jobs"):
+        return
+    for user_id, title, body, data in pushes:
+        try:
+            send_push_if_configured(user_id, title, body, data)
+        except Exception:
+            pass
 
 # ---- Helpers ----
 import json
 def json_dumps(d): return json.dumps(d, ensure_ascii=False)
 
 def send_push_if_configured(user_id: int, title: str, body: str, data: dict):
-    """Stub. Integra FCM si ya guardás device tokens por usuario."""
-    # from utils.fcm import send_to_user_devices
-    # send_to_user_devices(user_id=user_id, title=title, body=body, data=data)
-    return
+    """Push a los dispositivos del usuario (utils/push.py). Falla si hay que reintentar."""
+    from utils import push
+    err = push.deliver([(user_id, title, body, data)])[0]
+    if err:
+        raise RuntimeError(err)
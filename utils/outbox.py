@@ -0,0 +1,159 @@
+# utils/outbox.py
+"""
+Worker del outbox de notificaciones (ver sql/migrations/0010_notification_jobs.sql).
+
+Cada vuelta toma hasta `batch` jobs vencidos con FOR UPDATE SKIP LOCKED (varios
+workers no se pisan) y les corre run_at al final del lease; commitea y recién
+ahí manda el lote entero por utils/push.py, sin transacción abierta. Después,
+en una sentencia: borra los enviados y reprograma los fallidos con backoff
+exponencial (o los marca 'dead' al llegar a NOTIFY_MAX_ATTEMPTS). Si el worker
+muere a mitad, el job vuelve a estar vencido cuando termina el lease.
+Los dispositivos que ya respondieron OK quedan en `delivered` (0021) y el
+reintento no se los vuelve a mandar.
+"""
+import logging
+import threading
+from psycopg2.extras import execute_values
+from db import get_cur
+from config import (
+    NOTIFY_WORKER_BATCH, NOTIFY_WORKER_POLL, NOTIFY_JOB_LEASE,
+    NOTIFY_MAX_ATTEMPTS, NOTIFY_BACKOFF_BASE, NOTIFY_BACKOFF_MAX,
+)
+from utils import push
+from utils.schema import registry as schema
+
+logger = logging.getLogger(__name__)
+
+CLAIM_SQL = """
+    WITH due AS (
+        SELECT id
+        FROM notification_jobs
+        WHERE status = 'pending' AND run_at <= NOW()
+        ORDER BY run_at, id
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ),
+    claimed AS (
+        UPDATE notification_jobs j
+           SET attempts = j.attempts + 1,
+               run_at = NOW() + make_interval(secs => %(lease)s)
+          FROM due
+         WHERE j.id = due.id
+        RETURNING j.id, j.notification_id, j.user_id, j.attempts, {delivered}
+    )
+    SELECT c.*, n.title, n.body, n.data
+    FROM claimed c
+    LEFT JOIN notifications n ON n.id = c.notification_id
+    ORDER BY c.id
+"""
+
+# (id, status, segundos hasta el próximo intento, error, dispositivos OK) -> un solo UPDATE
+RESCHEDULE_SQL = """
+    UPDATE notification_jobs j
+       SET status = v.status,
+           run_at = NOW() + make_interval(secs => v.delay),
+           last_error = v.error{delivered}
+      FROM (VALUES %s) AS v(id, status, delay, error, delivered)
+     WHERE j.id = v.id
+"""
+
+
+def _tracks_devices():
+    return schema.has_column("notification_jobs", "delivered")
+
+
+def backoff(attempts):
+    """Segundos hasta el próximo intento después de `attempts` fallidos."""
+    return min(NOTIFY_BACKOFF_BASE * 2 ** (attempts - 1), NOTIFY_BACKOFF_MAX)
+
+
+def claim(limit=NOTIFY_WORKER_BATCH):
+    with get_cur(True) as cur:
+        sql = CLAIM_SQL.replace("{delivered}", "j.delivered" if _tracks_devices() else "'{}'::text[] AS delivered")
+        cur.execute(sql, {"limit": limit, "lease": NOTIFY_JOB_LEASE})
+        return cur.fetchall()
+
+
+def dispatch_once(limit=NOTIFY_WORKER_BATCH):
+    """Una vuelta: claim + push del lote entero (utils/push.py) + cierre. Devuelve contadores."""
+    jobs = claim(limit)
+    stats = {"claimed": len(jobs), "sent": 0, "retried": 0, "dead": 0}
+    # la notificación ya no existe: nada que mandar
+    done = [j["id"] for j in jobs if j["title"] is None]
+    jobs = [j for j in jobs if j["title"] is not None]
+    try:
+        results = push.deliver_tracked([(j["user_id"], j["title"], j["body"], j["data"] or {}) for j in jobs],
+                                       skip=[set(j["delivered"] or ()) for j in jobs])
+    except Exception as e:
+        logger.exception("push delivery failed")
+        results = [(str(e) or type(e).__name__, [])] * len(jobs)
+
+    failed = []
+    for job, (err, sent) in zip(jobs, results):
+        if err is None:
+            done.append(job["id"])
+            stats["sent"] += 1
+            continue
+        logger.warning("notification job %s failed (attempt %s): %s", job["id"], job["attempts"], err)
+        if job["attempts"] >= NOTIFY_MAX_ATTEMPTS:
+            failed.append((job["id"], "dead", 0, err[:500], sent))
+            stats["dead"] += 1
+        else:
+            failed.append((job["id"], "pending", backoff(job["attempts"]), err[:500], sent))
+            stats["retried"] += 1
+
+    if done or failed:
+        with get_cur(True) as cur:
+            if done:
+                cur.execute("DELETE FROM notification_jobs WHERE id = ANY(%s)", (done,))
+            if failed:
+                sql = RESCHEDULE_SQL.replace(
+                    "{delivered}", ",\n           delivered = j.delivered || v.delivered" if _tracks_devices() else "")
+                execute_values(cur, sql, failed,
+                               template="(%s::bigint, %s, %s::float8, %s, %s::text[])", page_size=len(failed))
+    return stats
+
+
+def stats():
+    """
+    Estado de la cola (para /api/health/push): el envío corre en notify-worker,
+    así que lo que se puede ver desde cualquier proceso está en notification_jobs.
+    """
+    if not schema.has_table("notification_jobs"):
+        return None
+    with get_cur() as cur:
+        cur.execute("""
+            SELECT count(*) FILTER (WHERE status = 'pending')                       AS pending,
+                   count(*) FILTER (WHERE status = 'pending' AND run_at <= NOW())   AS due,
+                   count(*) FILTER (WHERE status = 'pending' AND attempts > 0)      AS retrying,
+                   count(*) FILTER (WHERE status = 'dead')                          AS dead,
+                   COALESCE(max(attempts) FILTER (WHERE status = 'pending'), 0)     AS max_attempts,
+                   EXTRACT(EPOCH FROM NOW() - min(run_at) FILTER (
+                       WHERE status = 'pending' AND run_at <= NOW()))::float        AS oldest_due_s
+            FROM notification_jobs
+        """)
+        return dict(cur.fetchone())
+
+
+def drain(limit=NOTIFY_WORKER_BATCH):
+    """Procesa todo lo vencido y vuelve (modo cron / tests)."""
+    total = {"claimed": 0, "sent": 0, "retried": 0, "dead": 0}
+    while True:
+        stats = dispatch_once(limit)
+        for k in total:
+            total[k] += stats[k]
+        if stats["claimed"] < limit:
+            return total
+
+
+def run(limit=NOTIFY_WORKER_BATCH, poll=NOTIFY_WORKER_POLL, stop=None):
+    """Loop del worker: si la vuelta vino vacía, espera `poll` segundos."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            stats = dispatch_once(limit)
+        except Exception:
+            logger.exception("notification worker iteration failed")
+            stats = {"claimed": 0}
+        if stats["claimed"] < limit:
+            stop.wait(poll)
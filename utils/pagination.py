@@ -0,0 +1,110 @@
+# utils/pagination.py
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# tipo SQL de la key -> tipos JSON aceptados en el cursor (si no, 400 y no un error de la base)
+_CURSOR_TYPES = {"int": (int,), "float8": (int, float), "timestamp": (str,), "date": (str,)}
+
+
+def encode_cursor(values: dict) -> str:
+    """dict -> token opaco (base64url de JSON). Fechas en ISO."""
+    def default(o):
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        raise TypeError(f"not serializable: {type(o).__name__}")
+    raw = json.dumps(values, default=default, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, dict):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+class Keyset:
+    """
+    Paginación por keyset sobre un ORDER BY fijo. `keys` es una lista de
+    (expresión SQL, 'ASC'|'DESC', nombre de la columna en el SELECT, tipo SQL);
+    la última key tiene que ser única (el id) para que el orden sea total.
+
+    El cursor guarda los valores de la última fila devuelta: la página
+    siguiente es "todo lo que viene después" y no depende de cuántas filas
+    hubo antes (a diferencia de OFFSET).
+    """
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def order_sql(self) -> str:
+        return " ORDER BY " + ", ".join(f"{expr} {d}" for expr, d, _, _ in self.keys) + " "
+
+    def where_sql(self, cursor: dict, params: dict, prefix="c_") -> str:
+        """Condición 'después del cursor' con placeholders %(c_<key>)s; agrega los valores a `params`."""
+        def ph(name, value):
+            params[prefix + name] = value
+            return f"%({prefix}{name})s"
+        return self._where(cursor, ph)
+
+    def where_args(self, cursor: dict):
+        """Igual que where_sql pero con placeholders posicionales: (sql, [valores])."""
+        args = []
+        def ph(name, value):
+            args.append(value)
+            return "%s"
+        return self._where(cursor, ph), args
+
+    def _where(self, cursor, ph):
+        names = [name for _, _, name, _ in self.keys]
+        if set(cursor) != set(names):
+            raise InvalidCursor("Invalid cursor")
+        for _, _, name, sqltype in self.keys:
+            v = cursor[name]
+            if isinstance(v, bool) or not isinstance(v, _CURSOR_TYPES.get(sqltype, (str, int, float))):
+                raise InvalidCursor("Invalid cursor")
+            if sqltype in ("timestamp", "date"):
+                try:
+                    (datetime if sqltype == "timestamp" else date).fromisoformat(v)
+                except ValueError:
+                    raise InvalidCursor("Invalid cursor")
+        exprs = [expr for expr, _, _, _ in self.keys]
+        dirs = {d for _, d, _, _ in self.keys}
+
+        def val(i):
+            _, _, name, sqltype = self.keys[i]
+            return f"{ph(name, cursor[name])}::{sqltype}"
+
+        if len(dirs) == 1:
+            # mismo sentido en todas: comparación de filas (la sirve un btree compuesto)
+            op = "<" if dirs == {"DESC"} else ">"
+            vals = [val(i) for i in range(len(self.keys))]
+            return f"({', '.join(exprs)}) {op} ({', '.join(vals)})"
+
+        # sentidos mezclados: (k1 > v1) OR (k1 = v1 AND k2 < v2) OR ...
+        ors = []
+        for i, (expr, d, _, _) in enumerate(self.keys):
+            eqs = [f"{exprs[j]} = {val(j)}" for j in range(i)]
+            eqs.append(f"{expr} {'<' if d == 'DESC' else '>'} {val(i)}")
+            ors.append("(" + " AND ".join(eqs) + ")")
+        return "(" + " OR ".join(ors) + ")"
+
+    def cursor_for(self, row) -> str:
+        return encode_cursor({name: row[name] for _, _, name, _ in self.keys})
+
+    def page(self, rows, limit):
+        """Recibe hasta limit+1 filas -> {"items", "next_cursor"}."""
+        items = rows[:limit]
+        next_cursor = self.cursor_for(items[-1]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
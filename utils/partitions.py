@@ -0,0 +1,258 @@
+# utils/partitions.py
+"""
+Mantenimiento de las particiones mensuales de notifications
+(ver sql/migrations/0016_notifications_partitioned.sql).
+
+ensure() crea los meses que vienen. split_legacy() parte la partición legacy de
+0016 (toda la historia previa) en meses: copia por tandas a un padre aparte
+(0025) y los cambia en una transacción corta. compact() aplica la retención en
+tres pasos, cada tanda en su propia transacción (se puede cortar y volver a correr):
+  1. no leídas más viejas que NOTIFY_RETENTION_UNREAD_DAYS: DELETE por lotes a
+     través del padre, así los triggers de 0014 bajan los contadores;
+  2. particiones enteras por debajo del corte de leídas y sin no leídas: se
+     copian al archivo (modo "archive"), DETACH y DROP. No se borra fila por
+     fila y los contadores no cambian (no había no leídas);
+  3. el resto de las leídas vencidas (el mes que cruza el corte, la default,
+     particiones con alguna no leída todavía vigente): DELETE por lotes.
+"""
+import logging
+import re
+from datetime import datetime
+import psycopg2
+from psycopg2 import sql
+from db import get_cur
+from config import (
+    NOTIFY_PARTITIONS_AHEAD, NOTIFY_RETENTION_DAYS, NOTIFY_RETENTION_UNREAD_DAYS,
+    NOTIFY_RETENTION_MODE, NOTIFY_RETENTION_BATCH,
+)
+
+logger = logging.getLogger(__name__)
+
+MODES = ("archive", "drop")
+
+_COLUMNS = "id, user_id, type, title, body, data, created_at, read_at, dedupe_key"
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+LEGACY = "notifications_p_legacy"
+SPLIT = "notifications_legacy_split"
+
+
+def ensure(cur, ahead=NOTIFY_PARTITIONS_AHEAD):
+    """Crea las particiones del mes actual hasta `ahead` meses adelante. Devuelve cuántas."""
+    cur.execute("SELECT notifications_ensure_partitions(%s) AS n", (ahead,))
+    return cur.fetchone()["n"]
+
+
+def _bound(v):
+    return None if v in ("MINVALUE", "MAXVALUE") else datetime.fromisoformat(v.strip("'"))
+
+def partitions(cur, parent="notifications"):
+    """Particiones de `parent`: [{"name", "bound", "lo", "hi", "default"}]; lo/hi None = MINVALUE/MAXVALUE."""
+    cur.execute("""
+        SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+    """, (parent,))
+    out = []
+    for r in cur.fetchall():
+        m = _BOUND_RE.search(r["bound"])
+        lo, hi = (_bound(m.group(1)), _bound(m.group(2))) if m else (None, None)
+        out.append({"name": r["name"], "bound": r["bound"], "lo": lo, "hi": hi, "default": m is None})
+    return out
+
+
+def _split_months(cur, hi):
+    """Crea en SPLIT un mes por cada mes de la legacy (el primero desde MINVALUE), con su CHECK."""
+    cur.execute("""
+        SELECT m::timestamp AS lo, (m + INTERVAL '1 month')::timestamp AS hi
+        FROM generate_series(
+            date_trunc('month', LEAST((SELECT min(created_at) FROM notifications_p_legacy),
+                                      %(hi)s - INTERVAL '1 month')),
+            %(hi)s - INTERVAL '1 month',
+            INTERVAL '1 month') m
+        ORDER BY m
+    """, {"hi": hi})
+    months = cur.fetchall()
+    for i, m in enumerate(months):
+        part = sql.Identifier(f"notifications_p{m['lo']:%Y%m}")
+        lo = sql.SQL("MINVALUE") if i == 0 else sql.Literal(m["lo"])
+        cur.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})").format(
+            part, sql.Identifier(SPLIT), lo, sql.Literal(m["hi"])))
+        # el CHECK sobrevive al DETACH: el ATTACH a notifications no escanea
+        check = sql.SQL("created_at < {}").format(sql.Literal(m["hi"])) if i == 0 else \
+            sql.SQL("created_at >= {} AND created_at < {}").format(sql.Literal(m["lo"]), sql.Literal(m["hi"]))
+        cur.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} CHECK ({})").format(
+            part, sql.Identifier(f"notifications_p{m['lo']:%Y%m}_bound"), check))
+    return len(months)
+
+
+def _copy_legacy(cur, batch=None):
+    """Copia a SPLIT la próxima tanda de la legacy (todo lo que falta si batch es None). Devuelve filas."""
+    cur.execute("SELECT copied_id FROM notifications_legacy_split_state FOR UPDATE")
+    after = cur.fetchone()["copied_id"]
+    cur.execute(f"""
+        WITH x AS (
+            SELECT {_COLUMNS} FROM notifications_p_legacy
+            WHERE id > %(after)s
+            ORDER BY id
+            LIMIT %(batch)s
+        ),
+        ins AS (
+            INSERT INTO notifications_legacy_split ({_COLUMNS})
+            SELECT {_COLUMNS} FROM x
+        )
+        SELECT count(*) AS n, max(id) AS last FROM x
+    """, {"after": after, "batch": batch})
+    r = cur.fetchone()
+    if r["n"]:
+        cur.execute("UPDATE notifications_legacy_split_state SET copied_id = %s", (r["last"],))
+    return r["n"]
+
+
+def _swap_legacy():
+    """Pone al día SPLIT y cambia la legacy por sus meses. Devuelve (filas re-copiadas, meses)."""
+    with get_cur(True) as cur:
+        cur.execute("SET LOCAL lock_timeout = '5s'")
+        # se sigue leyendo; las escrituras a la legacy esperan al COMMIT
+        cur.execute("LOCK TABLE notifications_p_legacy IN EXCLUSIVE MODE")
+        _copy_legacy(cur)
+        # lo que cambió después de copiarse: se saca y se vuelve a copiar como está ahora
+        cur.execute("""
+            DELETE FROM notifications_legacy_split s
+            USING notifications_legacy_changes c
+            WHERE s.id = c.id AND s.created_at = c.created_at
+        """)
+        cur.execute(f"""
+            INSERT INTO notifications_legacy_split ({_COLUMNS})
+            SELECT {_COLUMNS} FROM notifications_p_legacy l
+            WHERE (l.id, l.created_at) IN (SELECT id, created_at FROM notifications_legacy_changes)
+        """)
+        resynced = cur.rowcount
+        months = partitions(cur, SPLIT)
+        cur.execute("ALTER TABLE notifications DETACH PARTITION notifications_p_legacy")
+        for p in months:
+            part = sql.Identifier(p["name"])
+            cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(sql.Identifier(SPLIT), part))
+            cur.execute(sql.SQL("ALTER TABLE notifications ATTACH PARTITION {} {}").format(
+                part, sql.SQL(p["bound"])))
+        cur.execute("DROP TABLE notifications_p_legacy")
+        cur.execute("TRUNCATE notifications_legacy_changes")
+        cur.execute("UPDATE notifications_legacy_split_state SET copied_id = 0")
+    return resynced, len(months)
+
+
+def split_legacy(batch=NOTIFY_RETENTION_BATCH):
+    """Parte la legacy de 0016 en meses (ver 0025). Se puede cortar y volver a correr.
+    Devuelve contadores, o None si ya no hay legacy."""
+    with get_cur(True) as cur:
+        legacy = next((p for p in partitions(cur) if p["name"] == LEGACY), None)
+        if legacy is None:
+            return None
+        if not partitions(cur, SPLIT):
+            _split_months(cur, legacy["hi"])
+
+    stats = {"copied": 0, "resynced": 0, "partitions": 0}
+    while True:
+        with get_cur(True) as cur:
+            n = _copy_legacy(cur, batch)
+        stats["copied"] += n
+        if n < batch:
+            break
+    try:
+        stats["resynced"], stats["partitions"] = _swap_legacy()
+    except psycopg2.Error:
+        # lock_timeout u otro proceso en el medio: lo copiado queda, mañana se reintenta
+        logger.exception("could not swap %s for monthly partitions", LEGACY)
+    return stats
+
+
+def _delete_batches(where, params, mode, batch):
+    """Borra (y archiva) lo que cumple `where` en tandas de `batch`, avanzando por id."""
+    archive = f""",
+        arch AS (
+            INSERT INTO notifications_archive ({_COLUMNS})
+            SELECT {_COLUMNS} FROM gone
+        )""" if mode == "archive" else ""
+    q = f"""
+        WITH x AS (
+            SELECT id, created_at
+            FROM notifications
+            WHERE {where} AND id > %(after)s
+            ORDER BY id
+            LIMIT %(batch)s
+        ),
+        gone AS (
+            DELETE FROM notifications n
+            USING x
+            WHERE n.id = x.id AND n.created_at = x.created_at
+            RETURNING n.*
+        ){archive}
+        SELECT count(*) AS n, max(id) AS last FROM x
+    """
+    total, after = 0, 0
+    while True:
+        with get_cur(True) as cur:
+            cur.execute(q, {**params, "after": after, "batch": batch})
+            r = cur.fetchone()
+        total += r["n"]
+        if r["n"] < batch:
+            return total
+        after = r["last"]
+
+
+def _drop_partition(name, mode):
+    """Archiva + DETACH + DROP si la partición no tiene no leídas. Devuelve filas archivadas o None."""
+    part = sql.Identifier(name)
+    with get_cur(True) as cur:
+        # no esperar detrás de queries largas: mañana se reintenta
+        cur.execute("SET LOCAL lock_timeout = '5s'")
+        cur.execute(sql.SQL("LOCK TABLE {} IN EXCLUSIVE MODE").format(part))
+        cur.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE read_at IS NULL) AS unread").format(part))
+        if cur.fetchone()["unread"]:
+            return None
+        rows = 0
+        if mode == "archive":
+            cur.execute(sql.SQL("INSERT INTO notifications_archive ({cols}) SELECT {cols} FROM {part}").format(
+                cols=sql.SQL(_COLUMNS), part=part))
+            rows = cur.rowcount
+        cur.execute(sql.SQL("ALTER TABLE notifications DETACH PARTITION {}").format(part))
+        cur.execute(sql.SQL("DROP TABLE {}").format(part))
+    return rows
+
+
+def compact(read_days=NOTIFY_RETENTION_DAYS, unread_days=NOTIFY_RETENTION_UNREAD_DAYS,
+            mode=NOTIFY_RETENTION_MODE, batch=NOTIFY_RETENTION_BATCH):
+    """Aplica la retención (ver docstring del módulo). Devuelve contadores."""
+    if mode not in MODES:
+        raise ValueError(f"NOTIFY_RETENTION_MODE must be one of {MODES}")
+    with get_cur() as cur:
+        cur.execute("""
+            SELECT LOCALTIMESTAMP - make_interval(days => %s) AS read_cutoff,
+                   LOCALTIMESTAMP - make_interval(days => %s) AS unread_cutoff
+        """, (read_days, unread_days))
+        params = cur.fetchone()
+        parts = partitions(cur)
+
+    stats = {"mode": mode, "unread_expired": 0, "partitions_dropped": 0,
+             "partition_rows_archived": 0, "read_expired": 0}
+    stats["unread_expired"] = _delete_batches(
+        "read_at IS NULL AND created_at < %(unread_cutoff)s", params, mode, batch)
+
+    for p in parts:
+        if p["default"] or p["hi"] is None or p["hi"] > params["read_cutoff"]:
+            continue
+        try:
+            rows = _drop_partition(p["name"], mode)
+        except psycopg2.Error:
+            logger.exception("could not drop notifications partition %s", p["name"])
+            continue
+        if rows is not None:
+            stats["partitions_dropped"] += 1
+            stats["partition_rows_archived"] += rows
+
+    stats["read_expired"] = _delete_batches(
+        "read_at IS NOT NULL AND created_at < %(read_cutoff)s", params, mode, batch)
+    return stats
@@ -0,0 +1,326 @@
+# utils/push.py
+"""
+Envío de push a los dispositivos registrados (device_tokens, migración 0011).
+
+deliver() recibe un lote de notificaciones, busca TODOS los tokens de esos
+usuarios en una query, arma los mensajes, los agrupa por provider en lotes del
+tamaño que acepta cada uno y los manda en un pool acotado de threads
+(PUSH_WORKERS). Cada provider reusa su conexión HTTP por thread. Los tokens que
+el provider rechaza como inválidos se borran en un solo DELETE al final.
+
+Providers: "fake" (en memoria, para tests y desarrollo) y "fcm" (HTTP v1;
+necesita google-auth). Se eligen con PUSH_PROVIDERS y se pueden registrar
+otros con register_provider().
+"""
+import abc
+import http.client
+import json
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from db import get_cur
+from config import PUSH_PROVIDERS, PUSH_WORKERS, PUSH_TIMEOUT, FCM_PROJECT_ID, FCM_CREDENTIALS_FILE
+from utils.schema import registry as schema
+
+logger = logging.getLogger(__name__)
+
+PushMessage = namedtuple("PushMessage", "token title body data")
+
+# Resultado por mensaje
+OK, INVALID, RETRY = "ok", "invalid", "retry"
+
+
+class Provider(abc.ABC):
+    """Base: send_batch(mensajes) -> lista paralela de OK | INVALID | RETRY."""
+    name = None
+    max_batch = 100
+
+    @abc.abstractmethod
+    def send_batch(self, messages):
+        ...
+
+
+class FakeProvider(Provider):
+    """
+    Provider local: guarda lo "enviado" en memoria. Los tokens que empiezan con
+    "invalid" vuelven INVALID; fail_next > 0 hace fallar (RETRY) los próximos envíos.
+    """
+    name = "fake"
+    max_batch = 500
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = []
+        self.fail_next = 0
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        out = []
+        with self._lock:
+            for m in messages:
+                if m.token.startswith("invalid"):
+                    out.append(INVALID)
+                elif self.fail_next > 0:
+                    self.fail_next -= 1
+                    out.append(RETRY)
+                else:
+                    self.sent.append(m)
+                    out.append(OK)
+        return out
+
+
+class FCMProvider(Provider):
+    """
+    Firebase Cloud Messaging, API HTTP v1 (un POST por mensaje). El lote se
+    manda por una conexión keep-alive propia de cada thread del pool.
+    """
+    name = "fcm"
+    max_batch = 500
+    host = "fcm.googleapis.com"
+    scopes = ["https://www.googleapis.com/auth/firebase.messaging"]
+
+    def __init__(self, project_id=FCM_PROJECT_ID, credentials_file=FCM_CREDENTIALS_FILE, timeout=PUSH_TIMEOUT):
+        try:
+            from google.oauth2 import service_account
+            from google.auth.transport.requests import Request
+        except ImportError:
+            raise RuntimeError("PUSH_PROVIDERS=fcm necesita google-auth (pip install google-auth requests)")
+        if not project_id or not credentials_file:
+            raise RuntimeError("PUSH_PROVIDERS=fcm necesita FCM_PROJECT_ID y FCM_CREDENTIALS_FILE")
+        self._creds = service_account.Credentials.from_service_account_file(credentials_file, scopes=self.scopes)
+        self._auth_request = Request()
+        self._path = f"/v1/projects/{project_id}/messages:send"
+        self._timeout = timeout
+        self._creds_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _access_token(self):
+        with self._creds_lock:
+            if not self._creds.valid:
+                self._creds.refresh(self._auth_request)
+            return self._creds.token
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPSConnection(self.host, timeout=self._timeout)
+        return conn
+
+    def _drop_conn(self):
+        conn, self._local.conn = getattr(self._local, "conn", None), None
+        if conn is not None:
+            conn.close()
+
+    def send_batch(self, messages):
+        headers = {"Authorization": "Bearer " + self._access_token(),
+                   "Content-Type": "application/json; charset=UTF-8"}
+        out = []
+        for m in messages:
+            payload = json.dumps({"message": {
+                "token": m.token,
+                "notification": {"title": m.title or "", "body": m.body or ""},
+                "data": {k: str(v) for k, v in (m.data or {}).items()},   # FCM: data solo strings
+            }}, ensure_ascii=False).encode()
+            try:
+                conn = self._conn()
+                conn.request("POST", self._path, payload, headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                logger.warning("fcm: connection error: %s", e)
+                self._drop_conn()
+                out.append(RETRY)
+                continue
+            if resp.status == 200:
+                out.append(OK)
+            elif resp.status == 404 or b"UNREGISTERED" in body or b"registration token" in body:
+                out.append(INVALID)
+            else:
+                out.append(RETRY)
+        return out
+
+
+_factories = {"fake": FakeProvider, "fcm": FCMProvider}
+
+def register_provider(name, factory):
+    """Agrega un provider (factory sin argumentos -> Provider)."""
+    _factories[name] = factory
+
+
+class Metrics:
+    """Contadores + latencia de los últimos lotes (para throughput y p50/p95)."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {"notifications": 0, "messages": 0, "batches": 0,
+                             "sent": 0, "invalid": 0, "retry": 0, "pruned": 0}
+            self.busy_seconds = 0.0
+            self._latencies.clear()
+
+    def add(self, **counts):
+        with self._lock:
+            for k, v in counts.items():
+                self.counters[k] += v
+
+    def batch(self, seconds):
+        with self._lock:
+            self.counters["batches"] += 1
+            self._latencies.append(seconds)
+
+    def busy(self, seconds):
+        with self._lock:
+            self.busy_seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            lat = sorted(self._latencies)
+            pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 2) if lat else None
+            return {
+                **self.counters,
+                "sent_per_s": round(self.counters["sent"] / self.busy_seconds, 1) if self.busy_seconds else None,
+                "batch_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+            }
+
+
+class PushSender:
+    def __init__(self, providers, workers=PUSH_WORKERS):
+        self.providers = {p.name: p for p in providers}
+        self.metrics = Metrics()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="push") if providers else None
+
+    def _tokens(self, user_ids):
+        with get_cur() as cur:
+            cur.execute("""
+                SELECT user_id, provider, token
+                FROM device_tokens
+                WHERE user_id = ANY(%s) AND provider = ANY(%s)
+            """, (list(user_ids), list(self.providers)))
+            by_user = {}
+            for r in cur.fetchall():
+                by_user.setdefault(r["user_id"], []).append((r["provider"], r["token"]))
+        return by_user
+
+    def _send(self, provider, chunk):
+        t0 = time.monotonic()
+        try:
+            results = provider.send_batch([m for _, m in chunk])
+        except Exception as e:
+            logger.warning("push: %s batch failed: %s", provider.name, e)
+            results = [RETRY] * len(chunk)
+        self.metrics.batch(time.monotonic() - t0)
+        return results
+
+    def deliver(self, notifications):
+        """
+        notifications: [(user_id, title, body, data)]. Devuelve una lista
+        paralela: None si quedó entregada (o no hay dispositivos) o el motivo
+        por el que hay que reintentarla.
+        """
+        return [err for err, _ in self.deliver_tracked(notifications)]
+
+    def deliver_tracked(self, notifications, skip=None):
+        """
+        Como deliver, pero por dispositivo: `skip` (lista paralela de sets de
+        device_key) son los que ya recibieron la notificación en un intento
+        anterior y no se vuelven a mandar. Devuelve [(error, [device_key OK])].
+        """
+        skip = skip or [()] * len(notifications)
+        errors = [None] * len(notifications)
+        sent = [[] for _ in notifications]
+        if not notifications or not self.providers or not schema.has_table("device_tokens"):
+            return list(zip(errors, sent))
+        t0 = time.monotonic()
+        tokens = self._tokens({n[0] for n in notifications})
+
+        # provider -> [(índice de la notificación, mensaje)]
+        grouped = {}
+        for i, (user_id, title, body, data) in enumerate(notifications):
+            for provider, token in tokens.get(user_id, ()):
+                if device_key(provider, token) in skip[i]:
+                    continue
+                grouped.setdefault(provider, []).append((i, PushMessage(token, title, body, data or {})))
+
+        futures = []
+        for name, items in grouped.items():
+            provider = self.providers[name]
+            for k in range(0, len(items), provider.max_batch):
+                chunk = items[k:k + provider.max_batch]
+                futures.append((name, chunk, self._pool.submit(self._send, provider, chunk)))
+
+        dead, counts = [], {OK: 0, INVALID: 0, RETRY: 0}
+        for name, chunk, fut in futures:
+            for (i, msg), res in zip(chunk, fut.result()):
+                counts[res] += 1
+                if res == OK:
+                    sent[i].append(device_key(name, msg.token))
+                elif res == INVALID:
+                    dead.append((name, msg.token))
+                elif res == RETRY:
+                    errors[i] = f"{name}: delivery failed"
+
+        pruned = prune(dead) if dead else 0
+        self.metrics.add(notifications=len(notifications), messages=sum(counts.values()),
+                         sent=counts[OK], invalid=counts[INVALID], retry=counts[RETRY], pruned=pruned)
+        self.metrics.busy(time.monotonic() - t0)
+        return list(zip(errors, sent))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+
+def device_key(provider, token):
+    """Identifica un dispositivo en notification_jobs.delivered."""
+    return f"{provider}:{token}"
+
+
+def prune(dead):
+    """Borra los tokens (provider, token) que el provider dio por muertos."""
+    with get_cur(True) as cur:
+        cur.execute("""
+            DELETE FROM device_tokens d
+            USING unnest(%s::text[], %s::text[]) AS x(provider, token)
+            WHERE d.provider = x.provider AND d.token = x.token
+        """, ([p for p, _ in dead], [t for _, t in dead]))
+        return cur.rowcount
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+def get_sender():
+    """Sender del proceso, armado lazy desde PUSH_PROVIDERS (vacío = sin push)."""
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                names = [n.strip() for n in PUSH_PROVIDERS.split(",") if n.strip()]
+                _sender = PushSender([_factories[n]() for n in names])
+    return _sender
+
+def set_sender(sender):
+    """Reemplaza el sender del proceso (tests: PushSender([FakeProvider()]))."""
+    global _sender
+    with _sender_lock:
+        old, _sender = _sender, sender
+    if old is not None and old is not sender:
+        old.close()
+
+def deliver(notifications):
+    return get_sender().deliver(notifications)
+
+def deliver_tracked(notifications, skip=None):
+    return get_sender().deliver_tracked(notifications, skip)
+
+def stats():
+    """Métricas del sender de ESTE proceso (las de la cola: outbox.stats)."""
+    return get_sender().metrics.snapshot()
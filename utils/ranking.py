@@ -0,0 +1,188 @@
+# utils/ranking.py
+"""
+Ranking del feed de trips (GET /api/trips?sort=recommended).
+
+Después de traer los candidatos (los más nuevos que pasan los filtros y el
+usuario no vio) se puntúan todos juntos con NumPy: una columna por señal,
+normalizada a 0..1, y el score es el producto con TRIP_RANK_WEIGHTS.
+
+  sport     fracción de los deportes del trip que el usuario practica (user_sports)
+  budget    cercanía del presupuesto pedido (?budget=) al rango del trip
+  date      cercanía de start_date a la fecha pedida (?start_date=) o a hoy
+  distance  1 / (1 + km / TRIP_RANK_DISTANCE_KM) desde ?lat=&lng=
+  rating    rating del creador, suavizado hacia RATING_PRIOR si tiene pocas reviews
+  seats     lugares libres / max_people
+  recency   antigüedad del trip (desempate suave a favor de lo nuevo)
+
+Si al trip le falta el dato la señal vale 0.5; si le falta al request (sin
+lat/lng, sin budget) la columna queda en 0 para todos y no mueve el orden.
+
+Budget adapta cuántos candidatos se traen para que la etapa completa (query +
+score) quede dentro de TRIP_RANK_BUDGET_MS.
+"""
+import threading
+from collections import deque, namedtuple
+from datetime import date, datetime
+from operator import itemgetter
+import numpy as np
+from utils.geo import EARTH_RADIUS_KM
+from config import (
+    TRIP_RANK_WEIGHTS, TRIP_RANK_BUDGET_MS, TRIP_RANK_CANDIDATES,
+    TRIP_RANK_DISTANCE_KM, TRIP_RANK_DATE_DAYS,
+)
+
+FEATURES = ("sport", "budget", "date", "distance", "rating", "seats", "recency")
+
+RATING_PRIOR, RATING_PRIOR_REVIEWS = 3.5, 3
+RECENCY_DAYS = 30.0
+NEUTRAL = 0.5
+
+
+def parse_weights(spec):
+    """"sport=3,budget=1,..." -> array en el orden de FEATURES (las que faltan valen 0)."""
+    w = dict.fromkeys(FEATURES, 0.0)
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in w:
+            raise ValueError(f"TRIP_RANK_WEIGHTS: unknown feature {name!r} (valid: {', '.join(FEATURES)})")
+        w[name] = float(value)
+    return np.array([w[f] for f in FEATURES])
+
+WEIGHTS = parse_weights(TRIP_RANK_WEIGHTS)
+
+
+# Lo que aporta el request: deportes del usuario (en minúscula), presupuesto
+# objetivo, fecha objetivo y ubicación (None = sin dato)
+Context = namedtuple("Context", "sports budget target_date lat lng")
+
+def load_context(cur, user_id, budget=None, target_date=None, lat=None, lng=None):
+    cur.execute("""
+        SELECT lower(s.name) AS name
+        FROM user_sports us
+        JOIN sports s ON s.id = us.sport_id
+        WHERE us.user_id = %s
+    """, (user_id,))
+    sports = frozenset(r["name"] for r in cur.fetchall())
+    return Context(sports, budget, target_date or date.today(), lat, lng)
+
+
+def _col(rows, key):
+    """Columna numérica de `rows` (None -> NaN)."""
+    return np.array(list(map(itemgetter(key), rows)), dtype=np.float64)
+
+def _when(rows, key, conv):
+    """Columna de fechas como número (`conv`: toordinal o timestamp); None -> NaN."""
+    return np.array([np.nan if v is None else conv(v) for v in map(itemgetter(key), rows)])
+
+def _inverse(x, scale):
+    """1 / (1 + x/scale): 1 en 0, 0.5 en `scale`, tiende a 0."""
+    return 1.0 / (1.0 + x / scale)
+
+
+def features(rows, ctx, now=None):
+    """Matriz (len(rows), len(FEATURES)) con las señales en 0..1."""
+    n = len(rows)
+    now = now or datetime.now()
+    F = np.zeros((n, len(FEATURES)))
+    if not n:
+        return F
+
+    # sport: deportes del trip (jsonb array de strings) que el usuario practica
+    if ctx.sports:
+        names = [[str(s).strip().lower() for s in (r.get("sports") or [])] for r in rows]
+        lengths = np.fromiter((len(x) for x in names), dtype=np.int64, count=n)
+        hits = np.fromiter((s in ctx.sports for x in names for s in x), dtype=np.float64, count=int(lengths.sum()))
+        per_trip = np.bincount(np.repeat(np.arange(n), lengths), weights=hits, minlength=n)
+        F[:, 0] = np.where(lengths > 0, per_trip / np.maximum(lengths, 1), NEUTRAL)
+
+    # budget: distancia del presupuesto pedido al rango [budget_min, budget_max]
+    if ctx.budget:
+        lo, hi = _col(rows, "budget_min"), _col(rows, "budget_max")
+        gap = np.fmax(np.fmax(np.nan_to_num(lo, nan=-np.inf) - ctx.budget,
+                              ctx.budget - np.nan_to_num(hi, nan=np.inf)), 0.0)
+        F[:, 1] = np.where(np.isnan(lo) & np.isnan(hi), NEUTRAL, _inverse(gap, max(ctx.budget, 1)))
+
+    # date: días entre start_date y la fecha objetivo
+    start = _when(rows, "start_date", date.toordinal)
+    F[:, 2] = np.where(np.isnan(start), NEUTRAL,
+                       _inverse(np.abs(np.nan_to_num(start) - ctx.target_date.toordinal()), TRIP_RANK_DATE_DAYS))
+
+    # distance: haversine desde la ubicación del request
+    if ctx.lat is not None and ctx.lng is not None:
+        lat, lng = np.radians(_col(rows, "latitude")), np.radians(_col(rows, "longitude"))
+        p0, l0 = np.radians(ctx.lat), np.radians(ctx.lng)
+        a = np.sin((lat - p0) / 2) ** 2 + np.cos(p0) * np.cos(lat) * np.sin((lng - l0) / 2) ** 2
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+        F[:, 3] = np.where(np.isnan(km), NEUTRAL, _inverse(np.nan_to_num(km), TRIP_RANK_DISTANCE_KM))
+
+    # rating: promedio bayesiano (pocas reviews -> cerca de RATING_PRIOR)
+    rating = np.nan_to_num(_col(rows, "creator_rating"))
+    reviews = np.nan_to_num(_col(rows, "creator_reviews"))
+    F[:, 4] = (rating * reviews + RATING_PRIOR * RATING_PRIOR_REVIEWS) / (reviews + RATING_PRIOR_REVIEWS) / 5.0
+
+    # seats: lugares libres sobre el total
+    max_people = _col(rows, "max_people")
+    free = max_people - _col(rows, "current_people")
+    F[:, 5] = np.clip(np.where(max_people > 0, free / np.where(max_people > 0, max_people, 1), 0.0), 0.0, 1.0)
+
+    # recency: días desde created_at
+    created = _when(rows, "created_at", datetime.timestamp)
+    age_days = np.clip((now.timestamp() - created) / 86400.0, 0.0, None)
+    F[:, 6] = np.where(np.isnan(created), 0.0, _inverse(np.nan_to_num(age_days), RECENCY_DAYS))
+    return F
+
+
+def rank(rows, ctx, weights=WEIGHTS, now=None):
+    """
+    (rows, scores) ordenados por score desc. El sort es estable: a igual score
+    queda el orden de entrada (created_at DESC). Se ordena por el score ya
+    redondeado (el que se devuelve), así el cursor del feed coincide con el orden.
+    """
+    if not rows:
+        return [], []
+    scores = (features(rows, ctx, now) @ weights).round(4)
+    order = np.argsort(-scores, kind="stable")
+    return [rows[i] for i in order.tolist()], scores[order].tolist()
+
+
+class Budget:
+    """
+    Candidatos por request adaptados al presupuesto de latencia (por proceso):
+    si la etapa se pasa, baja un 25%; si usa menos de la mitad, sube un 10%.
+    """
+
+    def __init__(self, budget_ms=TRIP_RANK_BUDGET_MS, max_candidates=TRIP_RANK_CANDIDATES,
+                 min_candidates=100, window=500):
+        self.budget_ms = budget_ms
+        self.max_candidates = max_candidates
+        self.min_candidates = min(min_candidates, max_candidates)
+        self.candidates = max_candidates
+        self.over_budget = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, ms):
+        with self._lock:
+            self._latencies.append(ms)
+            if ms > self.budget_ms:
+                self.over_budget += 1
+                self.candidates = max(self.min_candidates, int(self.candidates * 0.75))
+            elif ms < self.budget_ms / 2:
+                self.candidates = min(self.max_candidates, int(self.candidates * 1.1) + 1)
+
+    def stats(self):
+        with self._lock:
+            lat = sorted(self._latencies)
+            pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))], 2) if lat else None
+            return {"budget_ms": self.budget_ms, "candidates": self.candidates,
+                    "max_candidates": self.max_candidates, "over_budget": self.over_budget,
+                    "requests": len(lat), "ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)}}
+
+
+budget = Budget()
+
+def stats():
+    return {"weights": dict(zip(FEATURES, WEIGHTS.tolist())), **budget.stats()}
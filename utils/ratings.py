@@ -0,0 +1,85 @@
+# utils/ratings.py
+"""
+Rating por usuario (user_rating_stats, ver sql/migrations/0017_user_rating_stats.sql).
+
+review_trip suma cada review nueva al acumulado del reviewee en la misma
+sentencia del INSERT (BUMP_SQL). rebuild() lo recalcula desde trip_reviews y
+corrige solo las filas que no coinciden (`flask rating-stats-rebuild`).
+"""
+from utils.schema import registry as schema
+
+# CTE `r` = reviews recién insertadas -> +1 review y +rating al reviewee
+BUMP_SQL = """
+    INSERT INTO user_rating_stats AS s (user_id, reviews, rating_sum, rating_avg)
+    SELECT reviewee_id, count(*), sum(rating), avg(rating)::float
+    FROM r
+    WHERE reviewee_id IS NOT NULL
+    GROUP BY reviewee_id
+    ON CONFLICT (user_id) DO UPDATE
+       SET reviews = s.reviews + EXCLUDED.reviews,
+           rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+           rating_avg = (s.rating_sum + EXCLUDED.rating_sum)::float / (s.reviews + EXCLUDED.reviews),
+           updated_at = NOW()
+"""
+
+
+def enabled():
+    return schema.has_table("user_rating_stats")
+
+
+def lateral_sql(user_col, alias="rs"):
+    """
+    LEFT JOIN LATERAL con (rating, reviews) del usuario `user_col`: lectura
+    directa de user_rating_stats o, sin la migración, el agregado de siempre.
+    rating/reviews quedan NULL si no tiene reviews (COALESCE en el SELECT).
+    """
+    if enabled():
+        inner = f"""
+            SELECT s.rating_avg AS rating, s.reviews
+            FROM user_rating_stats s
+            WHERE s.user_id = {user_col}"""
+    else:
+        inner = f"""
+            SELECT AVG(r.rating)::float AS rating, COUNT(*) AS reviews
+            FROM trip_reviews r
+            WHERE r.reviewee_id = {user_col}"""
+    return f"LEFT JOIN LATERAL ({inner}\n        ) {alias} ON TRUE"
+
+
+def rebuild(cur, user_ids=None):
+    """
+    Recalcula desde trip_reviews (todos, o solo `user_ids`). Devuelve
+    {"fixed", "removed"}: filas corregidas y filas sin reviews borradas.
+    """
+    only = "AND reviewee_id = ANY(%(ids)s)" if user_ids else ""
+    only_s = "AND s.user_id = ANY(%(ids)s)" if user_ids else ""
+    # sin reviews nuevas mientras tanto: si no, el +1 de una transacción en
+    # vuelo se pisaría con el total viejo
+    cur.execute("LOCK TABLE trip_reviews IN SHARE MODE")
+    cur.execute(f"""
+        WITH agg AS (
+            SELECT reviewee_id AS user_id, count(*) AS reviews, sum(rating) AS rating_sum
+            FROM trip_reviews
+            WHERE reviewee_id IS NOT NULL AND rating IS NOT NULL {only}
+            GROUP BY reviewee_id
+        ),
+        fixed AS (
+            INSERT INTO user_rating_stats AS s (user_id, reviews, rating_sum, rating_avg)
+            SELECT user_id, reviews, rating_sum, rating_sum::float / reviews
+            FROM agg
+            ON CONFLICT (user_id) DO UPDATE
+               SET reviews = EXCLUDED.reviews,
+                   rating_sum = EXCLUDED.rating_sum,
+                   rating_avg = EXCLUDED.rating_avg,
+                   updated_at = NOW()
+             WHERE (s.reviews, s.rating_sum) IS DISTINCT FROM (EXCLUDED.reviews, EXCLUDED.rating_sum)
+            RETURNING 1
+        ),
+        removed AS (
+            DELETE FROM user_rating_stats s
+            WHERE NOT EXISTS (SELECT 1 FROM agg WHERE agg.user_id = s.user_id) {only_s}
+            RETURNING 1
+        )
+        SELECT (SELECT count(*) FROM fixed) AS fixed, (SELECT count(*) FROM removed) AS removed
+    """, {"ids": list(user_ids or [])})
+    return dict(cur.fetchone())
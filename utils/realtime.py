@@ -0,0 +1,346 @@
+# utils/realtime.py
+"""
+Reparto en tiempo real de notificaciones a los streams SSE del proceso.
+
+Un solo thread por proceso hace LISTEN notifications (trigger de la migración
+0013) con una conexión propia, fuera del pool. Por cada tanda de NOTIFY se
+queda con los ids de usuarios conectados, los lee en UNA query por clave
+primaria y los deja en la cola de cada suscriptor. Los streams no tocan la
+base: solo esperan su cola (ver blueprints/notifications.py).
+
+Al conectar (y al reconectar si se corta) se recupera lo que llegó mientras
+tanto. Los ids salen de una secuencia al INSERT, no al COMMIT: un id menor
+puede commitearse después de uno mayor. Por eso el replay no corta en
+id > último entregado sino que repite una ventana (created_at desde
+NOTIFY_STREAM_REPLAY_OVERLAP seg. antes del último entregado) y cada stream
+descarta lo que ya mandó con un set chico de ids recientes.
+
+La misma conexión escucha los canales que otros módulos cuelguen con
+Hub.watch() (ej. las invalidaciones del cache de auth).
+"""
+import json
+import logging
+import queue
+from collections import OrderedDict
+import select
+import threading
+import time
+from datetime import date, datetime
+import psycopg2
+from db import get_cur
+from config import (
+    DB_CONFIG, NOTIFY_STREAM_QUEUE_MAX, NOTIFY_STREAM_REPLAY_MAX,
+    NOTIFY_STREAM_REPLAY_OVERLAP, NOTIFY_STREAM_RECENT_IDS,
+)
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "notifications"
+
+_COLUMNS = "id, user_id, type, title, body, data, created_at, read_at"
+
+
+def _json_default(o):
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    raise TypeError(f"not serializable: {type(o).__name__}")
+
+def sse_event(row):
+    """Fila de notifications -> evento SSE (id = id de la notificación)."""
+    data = json.dumps(dict(row), default=_json_default, ensure_ascii=False)
+    return f"id: {row['id']}\nevent: notification\ndata: {data}\n\n"
+
+
+# Lo posterior a s.last_id más la ventana de solape antes de su created_at
+# (commits tardíos con id menor). Sin esa fila (otro usuario, partición
+# borrada) queda solo id > last_id.
+_SINCE_COND = """
+    (x.id > s.last_id OR x.created_at >= (
+        SELECT l.created_at FROM notifications l
+        WHERE l.user_id = s.user_id AND l.id = s.last_id
+    ) - make_interval(secs => %(overlap)s))
+"""
+
+
+def last_seen_id(cur, user_id):
+    """Id desde el que arranca un stream nuevo: la última notificación del usuario (0 si no hay)."""
+    cur.execute("""
+        SELECT id FROM notifications
+        WHERE user_id = %s
+        ORDER BY created_at DESC, id DESC
+        LIMIT 1
+    """, (user_id,))
+    row = cur.fetchone()
+    return row["id"] if row else 0
+
+
+def fetch_since(user_id, last_id, limit=NOTIFY_STREAM_REPLAY_MAX):
+    """Replay para Last-Event-ID: lo posterior a last_id (con solape), en orden de id."""
+    with get_cur() as cur:
+        cur.execute(f"""
+            SELECT n.*
+            FROM (SELECT %(user_id)s::int AS user_id, %(last_id)s::bigint AS last_id) s
+            CROSS JOIN LATERAL (
+                SELECT {_COLUMNS}
+                FROM notifications x
+                WHERE x.user_id = s.user_id AND {_SINCE_COND}
+                ORDER BY x.id
+                LIMIT %(limit)s
+            ) n
+        """, {"user_id": user_id, "last_id": last_id, "limit": limit,
+              "overlap": NOTIFY_STREAM_REPLAY_OVERLAP})
+        return cur.fetchall()
+
+
+class Subscriber:
+    """
+    Cola de un stream. last_id = id más alto entregado, solo como punto de
+    partida del replay (no sirve para descartar: ver docstring del módulo);
+    None mientras el endpoint todavía no hizo su replay (ahí se encola todo lo
+    vivo y el catch-up del hub lo saltea). recent = últimos ids mandados.
+    """
+
+    def __init__(self, user_id, last_id=None):
+        self.user_id = user_id
+        self.last_id = last_id
+        self.queue = queue.Queue(maxsize=NOTIFY_STREAM_QUEUE_MAX)
+        self.overflowed = False
+        self.recent = OrderedDict()
+
+    def mark_sent(self, row):
+        """True si row no se mandó todavía (y la anota); False si es repetida."""
+        nid = row["id"]
+        if nid in self.recent:
+            return False
+        self.recent[nid] = None
+        if len(self.recent) > NOTIFY_STREAM_RECENT_IDS:
+            self.recent.popitem(last=False)
+        if self.last_id is None or nid > self.last_id:
+            self.last_id = nid
+        return True
+
+    def put(self, row):
+        if row["id"] in self.recent:
+            return
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            # cliente lento: lo cortamos y reconecta con Last-Event-ID
+            self.overflowed = True
+
+
+class Hub:
+    def __init__(self, dsn=DB_CONFIG, poll=5.0):
+        self._dsn = dsn
+        self._poll = poll
+        self._lock = threading.Lock()
+        self._subs = {}            # user_id -> {Subscriber}
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats_counters = {"notifies": 0, "delivered": 0, "fetches": 0, "reconnects": 0}
+        self.listening = False
+        self._channels = {}        # canal extra -> (on_message(payload), on_connect())
+        self._active = set()       # canales extra con LISTEN en la conexión actual
+
+    # -- suscripciones --
+    def subscribe(self, user_id, last_id=None):
+        sub = Subscriber(user_id, last_id)
+        with self._lock:
+            self._subs.setdefault(user_id, set()).add(sub)
+        self._ensure_thread()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.user_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.user_id]
+
+    # -- canales de otros módulos --
+    def watch(self, channel, on_message, on_connect=None):
+        """
+        Escucha `channel` además de notifications. on_connect corre después de
+        cada LISTEN (lo que llegó con la conexión caída se perdió: ahí se
+        resetea el estado). Idempotente.
+        """
+        with self._lock:
+            self._channels.setdefault(channel, (on_message, on_connect))
+        self._ensure_thread()
+
+    def ready(self, channel):
+        """True si `channel` tiene LISTEN activo (y su on_connect ya corrió)."""
+        return self.listening and channel in self._active
+
+    def stats(self):
+        with self._lock:
+            n = sum(len(s) for s in self._subs.values())
+            users = len(self._subs)
+        return {"listening": self.listening, "subscribers": n, "users": users,
+                "channels": sorted(self._active), **self.stats_counters}
+
+    # -- thread de LISTEN --
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="notifications-listen", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        delay, connects = 1.0, 0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self._dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+                self._listen_channels(conn)
+                self.listening = True
+                if connects:
+                    self.stats_counters["reconnects"] += 1
+                connects, delay = connects + 1, 1.0
+                # lo que llegó antes del LISTEN (o durante el corte)
+                self._catch_up()
+                self._listen(conn)
+            except Exception:
+                logger.exception("notifications LISTEN failed; retrying in %.0fs", delay)
+                self._stop.wait(delay)
+                delay = min(delay * 2, 60)
+            finally:
+                self.listening = False
+                self._active = set()
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+
+    def _listen_channels(self, conn):
+        """LISTEN de los canales de watch() que todavía no lo tienen."""
+        with self._lock:
+            pending = [(c, h) for c, h in self._channels.items() if c not in self._active]
+        for channel, (_, on_connect) in pending:
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {channel}")
+            if on_connect is not None:
+                on_connect()
+            self._active.add(channel)
+
+    def _listen(self, conn):
+        while not self._stop.is_set():
+            self._listen_channels(conn)
+            if select.select([conn], [], [], self._poll) == ([], [], []):
+                continue
+            conn.poll()
+            ids = []
+            while conn.notifies:
+                n = conn.notifies.pop(0)
+                if n.channel != CHANNEL:
+                    on_message = self._channels.get(n.channel, (None,))[0]
+                    if on_message is not None:
+                        try:
+                            on_message(n.payload)
+                        except Exception:
+                            logger.exception("%s handler failed", n.channel)
+                    continue
+                self.stats_counters["notifies"] += 1
+                try:
+                    user_id, nid = (int(x) for x in n.payload.split(":", 1))
+                except ValueError:
+                    continue
+                if user_id in self._subs:
+                    ids.append(nid)
+            if ids:
+                self._deliver_ids(ids)
+
+    def _deliver_ids(self, ids):
+        with get_cur() as cur:
+            # recién insertadas: el corte por created_at deja afuera las particiones viejas
+            cur.execute(f"""
+                SELECT {_COLUMNS} FROM notifications
+                WHERE id = ANY(%s) AND created_at > LOCALTIMESTAMP - INTERVAL '1 day'
+                ORDER BY id
+            """, (ids,))
+            rows = cur.fetchall()
+        self.stats_counters["fetches"] += 1
+        self._fan_out(rows)
+
+    def _catch_up(self):
+        with self._lock:
+            since = {}
+            for uid, subs in self._subs.items():
+                ready = [s.last_id for s in subs if s.last_id is not None]
+                if ready:
+                    since[uid] = min(ready)
+        if not since:
+            return
+        with get_cur() as cur:
+            cur.execute(f"""
+                SELECT n.*
+                FROM unnest(%(users)s::int[], %(last_ids)s::bigint[]) AS s(user_id, last_id)
+                CROSS JOIN LATERAL (
+                    SELECT {_COLUMNS}
+                    FROM notifications x
+                    WHERE x.user_id = s.user_id AND {_SINCE_COND}
+                    ORDER BY x.id
+                    LIMIT %(limit)s
+                ) n
+                ORDER BY n.id
+            """, {"users": list(since), "last_ids": list(since.values()),
+                  "limit": NOTIFY_STREAM_REPLAY_MAX, "overlap": NOTIFY_STREAM_REPLAY_OVERLAP})
+            rows = cur.fetchall()
+        self._fan_out(rows)
+
+    def _fan_out(self, rows):
+        with self._lock:
+            targets = [(row, list(self._subs.get(row["user_id"], ()))) for row in rows]
+        for row, subs in targets:
+            for sub in subs:
+                sub.put(row)
+                self.stats_counters["delivered"] += 1
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+def get_hub():
+    """Hub del proceso (lazy: el thread arranca con el primer suscriptor, post-fork)."""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = Hub()
+    return _hub
+
+
+def stream(sub, replay, heartbeat, max_seconds):
+    """
+    Generador SSE: primero el replay, después lo que llegue a la cola, con
+    comentarios de heartbeat. Corta a los max_seconds (el cliente reconecta).
+    """
+    hub = get_hub()
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield "retry: 3000\n\n"
+        for row in replay:
+            if sub.mark_sent(row):
+                yield sse_event(row)
+        while not sub.overflowed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                row = sub.queue.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            if sub.mark_sent(row):
+                yield sse_event(row)
+    finally:
+        hub.unsubscribe(sub)
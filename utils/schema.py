@@ -0,0 +1,61 @@
+# utils/schema.py
+import logging
+import threading
+import psycopg2
+from db import get_cur
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaRegistry:
+    """
+    Tablas/columnas del schema public, introspectadas UNA vez por proceso
+    (en create_app). Reemplaza los chequeos a information_schema/to_regclass
+    que se hacían en cada request. Después de migrar: refresh().
+    """
+
+    def __init__(self):
+        self._tables = None   # {tabla: {columnas}}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with get_cur() as cur:
+            cur.execute("""
+                SELECT table_name, column_name
+                FROM information_schema.columns
+                WHERE table_schema = 'public'
+            """)
+            tables = {}
+            for r in cur.fetchall():
+                tables.setdefault(r["table_name"], set()).add(r["column_name"])
+        with self._lock:
+            self._tables = tables
+        return self
+
+    def _loaded(self):
+        if self._tables is None:
+            self.refresh()
+        return self._tables
+
+    def has_table(self, table: str) -> bool:
+        return table in self._loaded()
+
+    def has_column(self, table: str, column: str) -> bool:
+        return column in self._loaded().get(table, ())
+
+    def columns(self, table: str) -> set:
+        return set(self._loaded().get(table, ()))
+
+
+registry = SchemaRegistry()
+
+def refresh():
+    """Hook explícito para re-leer el schema (p.ej. después de correr migraciones)."""
+    return registry.refresh()
+
+def init_app(app):
+    try:
+        registry.refresh()
+    except psycopg2.Error:
+        # Sin base al arrancar: se carga lazy en el primer uso
+        logger.warning("schema registry: DB not reachable at startup, will load lazily")
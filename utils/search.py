@@ -0,0 +1,44 @@
+# utils/search.py
+import re
+import unicodedata
+
+# Diccionarios de text search que cubre equipment.search_tsv (0003_equipment_search.sql)
+TS_CONFIGS = ("spanish", "english", "simple")
+MAX_TOKENS = 8
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """
+    Minúsculas, sin acentos, solo [a-z0-9] separados por un espacio.
+    Equivale a lo que guarda el trigger en equipment.search_text
+    (lower + unaccent; pg_trgm ya ignora la puntuación).
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return " ".join(_NON_WORD.split(text)).strip()
+
+
+def tokenize(text: str):
+    """Tokens únicos (en orden) del texto normalizado, máximo MAX_TOKENS."""
+    seen, out = set(), []
+    for tok in normalize(text).split():
+        if tok not in seen:
+            seen.add(tok)
+            out.append(tok)
+        if len(out) == MAX_TOKENS:
+            break
+    return out
+
+
+def prefix_tsquery(tokens) -> str:
+    """'tabla pyz' -> 'tabla:* & pyz:*' (seguro para to_tsquery: solo [a-z0-9])."""
+    return " & ".join(f"{t}:*" for t in tokens)
+
+
+def tsquery_sql(param="tsq") -> str:
+    """tsquery combinada de todos los diccionarios (OR entre configuraciones)."""
+    return " || ".join(f"to_tsquery('{cfg}', %({param})s)" for cfg in TS_CONFIGS)
@@ -0,0 +1,85 @@
+# utils/seen.py
+"""
+Trips que cada usuario ya vio (swipe en cualquier dirección, o solicitud
+rechazada), para que el feed por cursor los saltee sin un NOT EXISTS contra
+trip_swipes. Con offset no se sacan: el conjunto cambiaría entre páginas.
+
+Por usuario se cachea un SeenSet: los trip_id ordenados en un array('I')
+(4 bytes por trip, búsqueda binaria) y el mayor trip_swipes.id leído. Se arma
+desde trip_swipes la primera vez; después cada feed lee solo los swipes con id
+mayor (índice de la migración 0018), casi siempre ninguno. Así los swipes
+hechos en otro proceso también se ven. El id sale de la secuencia al INSERT,
+no al COMMIT: un swipe con id menor puede commitearse después. Por eso se
+relee desde FEED_SEEN_REREAD_IDS ids antes del watermark (el rango es del
+usuario solo: son pocas filas). swipe_trip y reject_participant lo
+actualizan al commitear.
+
+Es exacto a propósito: un Bloom filter con falsos positivos escondería trips
+que el usuario nunca vio.
+"""
+import threading
+from array import array
+from bisect import bisect_left, insort
+from db import after_commit
+from utils.cache import TTLCache
+from config import FEED_SEEN_CACHE_MAX, FEED_SEEN_CACHE_TTL, FEED_SEEN_REREAD_IDS
+
+
+class SeenSet:
+    __slots__ = ("ids", "watermark", "_lock")
+
+    def __init__(self, ids=(), watermark=0):
+        self.ids = array("I", sorted(set(ids)))
+        self.watermark = watermark
+        self._lock = threading.Lock()
+
+    def __contains__(self, trip_id):
+        ids = self.ids
+        i = bisect_left(ids, trip_id)
+        return i < len(ids) and ids[i] == trip_id
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, trip_id, swipe_id=None):
+        with self._lock:
+            if trip_id not in self:
+                insort(self.ids, trip_id)
+            if swipe_id is not None and swipe_id > self.watermark:
+                self.watermark = swipe_id
+
+
+_cache = TTLCache(maxsize=FEED_SEEN_CACHE_MAX, ttl=FEED_SEEN_CACHE_TTL, name="trip_seen")
+
+
+def get(cur, user_id):
+    """SeenSet del usuario, al día con trip_swipes (una query chica por llamada)."""
+    seen = _cache.get(user_id)
+    if seen is None:
+        cur.execute("""
+            SELECT COALESCE(array_agg(trip_id), '{}') AS ids, COALESCE(max(id), 0) AS watermark
+            FROM trip_swipes
+            WHERE user_id = %s
+        """, (user_id,))
+        r = cur.fetchone()
+        seen = SeenSet(r["ids"], r["watermark"])
+        _cache.set(user_id, seen)
+        return seen
+    cur.execute("""
+        SELECT id, trip_id
+        FROM trip_swipes
+        WHERE user_id = %s AND id > %s
+        ORDER BY id
+    """, (user_id, seen.watermark - FEED_SEEN_REREAD_IDS))
+    for r in cur.fetchall():
+        seen.add(r["trip_id"], r["id"])
+    return seen
+
+
+def mark(user_id, trip_id):
+    """Después del COMMIT: agrega el trip al set cacheado (si está cargado)."""
+    def _add():
+        seen = _cache.get(user_id)
+        if seen is not None:
+            seen.add(trip_id)
+    after_commit(_add)